@@ -5,6 +5,8 @@ from sqlalchemy import pool
 
 from alembic import context
 
+from src import database
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -18,7 +20,7 @@ if config.config_file_name is not None:
 # for 'autogenerate' support
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
-target_metadata = None
+target_metadata = database.metadata_obj
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -0,0 +1,39 @@
+"""add class filter indexes
+
+Revision ID: 3f7c2a9d1e54
+Revises: b69abbb1d93e
+Create Date: 2026-10-18 11:02:13.418220
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f7c2a9d1e54'
+down_revision = 'b69abbb1d93e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # GET /classes/ sorts by (date, class_id) and filters on any mix of the
+    # columns below, so every index ends in the sort key
+    op.create_index('classes_date_idx', 'classes', ['date', 'class_id'])
+    op.create_index('classes_trainer_date_idx', 'classes',
+                    ['trainer_id', 'date', 'class_id'])
+    op.create_index('classes_type_date_idx', 'classes',
+                    ['class_type_id', 'date', 'class_id'])
+    op.create_index('classes_isodow_idx', 'classes',
+                    [sa.text('EXTRACT(ISODOW FROM date)'), 'date', 'class_id'])
+    # may already exist on databases indexed by hand before migrations did it
+    op.execute('CREATE INDEX IF NOT EXISTS classes_attendance_idx '
+               'ON attendance (class_id)')
+
+
+def downgrade() -> None:
+    op.execute('DROP INDEX IF EXISTS classes_attendance_idx')
+    op.drop_index('classes_isodow_idx', table_name='classes')
+    op.drop_index('classes_type_date_idx', table_name='classes')
+    op.drop_index('classes_trainer_date_idx', table_name='classes')
+    op.drop_index('classes_date_idx', table_name='classes')
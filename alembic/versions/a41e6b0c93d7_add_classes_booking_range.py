@@ -0,0 +1,40 @@
+"""add classes booking range
+
+Revision ID: a41e6b0c93d7
+Revises: 3f7c2a9d1e54
+Create Date: 2026-10-18 11:40:51.072934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41e6b0c93d7'
+down_revision = '3f7c2a9d1e54'
+branch_labels = None
+depends_on = None
+
+# a class that ends before it starts runs past midnight
+BOOKING = """tsrange(date + start_time,
+                     date + end_time + CASE WHEN end_time < start_time
+                                            THEN interval '1 day'
+                                            ELSE interval '0' END,
+                     '[)')"""
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('classes', sa.Column('booking', postgresql.TSRANGE,
+                                       sa.Computed(BOOKING, persisted=True)))
+    # fails if a room is already double booked; those classes have to be
+    # moved or removed before upgrading
+    op.create_exclude_constraint('classes_room_booking_excl', 'classes',
+                                 ('room_id', '='), ('booking', '&&'),
+                                 using='gist')
+
+
+def downgrade() -> None:
+    op.drop_constraint('classes_room_booking_excl', 'classes')
+    op.drop_column('classes', 'booking')
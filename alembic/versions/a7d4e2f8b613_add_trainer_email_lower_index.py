@@ -0,0 +1,26 @@
+"""add trainer email lower index
+
+Revision ID: a7d4e2f8b613
+Revises: f3b9c6d1a254
+Create Date: 2026-10-18 18:20:44.309512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d4e2f8b613'
+down_revision = 'f3b9c6d1a254'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # POST /trainers/login/ matches lower(email) exactly
+    op.create_index('trainers_email_lower_idx', 'trainers',
+                    [sa.text('lower(email)')])
+
+
+def downgrade() -> None:
+    op.drop_index('trainers_email_lower_idx', table_name='trainers')
@@ -0,0 +1,29 @@
+"""add trainer schedule index
+
+Revision ID: b2e8d5c3f471
+Revises: a7d4e2f8b613
+Create Date: 2026-10-18 19:04:37.662190
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2e8d5c3f471'
+down_revision = 'a7d4e2f8b613'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # GET /trainers/{id}/schedule is one range scan of this index; only
+    # attendee_count is read from the table. Leaving it out keeps check-ins,
+    # which update it, as HOT updates that touch no index on classes
+    op.create_index('classes_trainer_schedule_idx', 'classes',
+                    ['trainer_id', 'date', 'start_time', 'class_id'],
+                    postgresql_include=['end_time', 'class_type_id',
+                                        'room_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('classes_trainer_schedule_idx', table_name='classes')
@@ -0,0 +1,31 @@
+"""add dog detail indexes
+
+Revision ID: c5d2e8f7a610
+Revises: a41e6b0c93d7
+Create Date: 2026-10-18 15:20:41.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d2e8f7a610'
+down_revision = 'a41e6b0c93d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # GET /dogs/{id} pages a dog's comments newest first and its attendance
+    # in check-in order; each index serves one page as a single range scan
+    op.create_index('comments_dog_time_idx', 'comments',
+                    ['dog_id', sa.text('time_added DESC'),
+                     sa.text('comment_id DESC')])
+    op.create_index('attendance_dog_check_in_idx', 'attendance',
+                    ['dog_id', 'check_in', 'attendance_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('attendance_dog_check_in_idx', table_name='attendance')
+    op.drop_index('comments_dog_time_idx', table_name='comments')
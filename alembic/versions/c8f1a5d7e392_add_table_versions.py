@@ -0,0 +1,78 @@
+"""add table versions
+
+Revision ID: c8f1a5d7e392
+Revises: d6a3f9e1c824
+Create Date: 2026-10-18 21:06:37.402518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8f1a5d7e392'
+down_revision = 'd6a3f9e1c824'
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = ('trainers', 'class_types', 'rooms', 'classes',
+                    'attendance', 'dogs', 'comments')
+
+
+def upgrade() -> None:
+    op.create_table(
+        'table_versions',
+        sa.Column('table_name', sa.Text, primary_key=True),
+        sa.Column('version', sa.BigInteger, nullable=False),
+    )
+    # versions start from the clock rather than 0, so a rebuilt database
+    # never hands out an ETag a client may still hold from the old one
+    op.execute(f"""
+        INSERT INTO table_versions (table_name, version)
+        SELECT table_name,
+            CAST(EXTRACT(EPOCH FROM clock_timestamp()) * 1000 AS BIGINT)
+        FROM unnest(ARRAY{list(VERSIONED_TABLES)}) AS table_name
+    """)
+
+    # deferred to commit, so the writer holds the version row's lock only
+    # while it commits rather than for its whole transaction; concurrent
+    # writers to one table queue for the commit alone. Constraint triggers
+    # fire per row, so a transaction-local setting limits the bump to once
+    # per table and transaction
+    op.execute("""
+        CREATE FUNCTION bump_table_version() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            bumped text := 'table_versions.' || TG_TABLE_NAME;
+        BEGIN
+            IF current_setting(bumped, true) IS DISTINCT FROM 'on' THEN
+                UPDATE table_versions SET version = version + 1
+                WHERE table_name = TG_TABLE_NAME;
+                PERFORM set_config(bumped, 'on', true);
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    for table in VERSIONED_TABLES:
+        op.execute(f"""
+            CREATE CONSTRAINT TRIGGER {table}_version_trg
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION bump_table_version()
+        """)
+        # constraint triggers can't fire on TRUNCATE, which locks the
+        # whole table anyway
+        op.execute(f"""
+            CREATE TRIGGER {table}_truncate_version_trg
+            AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+        """)
+
+
+def downgrade() -> None:
+    for table in reversed(VERSIONED_TABLES):
+        op.execute(f'DROP TRIGGER {table}_truncate_version_trg ON {table}')
+        op.execute(f'DROP TRIGGER {table}_version_trg ON {table}')
+    op.execute('DROP FUNCTION bump_table_version()')
+    op.drop_table('table_versions')
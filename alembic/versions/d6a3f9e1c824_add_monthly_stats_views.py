@@ -0,0 +1,72 @@
+"""add monthly stats views
+
+Revision ID: d6a3f9e1c824
+Revises: b2e8d5c3f471
+Create Date: 2026-10-18 19:51:26.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6a3f9e1c824'
+down_revision = 'b2e8d5c3f471'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # rolled up from classes.attendee_count rather than attendance. Rows
+    # hold nothing that changes between refreshes unless the numbers do, so
+    # REFRESH ... CONCURRENTLY only rewrites the months that moved
+    op.execute("""
+        CREATE MATERIALIZED VIEW class_type_monthly_stats AS
+        SELECT CAST(date_trunc('month', classes.date) AS DATE) AS month,
+            classes.class_type_id,
+            COUNT(*) AS classes,
+            SUM(classes.attendee_count) AS dogs,
+            SUM(classes.capacity) AS capacity,
+            SUM(class_types.max_num_dogs) AS type_limit,
+            SUM(rooms.max_dog_capacity) AS room_limit
+        FROM classes
+        JOIN class_types ON class_types.class_type_id = classes.class_type_id
+        LEFT JOIN rooms ON rooms.room_id = classes.room_id
+        GROUP BY 1, 2
+    """)
+    op.execute("""
+        CREATE MATERIALIZED VIEW trainer_monthly_stats AS
+        SELECT classes.trainer_id,
+            CAST(date_trunc('month', classes.date) AS DATE) AS month,
+            COUNT(*) AS classes,
+            CAST(SUM(EXTRACT(EPOCH FROM upper(classes.booking) 
+                - lower(classes.booking))) / 3600 AS DOUBLE PRECISION) AS hours,
+            SUM(classes.attendee_count) AS dogs,
+            SUM(classes.capacity) AS capacity
+        FROM classes
+        WHERE classes.trainer_id IS NOT NULL
+        GROUP BY 1, 2
+    """)
+    # REFRESH ... CONCURRENTLY needs a unique index on each view
+    op.create_index('class_type_monthly_stats_key', 'class_type_monthly_stats',
+                    ['month', 'class_type_id'], unique=True)
+    op.create_index('trainer_monthly_stats_key', 'trainer_monthly_stats',
+                    ['trainer_id', 'month'], unique=True)
+
+    # when each view was last refreshed, written by src.stats.refresh
+    op.create_table(
+        'stats_refreshes',
+        sa.Column('view_name', sa.Text, primary_key=True),
+        sa.Column('refreshed_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    )
+    op.execute("""
+        INSERT INTO stats_refreshes (view_name, refreshed_at)
+        VALUES ('class_type_monthly_stats', now()),
+            ('trainer_monthly_stats', now())
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('stats_refreshes')
+    op.execute('DROP MATERIALIZED VIEW trainer_monthly_stats')
+    op.execute('DROP MATERIALIZED VIEW class_type_monthly_stats')
@@ -0,0 +1,44 @@
+"""add search indexes
+
+Revision ID: e1f4a7b2c9d3
+Revises: c5d2e8f7a610
+Create Date: 2026-10-18 16:05:12.534877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f4a7b2c9d3'
+down_revision = 'c5d2e8f7a610'
+branch_labels = None
+depends_on = None
+
+# (index, table, column) for every column searched with ILIKE
+TRIGRAM_INDEXES = [
+    ('trainers_email_trgm_idx', 'trainers', 'email'),
+    ('trainers_first_name_trgm_idx', 'trainers', 'first_name'),
+    ('dogs_name_trgm_idx', 'dogs', 'dog_name'),
+    ('dogs_breed_trgm_idx', 'dogs', 'breed'),
+    ('dogs_client_email_trgm_idx', 'dogs', 'client_email'),
+]
+
+
+def upgrade() -> None:
+    # btree indexes can't serve ILIKE or a leading wildcard; trigram GIN 
+    # indexes can serve both
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        op.create_index(name, table, [column], postgresql_using='gin',
+                        postgresql_ops={column: 'gin_trgm_ops'})
+    # GET /comments/search matches against this expression
+    op.create_index('comments_text_search_idx', 'comments',
+                    [sa.text("to_tsvector('english', comment_text)")],
+                    postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('comments_text_search_idx', table_name='comments')
+    for name, table, _ in reversed(TRIGRAM_INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,131 @@
+"""add class attendee counts
+
+Revision ID: f3b9c6d1a254
+Revises: e1f4a7b2c9d3
+Create Date: 2026-10-18 17:42:09.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b9c6d1a254'
+down_revision = 'e1f4a7b2c9d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('classes', sa.Column('attendee_count', sa.Integer,
+                                       server_default='0', nullable=False))
+    op.add_column('classes', sa.Column('capacity', sa.Integer,
+                                       server_default='0', nullable=False))
+
+    # the smaller of the room's and the class type's limits, 0 if either
+    # is missing
+    op.execute("""
+        CREATE FUNCTION class_capacity(room integer, class_type integer)
+        RETURNS integer LANGUAGE sql STABLE AS $$
+            SELECT COALESCE((
+                SELECT LEAST(rooms.max_dog_capacity, class_types.max_num_dogs)
+                FROM rooms, class_types
+                WHERE rooms.room_id = room
+                    AND class_types.class_type_id = class_type), 0)
+        $$
+    """)
+
+    # every check-in takes the class row lock through this conditional
+    # UPDATE, so concurrent check-ins to one class queue up and can't
+    # overfill it
+    op.execute("""
+        CREATE FUNCTION attendance_count() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                UPDATE classes SET attendee_count = attendee_count - 1
+                WHERE class_id = OLD.class_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE classes SET attendee_count = attendee_count + 1
+                WHERE class_id = NEW.class_id
+                    AND attendee_count < capacity;
+                IF NOT FOUND THEN
+                    RAISE EXCEPTION 'class is full'
+                        USING ERRCODE = 'check_violation',
+                              CONSTRAINT = 'classes_capacity';
+                END IF;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER attendance_count_trg
+        AFTER INSERT OR DELETE OR UPDATE OF class_id ON attendance
+        FOR EACH ROW EXECUTE FUNCTION attendance_count()
+    """)
+
+    op.execute("""
+        CREATE FUNCTION classes_capacity() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.capacity := class_capacity(NEW.room_id, NEW.class_type_id);
+            RETURN NEW;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER classes_capacity_trg
+        BEFORE INSERT OR UPDATE OF room_id, class_type_id ON classes
+        FOR EACH ROW EXECUTE FUNCTION classes_capacity()
+    """)
+
+    # a room or class type limit change moves the capacity of its classes
+    op.execute("""
+        CREATE FUNCTION refresh_class_capacity() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_TABLE_NAME = 'rooms' THEN
+                UPDATE classes
+                SET capacity = class_capacity(room_id, class_type_id)
+                WHERE room_id = NEW.room_id;
+            ELSE
+                UPDATE classes
+                SET capacity = class_capacity(room_id, class_type_id)
+                WHERE class_type_id = NEW.class_type_id;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER rooms_capacity_trg
+        AFTER UPDATE OF max_dog_capacity ON rooms
+        FOR EACH ROW EXECUTE FUNCTION refresh_class_capacity()
+    """)
+    op.execute("""
+        CREATE TRIGGER class_types_capacity_trg
+        AFTER UPDATE OF max_num_dogs ON class_types
+        FOR EACH ROW EXECUTE FUNCTION refresh_class_capacity()
+    """)
+
+    op.execute("""
+        UPDATE classes SET
+            capacity = class_capacity(room_id, class_type_id),
+            attendee_count = (SELECT COUNT(*) FROM attendance
+                              WHERE attendance.class_id = classes.class_id)
+    """)
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER class_types_capacity_trg ON class_types')
+    op.execute('DROP TRIGGER rooms_capacity_trg ON rooms')
+    op.execute('DROP FUNCTION refresh_class_capacity()')
+    op.execute('DROP TRIGGER classes_capacity_trg ON classes')
+    op.execute('DROP FUNCTION classes_capacity()')
+    op.execute('DROP TRIGGER attendance_count_trg ON attendance')
+    op.execute('DROP FUNCTION attendance_count()')
+    op.execute('DROP FUNCTION class_capacity(integer, integer)')
+    op.drop_column('classes', 'capacity')
+    op.drop_column('classes', 'attendee_count')
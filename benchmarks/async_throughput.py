@@ -0,0 +1,85 @@
+"""
+Compares throughput of the async endpoints (db.async_engine) against the old
+threadpool model (sync `def` handlers on db.engine) at high concurrency.
+
+Both variants run the same query as GET /dogs/ inside one in-process app and
+are driven with the same number of concurrent requests, so the only thing
+that differs is how a request waits on Postgres.
+
+Run from the repo root with the POSTGRES_* variables set:
+    python -m benchmarks.async_throughput --requests 2000 --concurrency 200
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+import sqlalchemy
+from fastapi import FastAPI
+
+from src import database as db
+
+STMT = sqlalchemy.text("""
+    SELECT dog_id, dog_name, birthday, breed, client_email
+    FROM dogs
+    WHERE dog_name ILIKE :name
+    OFFSET :offset
+    LIMIT :limit
+""")
+
+app = FastAPI()
+
+
+@app.get("/sync/")
+def sync_dogs(offset: int = 0):
+    with db.engine.connect() as conn:
+        result = conn.execute(STMT, [{"name": "%", "offset": offset, "limit": 50}])
+        return [row._asdict() for row in result]
+
+
+@app.get("/async/")
+async def async_dogs(offset: int = 0):
+    async with db.async_engine.connect() as conn:
+        result = await conn.execute(STMT, [{"name": "%", "offset": offset,
+                                            "limit": 50}])
+        return [row._asdict() for row in result]
+
+
+async def drive(client, path, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            response = await client.get(path, params={"offset": i % 1000})
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return time.perf_counter() - start
+
+
+async def main(args):
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        results = {}
+        for name in ("sync", "async"):
+            # warm the pools so connection setup isn't measured
+            await drive(client, f"/{name}/", args.concurrency, args.concurrency)
+            elapsed = await drive(client, f"/{name}/", args.requests,
+                                  args.concurrency)
+            results[name] = {
+                "seconds": round(elapsed, 3),
+                "requests_per_second": round(args.requests / elapsed, 1),
+            }
+    await db.async_engine.dispose()
+    print(json.dumps({"requests": args.requests,
+                      "concurrency": args.concurrency,
+                      "results": results}, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
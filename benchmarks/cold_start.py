@@ -0,0 +1,71 @@
+"""
+Measures cold start time to first byte for the API: each run starts a fresh
+interpreter, imports src.api.server and serves one request that hits the
+database, the way the first request after a serverless cold start does.
+
+Run from the repo root with the POSTGRES_* variables set:
+    python -m benchmarks.cold_start --runs 20
+    python -m benchmarks.cold_start --runs 20 --reflect
+
+--reflect reproduces the old import-time behaviour of src/database.py by
+reflecting the six tables with autoload_with=engine before serving.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+CHILD = """
+import time
+start = time.perf_counter()
+import sqlalchemy
+from fastapi.testclient import TestClient
+from src import database as db
+if {reflect}:
+    metadata = sqlalchemy.MetaData()
+    for name in ("trainers", "dogs", "comments", "classes",
+                 "class_types", "attendance"):
+        sqlalchemy.Table(name, metadata, autoload_with=db.engine)
+imported = time.perf_counter()
+from src.api.server import app
+response = TestClient(app).get("{path}")
+done = time.perf_counter()
+assert response.status_code == 200, response.text
+print((imported - start) * 1000, (done - start) * 1000)
+"""
+
+
+def run_once(reflect, path):
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD.format(reflect=reflect, path=path)],
+        check=True, capture_output=True, text=True
+    ).stdout.split()
+    return float(output[0]), float(output[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--reflect", action="store_true")
+    parser.add_argument("--path", default="/class-types/")
+    args = parser.parse_args()
+
+    imports, ttfb = [], []
+    for _ in range(args.runs):
+        import_ms, ttfb_ms = run_once(args.reflect, args.path)
+        imports.append(import_ms)
+        ttfb.append(ttfb_ms)
+
+    print(json.dumps({
+        "mode": "reflect" if args.reflect else "static",
+        "runs": args.runs,
+        "db_import_ms_median": round(statistics.median(imports), 2),
+        "ttfb_ms_median": round(statistics.median(ttfb), 2),
+        "ttfb_ms_max": round(max(ttfb), 2),
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Latency benchmark for the read endpoints of every router. Each scenario is
+driven in-process with a realistic mix of parameters (ids, filters, pages)
+and reports p50/p95/p99 latency and throughput.
+
+Run from the repo root with the POSTGRES_* variables set:
+    python -m benchmarks.endpoints --requests 500 --output baseline.json
+    python -m benchmarks.endpoints --baseline baseline.json
+
+--seed-scale rebuilds the database first (alembic downgrade base, alembic
+upgrade head, then src.fake_data at that scale and --seed). It deletes
+every row in the database it points at.
+
+With --baseline, any scenario whose p95 grew by more than --tolerance is
+reported and the run exits with status 1.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+import sqlalchemy
+
+from src import database as db
+from src.api.server import app
+
+BREEDS = ["Basset Hound", "Beagle", "Border Collie", "Dobermann",
+          "Golden Retriever", "Chihuahua", "Maltese", "Rottweiler",
+          "Pug", "Poodle"]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday",
+        "Saturday", "Sunday"]
+TIME_RANGES = ["morning (8AM-11AM)", "midday (11AM-2PM)",
+               "afternoon (2PM-5PM)"]
+
+
+def load_ids():
+    """Reads the ids and values the scenarios pick parameters from."""
+    with db.engine.connect() as conn:
+        def column(sql):
+            return list(conn.execute(sqlalchemy.text(sql)).scalars())
+
+        return {
+            "trainer_ids": column("SELECT trainer_id FROM trainers"),
+            "class_type_ids": column("SELECT class_type_id FROM class_types"),
+            "dog_ids": column("SELECT MIN(dog_id) FROM dogs UNION ALL "
+                              "SELECT MAX(dog_id) FROM dogs"),
+            "class_ids": column("SELECT MIN(class_id) FROM classes UNION ALL "
+                                "SELECT MAX(class_id) FROM classes"),
+            "dog_names": column("SELECT dog_name FROM dogs "
+                                "TABLESAMPLE SYSTEM (1) LIMIT 200"),
+            "dates": [str(date) for date in column(
+                "SELECT date FROM classes TABLESAMPLE SYSTEM (1) LIMIT 200")],
+        }
+
+
+def random_page(rng):
+    return {"limit": rng.choice([10, 50, 250]),
+            "offset": rng.choice([0, 0, 0, 50, 500])}
+
+
+# scenario name -> function(rng, ids) returning (path, params)
+SCENARIOS = {
+    "GET /trainers/": lambda rng, ids: ("/trainers/", {
+        **random_page(rng), "name": rng.choice(["", "a", "e"])}),
+    "GET /trainers/{id}": lambda rng, ids: (
+        f"/trainers/{rng.choice(ids['trainer_ids'])}", {}),
+    "GET /trainers/{id}/schedule": lambda rng, ids: (
+        f"/trainers/{rng.choice(ids['trainer_ids'])}/schedule",
+        {"from": rng.choice(ids["dates"])}),
+    "GET /dogs/": lambda rng, ids: ("/dogs/", {
+        **random_page(rng),
+        "name": rng.choice(["", "", *ids["dog_names"][:20]]),
+        "breed": rng.choice(["", "", *BREEDS])}),
+    "GET /dogs/{id}": lambda rng, ids: (
+        f"/dogs/{rng.randint(*ids['dog_ids'])}", {}),
+    "GET /classes/": lambda rng, ids: ("/classes/", {
+        **random_page(rng),
+        **rng.choice([
+            {},
+            {"class_type_id": rng.choice(ids["class_type_ids"])},
+            {"trainer_id": rng.choice(ids["trainer_ids"])},
+            {"date": rng.choice(ids["dates"])},
+            {"time_range": rng.choice(TIME_RANGES),
+             "days": rng.sample(DAYS, rng.randint(1, 3))},
+        ])}),
+    "GET /classes/{id}": lambda rng, ids: (
+        f"/classes/{rng.randint(*ids['class_ids'])}", {}),
+    "GET /rooms/": lambda rng, ids: ("/rooms/", {
+        "class_type_id": rng.choice(ids["class_type_ids"]),
+        "date": rng.choice(ids["dates"]),
+        "start_time": f"{rng.randint(1, 10):02d}:00 AM",
+        "end_time": "11:30 AM"}),
+    "GET /rooms/availability": lambda rng, ids: ("/rooms/availability", {
+        "date": rng.choice(ids["dates"]), "days": rng.choice([1, 1, 7])}),
+    "GET /class-types/": lambda rng, ids: ("/class-types/", {
+        "type": rng.choice(["", "", "puppy", "advanced"])}),
+}
+
+
+def percentile(quantiles, p):
+    return round(quantiles[p - 1] * 1000, 2)
+
+
+async def run_scenario(client, scenario, ids, total, concurrency, seed):
+    rng = random.Random(f"{seed}-{scenario}")
+    requests = [SCENARIOS[scenario](rng, ids) for _ in range(total)]
+    latencies = []
+    statuses = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(path, params):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path, params=params)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = \
+                statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(path, params) for path, params in requests))
+    elapsed = time.perf_counter() - start
+
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": total,
+        "p50_ms": percentile(quantiles, 50),
+        "p95_ms": percentile(quantiles, 95),
+        "p99_ms": percentile(quantiles, 99),
+        "requests_per_second": round(total / elapsed, 1),
+        # 404 is expected for some mixes, e.g. /rooms/ with nothing free
+        "statuses": {str(code): count for code, count
+                     in sorted(statuses.items())},
+    }
+
+
+def seed_database(scale, seed):
+    for command in (["alembic", "downgrade", "base"],
+                    ["alembic", "upgrade", "head"],
+                    [sys.executable, "-m", "src.fake_data",
+                     "--scale", str(scale), "--seed", str(seed)]):
+        subprocess.run(command, check=True)
+
+
+def compare(results, baseline, tolerance):
+    """Prints the p95 change per scenario and returns the regressions."""
+    regressions = []
+    for scenario, result in results.items():
+        before = baseline.get("results", {}).get(scenario)
+        if before is None:
+            continue
+        change = result["p95_ms"] / before["p95_ms"] - 1
+        print(f"{scenario:<20} p95 {before['p95_ms']:>8} -> "
+              f"{result['p95_ms']:>8} ms ({change:+.0%})", file=sys.stderr)
+        if change > tolerance:
+            regressions.append(scenario)
+    return regressions
+
+
+async def main(args):
+    ids = load_ids()
+    scenarios = args.scenario or list(SCENARIOS)
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        results = {}
+        for scenario in scenarios:
+            # warm the pool and the reference data cache first
+            await run_scenario(client, scenario, ids, args.concurrency,
+                               args.concurrency, args.seed)
+            results[scenario] = await run_scenario(
+                client, scenario, ids, args.requests, args.concurrency,
+                args.seed)
+    await db.async_engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500,
+                        help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--seed-scale", type=float,
+                        help="rebuild and seed the database at this scale")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                        help="run only this scenario (repeatable)")
+    parser.add_argument("--output", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed p95 growth over the baseline")
+    args = parser.parse_args()
+
+    if args.seed_scale is not None:
+        seed_database(args.seed_scale, args.seed)
+
+    results = asyncio.run(main(args))
+    report = json.dumps({"requests": args.requests,
+                         "concurrency": args.concurrency,
+                         "seed": args.seed,
+                         "results": results}, indent=4)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"p95 regressed by more than {args.tolerance:.0%}: "
+                  + ", ".join(regressions), file=sys.stderr)
+            sys.exit(1)
@@ -0,0 +1,142 @@
+"""
+Login storm: many trainers logging in at once. Compares checking the
+password in Postgres with crypt(), as POST /trainers/login/ used to, with
+the current endpoint, which looks the trainer up by lower(email) and checks
+the bcrypt hash on the API's password pool.
+
+For each --concurrency level it reports login latency, throughput and the
+time spent inside SQL statements per login. That statement time is where
+the database's CPU goes; with the bcrypt work in the API it should stay
+flat as the storm grows.
+
+Run from the repo root with the POSTGRES_* variables set:
+    python -m benchmarks.login_storm --logins 200 --concurrency 1 10 50
+
+It adds one trainer (deleted afterwards). The crypt() path needs the
+pgcrypto extension and is skipped without it.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+import sqlalchemy
+
+from src import auth
+from src import database as db
+from src.api.server import app
+
+EMAIL = "login.storm@dogtrainers.com"
+PASSWORD = "storm-password"
+
+CRYPT_LOGIN = sqlalchemy.text("""
+    SELECT trainer_id
+    FROM trainers
+    WHERE email ILIKE :email
+    AND password = crypt(:pwd, password)
+""")
+
+
+class StatementTimer:
+    """Sums the time spent executing SQL on db.async_engine."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        sqlalchemy.event.listen(db.async_engine.sync_engine,
+                                "before_cursor_execute", self.before)
+        sqlalchemy.event.listen(db.async_engine.sync_engine,
+                                "after_cursor_execute", self.after)
+
+    def before(self, conn, cursor, statement, parameters, context, executemany):
+        context._storm_start = time.perf_counter()
+
+    def after(self, conn, cursor, statement, parameters, context, executemany):
+        self.seconds += time.perf_counter() - context._storm_start
+
+
+async def crypt_login():
+    async with db.async_engine.connect() as conn:
+        row = (await conn.execute(CRYPT_LOGIN, [
+            {"email": EMAIL, "pwd": PASSWORD}])).one_or_none()
+    return row is not None
+
+
+async def storm(login, total, concurrency, timer):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            if not await login():
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    timer.seconds = 0.0
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p95_ms": round(quantiles[94] * 1000, 2),
+        "logins_per_second": round(total / elapsed, 1),
+        "sql_ms_per_login": round(timer.seconds / total * 1000, 3),
+        "failures": failures,
+    }
+
+
+async def main(args):
+    with db.engine.begin() as conn:
+        conn.execute(sqlalchemy.text("""
+            INSERT INTO trainers (first_name, last_name, email, password)
+            VALUES ('Login', 'Storm', :email, :pwd)
+        """), {"email": EMAIL, "pwd": auth.bcrypt_hash(PASSWORD)})
+        has_crypt = conn.execute(sqlalchemy.text(
+            "SELECT to_regprocedure('crypt(text, text)') IS NOT NULL"
+        )).scalar_one()
+
+    timer = StatementTimer()
+    results = {}
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            async def api_login():
+                response = await client.post("/trainers/login/", json={
+                    "trainer_email": EMAIL, "pwd": PASSWORD})
+                return response.status_code == 200
+
+            paths = {"api": api_login}
+            if has_crypt:
+                paths["database_crypt"] = crypt_login
+            for name, login in paths.items():
+                # warm the pool, the password workers and the connections
+                await storm(login, args.concurrency[-1], args.concurrency[-1],
+                            timer)
+                results[name] = {
+                    str(concurrency): await storm(login, args.logins,
+                                                  concurrency, timer)
+                    for concurrency in args.concurrency}
+    finally:
+        with db.engine.begin() as conn:
+            conn.execute(sqlalchemy.text(
+                "DELETE FROM trainers WHERE email = :email"), {"email": EMAIL})
+        await db.async_engine.dispose()
+
+    print(json.dumps({"logins": args.logins,
+                      "bcrypt_rounds": auth.BCRYPT_ROUNDS,
+                      "password_workers": auth.PASSWORD_WORKERS,
+                      "results": results}, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200,
+                        help="logins per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+",
+                        default=[1, 10, 50])
+    asyncio.run(main(parser.parse_args()))
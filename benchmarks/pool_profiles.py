@@ -0,0 +1,91 @@
+"""
+Measures what connection reuse saves under each DB_POOL_PROFILE. Every
+profile builds its own async engine with db.pool_options() and serves the
+same single-row lookups, one connection checkout per request, first one at
+a time and then --concurrency at once. The serverless profile opens a new
+connection for every request; the others reuse pooled ones.
+
+Run from the repo root with the POSTGRES_* variables set:
+    python -m benchmarks.pool_profiles --requests 300 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import sqlalchemy
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src import database as db
+
+STMT = sqlalchemy.text("SELECT dog_name FROM dogs WHERE dog_id = :id")
+
+
+async def drive(engine, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            async with engine.connect() as conn:
+                await conn.execute(STMT, {"id": i + 1})
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p95_ms": round(quantiles[94] * 1000, 2),
+        "requests_per_second": round(total / elapsed, 1),
+    }
+
+
+async def run_profile(profile, args):
+    _, options = db.pool_options(profile)
+    engine = create_async_engine(db.async_database_connection_url(), **options)
+    connections = 0
+
+    def count(dbapi_connection, connection_record):
+        nonlocal connections
+        connections += 1
+
+    sqlalchemy.event.listen(engine.sync_engine, "connect", count)
+
+    result = {}
+    for mode, concurrency in (("sequential", 1),
+                              ("concurrent", args.concurrency)):
+        connections = 0
+        result[mode] = await drive(engine, args.requests, concurrency)
+        result[mode]["connections_opened"] = connections
+    await engine.dispose()
+    return result
+
+
+async def main(args):
+    results = {}
+    for profile in db.POOL_PROFILES:
+        results[profile] = await run_profile(profile, args)
+
+    # what a pooled checkout saves over opening a connection per request
+    for mode in ("sequential", "concurrent"):
+        baseline = results["serverless"][mode]["p50_ms"]
+        for profile in ("default", "server"):
+            results[profile][mode]["p50_ms_saved_vs_serverless"] = round(
+                baseline - results[profile][mode]["p50_ms"], 2)
+
+    await db.async_engine.dispose()
+    print(json.dumps({"requests": args.requests,
+                      "concurrency": args.concurrency,
+                      "results": results}, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
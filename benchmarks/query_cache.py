@@ -0,0 +1,118 @@
+"""
+Replays a skewed mix of GET /classes/ filter combinations, the way a few
+popular searches dominate real traffic, with and without the query cache.
+Every --write-every requests the attendance version is bumped, as a
+check-in would, so hot entries are evicted and recomputed.
+
+Each backend reports latency, hit ratio and the query time hits saved:
+- off: a MemoryBackend that keeps nothing, so every request misses
+- memory: the process-local LRU
+- redis: with --redis-url, a Redis-protocol server
+
+Run from the repo root with the POSTGRES_* variables set:
+    python -m benchmarks.query_cache --requests 2000 --redis-url redis://localhost:6379
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import httpx
+import sqlalchemy
+
+from src import database as db
+from src.api import query_cache
+from src.api.server import app
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday",
+        "Saturday", "Sunday"]
+TIME_RANGES = ["morning (8AM-11AM)", "midday (11AM-2PM)",
+               "afternoon (2PM-5PM)"]
+
+BUMP_ATTENDANCE = sqlalchemy.text("""
+    UPDATE table_versions SET version = version + 1
+    WHERE table_name = 'attendance'
+""")
+
+
+def filter_combinations(rng, count):
+    with db.engine.connect() as conn:
+        trainer_ids = list(conn.execute(sqlalchemy.text(
+            "SELECT trainer_id FROM trainers")).scalars())
+        class_type_ids = list(conn.execute(sqlalchemy.text(
+            "SELECT class_type_id FROM class_types")).scalars())
+    combinations = []
+    for _ in range(count):
+        params = {"limit": rng.choice([10, 50])}
+        if rng.random() < 0.5:
+            params["trainer_id"] = rng.choice(trainer_ids)
+        if rng.random() < 0.5:
+            params["class_type_id"] = rng.choice(class_type_ids)
+        if rng.random() < 0.3:
+            params["time_range"] = rng.choice(TIME_RANGES)
+        if rng.random() < 0.3:
+            params["days"] = rng.sample(DAYS, 2)
+        combinations.append(params)
+    return combinations
+
+
+async def replay(client, combinations, args):
+    rng = random.Random(args.seed)
+    # Zipf-like: the i-th combination is requested about 1/i as often
+    weights = [1 / (i + 1) for i in range(len(combinations))]
+    latencies = []
+    for i in range(args.requests):
+        if i and i % args.write_every == 0:
+            async with db.async_engine.begin() as conn:
+                await conn.execute(BUMP_ATTENDANCE)
+        params = rng.choices(combinations, weights)[0]
+        start = time.perf_counter()
+        response = await client.get("/classes/", params=params)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    stats = query_cache.cache.stats()
+    return {
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p95_ms": round(quantiles[94] * 1000, 2),
+        "hit_ratio": round(stats["hit_ratio"], 3),
+        "evictions": stats["evictions"],
+        "saved_ms_per_request": round(
+            stats["seconds_saved"] / args.requests * 1000, 3),
+    }
+
+
+async def main(args):
+    combinations = filter_combinations(random.Random(args.seed),
+                                       args.combinations)
+    backends = {"off": lambda: query_cache.MemoryBackend(size=0),
+                "memory": query_cache.MemoryBackend}
+    if args.redis_url:
+        backends["redis"] = lambda: query_cache.RedisBackend(args.redis_url)
+
+    report = {}
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            for name, backend in backends.items():
+                query_cache.cache = query_cache.QueryCache(backend())
+                report[name] = await replay(client, combinations, args)
+    finally:
+        await db.async_engine.dispose()
+    print(json.dumps({"requests": args.requests,
+                      "combinations": args.combinations,
+                      "write_every": args.write_every,
+                      "results": report}, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--combinations", type=int, default=200,
+                        help="distinct filter combinations to draw from")
+    parser.add_argument("--write-every", type=int, default=100)
+    parser.add_argument("--redis-url")
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,95 @@
+"""
+Times turning a 250-row page of GET /classes/ and GET /dogs/ into a
+response body, with the database out of the picture. The rows are fetched
+once, then shaped and rendered --repeat times each way:
+
+- before: copy each row into a dict in a Python loop, run FastAPI's
+  jsonable_encoder and render with the standard JSONResponse, as the
+  endpoints used to
+- after: dict(row._mapping) per row and ORJSONResponse, as
+  src.api.results does now
+
+Run from the repo root with the POSTGRES_* variables set:
+    python -m benchmarks.serialization --repeat 200
+"""
+import argparse
+import json
+import statistics
+import time
+
+import sqlalchemy
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from src import database as db
+from src.api import results
+
+PAGE = 250
+
+QUERIES = {
+    "GET /classes/": sqlalchemy.text("""
+        SELECT classes.class_id, classes.trainer_id,
+            trainers.first_name || ' ' || trainers.last_name AS trainer_name,
+            type, classes.date, start_time, end_time, room_id,
+            attendee_count AS num_dogs_attended
+        FROM classes
+        JOIN trainers ON trainers.trainer_id = classes.trainer_id
+        JOIN class_types ON class_types.class_type_id = classes.class_type_id
+        ORDER BY classes.date, classes.class_id
+        LIMIT :limit
+    """),
+    "GET /dogs/": sqlalchemy.text("""
+        SELECT dog_id, dog_name AS name, birthday, breed, client_email
+        FROM dogs
+        ORDER BY dog_id
+        LIMIT :limit
+    """),
+}
+
+
+def before(rows):
+    json_rows = []
+    for row in rows:
+        json_rows.append({key: getattr(row, key) for key in row._fields})
+    return JSONResponse(jsonable_encoder(json_rows)).body
+
+
+def after(rows):
+    return results.respond(results.mappings(rows)).body
+
+
+def time_it(shape, rows, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        shape(rows)
+        timings.append(time.perf_counter() - start)
+    return {
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "min_ms": round(min(timings) * 1000, 3),
+    }
+
+
+def main(args):
+    report = {}
+    with db.engine.connect() as conn:
+        for name, stmt in QUERIES.items():
+            rows = conn.execute(stmt, {"limit": PAGE}).fetchall()
+            # both ways must produce the same document
+            assert json.loads(before(rows)) == json.loads(after(rows))
+            report[name] = {
+                "rows": len(rows),
+                "before": time_it(before, rows, args.repeat),
+                "after": time_it(after, rows, args.repeat),
+            }
+            report[name]["speedup"] = round(
+                report[name]["before"]["median_ms"]
+                / report[name]["after"]["median_ms"], 1)
+    print(json.dumps({"repeat": args.repeat, "results": report}, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    main(parser.parse_args())
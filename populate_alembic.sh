@@ -4,4 +4,4 @@ alembic downgrade base
 echo "alembic upgrade head"
 alembic upgrade head
 echo "Populating tables..." 
-py src/fake_data.py
+py -m src.fake_data "$@"
@@ -1,50 +1,72 @@
-from fastapi import APIRouter
-from src import database as db
-import sqlalchemy
+from fastapi import APIRouter, Response, Header
 from fastapi.params import Query
+from pydantic import BaseModel
+from typing import List
+from src import reference_data
+from src.api import pagination, results, versions
 
 router = APIRouter()
 
-@router.get("/class-types/", tags=["class_types"])
-def get_class_types(
+
+class ClassTypeOut(BaseModel):
+    type_id: int
+    type: str
+    description: str
+    max_num_dogs: int
+
+
+@router.get("/class-types/", tags=["class_types"],
+            response_model=List[ClassTypeOut])
+async def get_class_types(
+    response: Response,
     type: str = "", 
     limit: int = Query(50, ge=1, le=250),
-    offset: int = Query(0, ge=0)):
+    offset: int = Query(0, ge=0),
+    cursor: str = None,
+    if_none_match: str = Header(None)):
     """
-    This endpoint returns all of the types of training classes in the database. 
+    This endpoint returns all of the types of training classes in the database,
+    sorted by type_id. 
     For every type, it returns:
     - `type_id`: the id associated with the class type
     - `type`: the type of class
     - `description`: a description of the class
     - `max_num_dogs`: number of dogs that can be in class type
 
-    The endpoint accepts a `limit` and `offset` on the results. 
+    The endpoint accepts a `limit` and either an `offset` or a `cursor` on 
+    the results. When a page is full, the `X-Next-Cursor` response header 
+    holds the `cursor` for the next page.
     
     You can also filter by type with the `type` query parameter. 
     For example, "Puppy" or "Beginner".
+
+    The response carries a weak `ETag` that changes whenever class types
+    do. Send it back in `If-None-Match` to get a `304 Not Modified`.
     """
-    stmt = sqlalchemy.text("""                            
-        SELECT class_type_id, type, description, max_num_dogs
-        FROM class_types  
-        WHERE type ILIKE :type 
-        OFFSET :offset         
-        LIMIT :limit           
-    """)
-
-    with db.engine.connect() as conn:
-        result = conn.execute(stmt, [{"type": f"%{type}%",
-                                      "offset": offset,
-                                      "limit": limit}])
-
-        json = []
-        for row in result:
-            json.append(
-                {
-                    "type_id": row.class_type_id,
-                    "type": row.type,
-                    "description": row.description,
-                    "max_num_dogs": row.max_num_dogs,
-                }
-            )
-
-    return json
\ No newline at end of file
+    pagination.check_paging(cursor, offset)
+    after_id = None
+    if cursor is not None:
+        (after_id,) = pagination.decode_cursor(cursor, int)
+
+    class_types = await reference_data.cache.class_types()
+    # tagged with the version the cached copy was loaded at, so a 304 
+    # needs no round trip at all
+    tag = versions.etag(
+        {"class_types": reference_data.cache.version("class_types")})
+    not_modified = versions.conditional(tag, if_none_match, response)
+    if not_modified is not None:
+        return not_modified
+
+    # case-insensitive substring match, as `type ILIKE '%<type>%'` was
+    rows = [row for row in class_types.values()
+            if type.lower() in row.type.lower()
+            and (after_id is None or row.class_type_id > after_id)]
+    rows = rows[offset:offset + limit] if cursor is None else rows[:limit]
+
+    # the cached rows keep their column names, so type_id is renamed here
+    json = [{"type_id": row.class_type_id, "type": row.type,
+             "description": row.description, "max_num_dogs": row.max_num_dogs}
+            for row in rows]
+
+    pagination.set_next_cursor(response, rows, limit, "class_type_id")
+    return results.respond(json, response)
\ No newline at end of file
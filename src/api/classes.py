@@ -1,18 +1,78 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response, Header
 from src import database as db
+from src import reference_data
+from src import transactions
 from fastapi.params import Query
-from pydantic import BaseModel
+from pydantic import BaseModel, conlist
 import sqlalchemy
 import datetime
 from enum import Enum
-from src.api import rooms
+from typing import List, Union
+from src.api import rooms, pagination, results, versions, query_cache
 
 
 router = APIRouter()
 
+# SQLSTATE raised by the attendance insert trigger when a class is full
+CLASS_FULL = "23514"
 
-@router.get("/classes/{id}", tags=["classes"])
-def get_class(id: int):
+
+class RosterDogOut(BaseModel):
+    dog_id: int
+    dog_name: str
+    check_in_time: datetime.datetime
+
+
+class ClassOut(BaseModel):
+    class_id: int
+    trainer_id: int = None
+    trainer_first_name: str = None
+    trainer_last_name: str = None
+    type: str = None
+    date: datetime.date
+    start_time: datetime.time
+    end_time: datetime.time
+    room_id: int = None
+    room_name: str = None
+    dogs_attended: List[RosterDogOut]
+
+
+class ClassSummaryOut(BaseModel):
+    class_id: int
+    trainer_id: int
+    trainer_name: str
+    type: str
+    date: datetime.date
+    start_time: datetime.time
+    end_time: datetime.time
+    room_id: int = None
+    num_dogs_attended: int
+
+
+# tables GET /classes/{id} joins to, tagged by their versions; the class
+# itself is tagged by its row version, attendee count and newest check-in,
+# so check-ins to other classes leave its ETag alone
+CLASS_TABLES = ("trainers", "class_types", "rooms", "dogs")
+CLASS_VERSION = sqlalchemy.text("""
+    SELECT table_versions.table_name, table_versions.version,
+        CAST(classes.xmin AS TEXT) AS row_version, classes.attendee_count,
+        (
+            SELECT MAX(attendance_id)
+            FROM attendance
+            WHERE attendance.class_id = classes.class_id
+        ) AS last_attendance_id
+    FROM classes
+    LEFT JOIN table_versions
+        ON table_versions.table_name = ANY(CAST(:tables AS TEXT[]))
+    WHERE classes.class_id = :id
+""")
+# every table GET /classes/ reads from; check-ins change attendee_count
+LIST_TABLES = ("classes", "trainers", "class_types", "attendance")
+
+
+@router.get("/classes/{id}", tags=["classes"], response_model=ClassOut)
+async def get_class(id: int, response: Response, 
+                    if_none_match: str = Header(None)):
     """
     This endpoint returns a specific class in the database. For every class, it returns:
     - `class_id`: the id associated with the class
@@ -32,58 +92,55 @@ def get_class(id: int):
     - `dog_id`: the id of the dog
     - `dog_name`: the name of the dog
     - `check_in_time`: the time the dog checked into the class
+
+    The response carries a weak `ETag` that changes whenever the class or
+    its check-ins change, or any trainer, type, room or dog may have. Send it back in 
+    `If-None-Match` to get a `304 Not Modified` while nothing has changed.
     """
-    stmt = sqlalchemy.text("""                            
-        SELECT classes.class_id, trainers.first_name as first, 
-            trainers.last_name as last,
-            class_types.type, class_types.description, 
-            date, start_time, end_time,
-            dogs.dog_id, dogs.dog_name, attendance.check_in,
-            trainers.trainer_id as trainer_id, 
-            rooms.room_id, room_name
+    stmt = sqlalchemy.text("""
+        SELECT classes.class_id, trainers.trainer_id, 
+            trainers.first_name AS trainer_first_name, 
+            trainers.last_name AS trainer_last_name,
+            class_types.type, date, start_time, end_time,
+            rooms.room_id, room_name,
+            (
+                SELECT COALESCE(json_agg(roster ORDER BY roster.dog_id), '[]')
+                FROM (
+                    SELECT dogs.dog_id, dogs.dog_name, 
+                        attendance.check_in AS check_in_time
+                    FROM attendance
+                    JOIN dogs ON dogs.dog_id = attendance.dog_id
+                    WHERE attendance.class_id = classes.class_id
+                ) AS roster
+            ) AS dogs_attended
         FROM classes
         LEFT JOIN trainers on trainers.trainer_id = classes.trainer_id
-        LEFT JOIN attendance on attendance.class_id = classes.class_id
         LEFT JOIN class_types on class_types.class_type_id = classes.class_type_id
-        LEFT JOIN dogs on dogs.dog_id = attendance.dog_id
         LEFT JOIN rooms ON rooms.room_id = classes.room_id
-        WHERE classes.class_id = :id  
-        ORDER BY dogs.dog_id
+        WHERE classes.class_id = :id
     """)
-    with db.engine.connect() as conn:
-        result = conn.execute(stmt, [{"id": id}])
-
-        dogs_attending =  result.fetchall()
-        
-        if dogs_attending == []:
+    async with db.async_engine.connect() as conn:
+        probe = (await conn.execute(CLASS_VERSION, [
+            {"id": id, "tables": list(CLASS_TABLES)}
+        ])).fetchall()
+        if probe == []:
             raise HTTPException(status_code=404, detail="class not found.")
-        
-        class_info = dogs_attending[0]  
-        json = {
-            "class_id": class_info.class_id,
-            "trainer_id": class_info.trainer_id,
-            "trainer_first_name": class_info.first,
-            "trainer_last_name": class_info.last,
-            "type": class_info.type,
-            "date": class_info.date,
-            "start_time": class_info.start_time,
-            "end_time": class_info.end_time,
-            "room_id": class_info.room_id,
-            "room_name": class_info.room_name,
-            "dogs_attended": []
-        }
+        state = probe[0]
+        tag = versions.etag({row.table_name: row.version for row in probe},
+                            id, state.row_version, state.attendee_count,
+                            state.last_attendance_id)
+        not_modified = versions.conditional(tag, if_none_match, response)
+        if not_modified is not None:
+            return not_modified
+        class_info = (await conn.execute(stmt, [{"id": id}])).one_or_none()
 
-        if class_info.dog_id is not None:
-            for row in dogs_attending:            
-                json["dogs_attended"].append(
-                    {
-                        "dog_id": row.dog_id,
-                        "dog_name": row.dog_name,
-                        "check_in_time": row.check_in
-                    }
-                )
-    
-    return json
+    if class_info is None:
+        raise HTTPException(status_code=404, detail="class not found.")
+
+    json = results.mapping(class_info)
+    for row in json["dogs_attended"]:
+        row["check_in_time"] = results.pg_timestamp(row["check_in_time"])
+    return results.respond(json, response)
 
 
 class DayOptions(str, Enum):
@@ -96,34 +153,90 @@ class DayOptions(str, Enum):
     sat = "Saturday"    
 
 
+# ISO day of week, as returned by EXTRACT(ISODOW FROM date)
+ISODOW = {
+    DayOptions.mon: 1,
+    DayOptions.tues: 2,
+    DayOptions.wed: 3,
+    DayOptions.thurs: 4,
+    DayOptions.fri: 5,
+    DayOptions.sat: 6,
+    DayOptions.sun: 7,
+}
+
+
 class time_options(str, Enum):
     morning = "morning (8AM-11AM)"
     midday = "midday (11AM-2PM)"
     afternoon = "afternoon (2PM-5PM)"
 
 
-@router.get("/classes/", tags=["classes"])
-def get_classes(class_type_id: int = None,
+TIME_RANGES = {
+    time_options.morning: (datetime.time(8), datetime.time(11)),
+    time_options.midday: (datetime.time(11), datetime.time(14)),
+    time_options.afternoon: (datetime.time(14), datetime.time(17)),
+}
+
+
+def class_filters(date=None, class_type_id=None, trainer_id=None,
+                  time_range=None, days=None):
+    """
+    Builds the WHERE predicates for the filters that were actually given, 
+    so each one is a plain comparison on a classes column the planner can 
+    match to an index. Returns the predicates and their bind parameters.
+    """
+    where = []
+    params = {}
+    if date is not None:
+        where.append("classes.date >= :date")
+        params["date"] = date
+    if class_type_id is not None:
+        where.append("classes.class_type_id = :type_id")
+        params["type_id"] = class_type_id
+    if trainer_id is not None:
+        where.append("classes.trainer_id = :trainer_id")
+        params["trainer_id"] = trainer_id
+    if time_range is not None:
+        where.append("""classes.start_time BETWEEN :range_start AND :range_end
+            AND classes.end_time BETWEEN :range_start AND :range_end""")
+        params["range_start"], params["range_end"] = TIME_RANGES[time_range]
+    if days:
+        # matches the classes_isodow_idx expression index
+        where.append("EXTRACT(ISODOW FROM classes.date) = ANY(:days)")
+        params["days"] = sorted({ISODOW[day] for day in days})
+    return where, params
+
+
+# a search without matches returns a message string rather than []
+@router.get("/classes/", tags=["classes"],
+            response_model=Union[List[ClassSummaryOut], str])
+async def get_classes(response: Response,
+                 class_type_id: int = None,
                  date: str = None,
                  trainer_id: int = None,
-                 time_range: time_options = None,                 
-                 day1: DayOptions = None,
-                 day2: DayOptions = None,
-                 day3: DayOptions = None,
-                 day4: DayOptions = None,
-                 day5: DayOptions = None,
-                 day6: DayOptions = None,
-                 day7: DayOptions = None,
-                 limit: int = Query(50, ge=1, le=250)
-                 
+                 time_range: time_options = None,
+                 days: List[DayOptions] = Query(None),
+                 day1: DayOptions = Query(None, deprecated=True),
+                 day2: DayOptions = Query(None, deprecated=True),
+                 day3: DayOptions = Query(None, deprecated=True),
+                 day4: DayOptions = Query(None, deprecated=True),
+                 day5: DayOptions = Query(None, deprecated=True),
+                 day6: DayOptions = Query(None, deprecated=True),
+                 day7: DayOptions = Query(None, deprecated=True),
+                 limit: int = Query(50, ge=1, le=250),
+                 offset: int = Query(0, ge=0),
+                 cursor: str = None
 ):    
-    # has complex transaction             
     """
     This endpoint finds classes that meet the given criteria. 
     You can filter by trainer_id, class_type_id, a time range, and
-    days of the week. If a date is specified, only classes that 
+    days of the week. Repeat `days` to match several days, 
+    e.g. `?days=Monday&days=Thursday` (`day1`-`day7` still work but are 
+    deprecated). If a date is specified, only classes that 
     occur on or after the date will be returned. 
-    It accepts a limit and is sorted by date in ascending order. 
+    It accepts a limit and either an offset or a cursor, and is sorted by 
+    date in ascending order. When a page is full, the `X-Next-Cursor` 
+    response header holds the cursor for the next page.
 
     For every class, it returns:
     - `class_id`: the id associated with the class
@@ -136,95 +249,62 @@ def get_classes(class_type_id: int = None,
     - `room_id`: the id of the room the class takes place in
     - `num_of_dogs_attended`: the number of dogs attending the class
     """
-    if time_range == time_options.morning:
-        time_range = ("08:00:00 AM", "11:00:00 AM")
-    elif time_range == time_options.midday:
-        time_range = ("11:00:00 AM", "2:00:00 PM")
-    elif time_range == time_options.afternoon:
-        time_range = ("2:00:00 PM", "5:00:00 PM")
+    # asyncpg binds typed parameters, so the date is parsed here
+    if date is not None:
+        date = datetime.datetime.strptime(date, "%Y-%m-%d").date()
+
+    days = list(days or []) + [day for day in 
+                               (day1, day2, day3, day4, day5, day6, day7)
+                               if day is not None]
+    where, params = class_filters(date, class_type_id, trainer_id, 
+                                  time_range, days)
+    params["limit"] = limit
+
+    pagination.check_paging(cursor, offset)
+    skip = ""
+    if cursor is None:
+        skip = "OFFSET :offset"
+        params["offset"] = offset
     else:
-        time_range = (None, None)
-    
-
-    with db.engine.connect() as conn:
+        where.append("(classes.date, classes.class_id) > (:after_date, :after_id)")
+        params["after_date"], params["after_id"] = \
+            pagination.decode_cursor(cursor, datetime.date.fromisoformat, int)
+
+    where_clause = ("WHERE " + " AND ".join(where)) if where else ""
+
+    stmt = sqlalchemy.text(f"""
+        SELECT classes.class_id, classes.trainer_id, 
+            trainers.first_name || ' ' || trainers.last_name 
+                AS trainer_name,
+            type, classes.date, start_time, end_time, room_id, 
+            attendee_count AS num_dogs_attended
+        FROM classes
         
-        valid_classes = conn.execute(sqlalchemy.text("""
-            SELECT classes.class_id, classes.trainer_id, type, classes.date,
-                start_time, end_time, trainers.first_name,
-                trainers.last_name, room_id,
-                COUNT(attendance) as num_dogs
-            FROM classes
-            
-            JOIN trainers ON trainers.trainer_id = classes.trainer_id
-            JOIN class_types ON 
-                class_types.class_type_id = classes.class_type_id
-            LEFT JOIN attendance on attendance.class_id = classes.class_id
-
-            WHERE (:date IS NULL OR classes.date >= CAST(:date AS DATE)) AND 
-                (classes.class_type_id = :type_id OR :type_id IS NULL) AND
-                ((to_char(date, 'Day') LIKE :day1 OR
-                to_char(date, 'Day') LIKE :day2 OR
-                to_char(date, 'Day') LIKE :day3 OR
-                to_char(date, 'Day') LIKE :day4 OR
-                to_char(date, 'Day') LIKE :day5 OR
-                to_char(date, 'Day') LIKE :day6 OR
-                to_char(date, 'Day') LIKE :day7                 
-                ) OR 
-                (:day1 LIKE 'None%' AND 
-                :day2 LIKE 'None%' AND
-                :day3 LIKE 'None%' AND
-                :day4 LIKE 'None%' AND
-                :day5 LIKE 'None%' AND
-                :day6 LIKE 'None%' AND
-                :day7 LIKE 'None%'  ) ) AND
-
-                (:range_start IS NULL OR
-                    (CAST(:range_start AS TIME) <= classes.start_time 
-                    AND CAST(:range_end AS TIME) >= classes.start_time)
-                    AND (CAST(:range_start AS TIME) <= classes.end_time 
-                    AND CAST(:range_end AS TIME) >= classes.end_time))
-                AND (:trainer_id IS NULL OR classes.trainer_id = :trainer_id)
-
-            GROUP BY classes.class_id, classes.trainer_id, type, classes.date,
-                start_time, end_time, trainers.first_name,
-                trainers.last_name, room_id
-
-            ORDER BY date ASC
-            LIMIT :limit
-        """), [{
-                "type_id": class_type_id,
-                "date": date,
-                "day1": f"{day1}%",
-                "day2": f"{day2}%",
-                "day3": f"{day3}%",
-                "day4": f"{day4}%",
-                "day5": f"{day5}%",
-                "day6": f"{day6}%",
-                "day7": f"{day7}%",
-                "limit": limit,
-                "range_start": time_range[0],
-                "range_end": time_range[1],
-                "trainer_id": trainer_id
-                }]).fetchall()
-        json = []
-        for row in valid_classes:
-            json.append(
-                {
-                    "class_id": row.class_id,
-                    "trainer_id": row.trainer_id,
-                    "trainer_name": row.first_name + " " + row.last_name,
-                    "type": row.type,
-                    "date": row.date,
-                    "start_time": row.start_time,
-                    "end_time": row.end_time,
-                    "room_id": row.room_id,
-                    "num_dogs_attended": row.num_dogs
-                }
-            )
-        if json == []:
-            return "There are no classes that match this criteria."
-        return json
-    
+        JOIN trainers ON trainers.trainer_id = classes.trainer_id
+        JOIN class_types ON 
+            class_types.class_type_id = classes.class_type_id
+
+        {where_clause}
+
+        ORDER BY classes.date ASC, classes.class_id ASC
+        LIMIT :limit
+        {skip}
+    """)
+
+    async with db.async_engine.connect() as conn:
+        async def run():
+            return results.mappings(
+                (await conn.execute(stmt, [params])).fetchall())
+
+        # params holds the filters as the query binds them, so equivalent
+        # requests (e.g. days given in another order) share an entry
+        valid_classes = await query_cache.cache.fetch(
+            conn, "GET /classes/", params, LIST_TABLES, run)
+    if valid_classes == []:
+        return "There are no classes that match this criteria."
+    pagination.set_next_cursor(response, valid_classes, limit, 
+                               "date", "class_id")
+    return results.respond(valid_classes, response)
 
 
 class ClassJson(BaseModel):
@@ -237,7 +317,7 @@ class ClassJson(BaseModel):
     
 
 @router.post("/classes/", tags=["classes"])
-def add_classes(new_class: ClassJson):
+async def add_classes(new_class: ClassJson):
     
     """
     This endpoint adds a new class to a trainer's schedule.
@@ -257,35 +337,34 @@ def add_classes(new_class: ClassJson):
 
     try:
 
-        with db.engine.connect().execution_options(
-            isolation_level="SERIALIZABLE"
-        ) as conn:
-            with conn.begin():
-
-                stm = sqlalchemy.text("""
-                    INSERT INTO classes 
-                    (trainer_id, date, start_time, end_time, class_type_id, room_id)
-                    VALUES (:trainer_id, :date, :start, :end, :class_type, :room)
-                    RETURNING class_id
-                """)
-
-                # convert from string format to datetime format
-                class_date = datetime.datetime.strptime(new_class.date, 
-                                                        "%Y-%m-%d").date()
-                start_time = datetime.datetime.strptime(new_class.start_time, 
-                                                        "%I:%M %p").time()
-                end_time = datetime.datetime.strptime(new_class.end_time, 
-                                                      "%I:%M %p").time()
-                
-                if end_time < start_time:                                
-                    raise HTTPException(status_code=404, 
-                                        detail="end_time should be after start_time")
-                    
-                # check that room is available at given date/time
-                rooms.find_room(class_date, start_time, 
-                                end_time, conn, new_class.room_id)
-
-                class_id = conn.execute(stm, [
+        stm = sqlalchemy.text("""
+            INSERT INTO classes 
+            (trainer_id, date, start_time, end_time, class_type_id, room_id)
+            VALUES (:trainer_id, :date, :start, :end, :class_type, :room)
+            RETURNING class_id
+        """)
+
+        # convert from string format to datetime format
+        class_date = datetime.datetime.strptime(new_class.date, 
+                                                "%Y-%m-%d").date()
+        start_time = datetime.datetime.strptime(new_class.start_time, 
+                                                "%I:%M %p").time()
+        end_time = datetime.datetime.strptime(new_class.end_time, 
+                                              "%I:%M %p").time()
+        
+        if end_time <= start_time:                                
+            raise HTTPException(status_code=404, 
+                                detail="end_time should be after start_time")
+
+        # no SERIALIZABLE needed: classes_room_booking_excl rejects 
+        # overlapping bookings even when two requests race
+        async def add(conn):
+            # check that room is available at given date/time
+            await rooms.find_room(class_date, start_time, 
+                            end_time, conn, new_class.room_id)
+
+            try:
+                return (await conn.execute(stm, [
                     { 
                         "trainer_id": new_class.trainer_id,
                         "date": class_date,
@@ -294,9 +373,15 @@ def add_classes(new_class: ClassJson):
                         "class_type": new_class.class_type_id,
                         "room": new_class.room_id
                     }
-                ]).scalar_one()
+                ])).scalar_one()
+            except sqlalchemy.exc.IntegrityError as error:
+                if error.orig.pgcode == rooms.EXCLUSION_VIOLATION:
+                    raise HTTPException(status_code=404, 
+                                        detail=rooms.ROOM_UNAVAILABLE)
+                raise
 
-                return f"class_id added: {class_id}"
+        class_id = await transactions.run(add)
+        return f"class_id added: {class_id}"
     
     except Exception as error:
         if error.args != ():
@@ -308,8 +393,176 @@ def add_classes(new_class: ClassJson):
             raise
 
 
+# longest series accepted in one request, about a year of daily classes
+MAX_SERIES_OCCURRENCES = 366
+
+
+class ClassSeriesJson(BaseModel):
+    trainer_id: int
+    days: List[DayOptions]
+    start_date: str = "yyyy-mm-dd"
+    end_date: str = "yyyy-mm-dd"
+    start_time: str = "hh:mm AM/PM"
+    end_time: str = "hh:mm AM/PM"
+    class_type_id: int
+    room_id: int
+
+
+def series_dates(start_date, end_date, days):
+    """Returns every date from start_date to end_date on one of the days."""
+    weekdays = {ISODOW[day] for day in days}
+    dates = []
+    date = start_date
+    while date <= end_date:
+        if date.isoweekday() in weekdays:
+            dates.append(date)
+        date += datetime.timedelta(days=1)
+    return dates
+
+
+@router.post("/classes/series", tags=["classes"])
+async def add_class_series(series: ClassSeriesJson):
+    """
+    This endpoint adds a recurring class to a trainer's schedule, one class
+    on each of the given days of the week from start_date to end_date.
+    Occurrences whose room is already booked are skipped and reported; the
+    rest are added.
+    - `trainer_id`: id of the trainer teaching the classes
+    - `days`: the days of the week the class repeats on
+    - `start_date`, `end_date`: the first and last day of the series,
+    given as "yyyy-mm-dd"
+    - `start_time`, `end_time`: when each class starts and ends,
+    given as "hh:mm AM/PM"
+    - `class_type_id`: the id of the type of class
+    - `room_id`: the id of the room the trainer wants to teach in
+
+    It returns:
+    - `added`: the `class_id` and `date` of each class added
+    - `conflicts`: the `date` of each occurrence that wasn't added and the
+    `class_id` of the class already booked in the room then
+    """
+    try:
+        start_date = datetime.datetime.strptime(series.start_date,
+                                                "%Y-%m-%d").date()
+        end_date = datetime.datetime.strptime(series.end_date,
+                                              "%Y-%m-%d").date()
+        start_time = datetime.datetime.strptime(series.start_time,
+                                                "%I:%M %p").time()
+        end_time = datetime.datetime.strptime(series.end_time,
+                                              "%I:%M %p").time()
+
+        if end_time <= start_time:
+            raise HTTPException(status_code=404,
+                                detail="end_time should be after start_time")
+        if end_date < start_date:
+            raise HTTPException(status_code=404,
+                                detail="end_date should be after start_date")
+
+        dates = series_dates(start_date, end_date, series.days)
+        if dates == []:
+            raise HTTPException(status_code=404,
+                                detail="the series has no occurrences.")
+        if len(dates) > MAX_SERIES_OCCURRENCES:
+            raise HTTPException(status_code=404,
+                detail=f"a series can have at most {MAX_SERIES_OCCURRENCES} "
+                       "occurrences.")
+
+        # every occurrence is checked against the room's bookings in one
+        # join, and the free ones are inserted by the same statement;
+        # ON CONFLICT DO NOTHING skips any booked by a concurrent request
+        stm = sqlalchemy.text("""
+            WITH occurrence AS (
+                SELECT date
+                FROM unnest(CAST(:dates AS DATE[])) AS date
+            ),
+            conflict AS (
+                SELECT occurrence.date, classes.class_id
+                FROM occurrence
+                JOIN classes ON classes.room_id = CAST(:room AS INTEGER)
+                    AND classes.booking && tsrange(
+                        occurrence.date + CAST(:start AS TIME),
+                        occurrence.date + CAST(:end AS TIME), '[)')
+            ),
+            added AS (
+                INSERT INTO classes
+                (trainer_id, date, start_time, end_time, class_type_id, room_id)
+                SELECT CAST(:trainer_id AS INTEGER), date,
+                    CAST(:start AS TIME), CAST(:end AS TIME),
+                    CAST(:class_type AS INTEGER), CAST(:room AS INTEGER)
+                FROM occurrence
+                WHERE date NOT IN (SELECT date FROM conflict)
+                ORDER BY date
+                ON CONFLICT DO NOTHING
+                RETURNING class_id, date
+            )
+            SELECT date, class_id, TRUE AS added FROM added
+            UNION ALL
+            SELECT date, class_id, FALSE AS added FROM conflict
+        """)
+
+        async def add(conn):
+            rooms_by_id = await reference_data.cache.rooms(conn)
+            if series.room_id not in rooms_by_id:
+                raise HTTPException(status_code=404,
+                                    detail=rooms.ROOM_UNAVAILABLE)
+
+            return (await conn.execute(stm, [
+                {
+                    "dates": dates,
+                    "trainer_id": series.trainer_id,
+                    "start": start_time,
+                    "end": end_time,
+                    "class_type": series.class_type_id,
+                    "room": series.room_id
+                }
+            ])).fetchall()
+
+        rows = await transactions.run(add)
+
+        added = sorted(({"class_id": row.class_id, "date": row.date}
+                        for row in rows if row.added),
+                       key=lambda x: x["date"])
+        conflicts = {row.date: row.class_id for row in rows if not row.added}
+        # an occurrence neither added nor in conflict lost a race with
+        # another booking made while this statement ran
+        added_dates = {row["date"] for row in added}
+        for date in dates:
+            if date not in added_dates and date not in conflicts:
+                conflicts[date] = None
+
+        return {
+            "added": added,
+            "conflicts": [{"date": date, "class_id": conflicts[date]}
+                          for date in sorted(conflicts)]
+        }
+
+    except Exception as error:
+        if error.args != ():
+            details = (error.args)[0]
+            if "DETAIL:  " in details:
+                details = details.split("DETAIL:  ")[1].replace("\n", "")
+            raise HTTPException(status_code=404, detail=details)
+        else:
+            raise
+
+
+async def class_capacity(conn, class_id):
+    """
+    Locks a class's row and returns its capacity and how many dogs are
+    checked in. The lock makes check-ins to the class wait for this
+    transaction, so the numbers hold until it commits. Returns None if the
+    class doesn't exist.
+    """
+    return (await conn.execute(sqlalchemy.text("""
+        SELECT capacity, attendee_count
+        FROM classes
+        WHERE class_id = :class_id
+        FOR UPDATE
+    """), [{"class_id": class_id}])).one_or_none()
+
+
 @router.post("/classes/{id}/attendance", tags=["classes"])
-def add_attendance(id: int, dog_id: int):
+async def add_attendance(id: int, dog_id: int):
     """
     This endpoint adds a dog's attendance to a specific class.
     - `attendance_id`: the id of the attendance record
@@ -319,45 +572,25 @@ def add_attendance(id: int, dog_id: int):
 
     try:
 
-        with db.engine.begin() as conn:
+        async with db.async_engine.begin() as conn:
             stm = sqlalchemy.text("""
                 SELECT attendance_id
                 FROM attendance
                 WHERE dog_id = :dog_id AND class_id = :class_id           
             """)
-            result = conn.execute(stm, [
+            result = (await conn.execute(stm, [
                 {
                     "dog_id": dog_id,
                     "class_id": id,
                 }
-            ]).one_or_none()
+            ])).one_or_none()
             if result is not None:
                 raise HTTPException(status_code=404, 
                                     detail="dog already checked into this class.")
-            
-            cap_check_stmt = sqlalchemy.text("""
-                SELECT COUNT(attendance_id) AS num_attending
-                FROM attendance
-                RIGHT JOIN classes ON attendance.class_id = classes.class_id
-                RIGHT JOIN rooms ON classes.room_id = rooms.room_id
-                RIGHT JOIN class_types ON 
-                    classes.class_type_id = class_types.class_type_id
-                WHERE classes.class_id = :class_id
-                GROUP BY classes.class_id,  rooms.max_dog_capacity, 
-                    class_types.max_num_dogs
-                HAVING COUNT(attendance_id)  < rooms.max_dog_capacity AND
-                    COUNT(attendance_id) < class_types.max_num_dogs      
-            """)
-            result = conn.execute(cap_check_stmt, [
-                {
-                    "class_id": id
-                }
-            ]).fetchall()
-            
-            if result == []:
-                raise HTTPException(status_code=404, 
-                                    detail="class is full")
 
+            # the insert trigger bumps classes.attendee_count with a
+            # conditional UPDATE under the class's row lock and fails the
+            # insert if the class is already full
             stm = sqlalchemy.text("""
                 INSERT INTO attendance 
                 (dog_id, class_id)
@@ -365,14 +598,98 @@ def add_attendance(id: int, dog_id: int):
                 RETURNING attendance_id               
             """)
 
-            attendance_id = conn.execute(stm, [
+            try:
+                attendance_id = (await conn.execute(stm, [
+                    {
+                        "dog_id": dog_id,
+                        "class_id": id,
+                    }
+                ])).scalar_one()
+            except sqlalchemy.exc.IntegrityError as error:
+                if error.orig.pgcode == CLASS_FULL:
+                    raise HTTPException(status_code=404, 
+                                        detail="class is full")
+                raise
+
+            return f"attendance_id added: {attendance_id}" 
+
+    except Exception as error:
+        if error.args != ():
+            details = (error.args)[0]
+            if "DETAIL:  " in details:
+                details = details.split("DETAIL:  ")[1].replace("\n", "")
+            raise HTTPException(status_code=404, detail=details)
+        else:
+            raise
+
+
+class AttendanceBatchJson(BaseModel):
+    dog_ids: conlist(int, min_items=1, max_items=250)
+
+
+@router.post("/classes/{id}/attendance/batch", tags=["classes"])
+async def add_attendance_batch(id: int, batch: AttendanceBatchJson):
+    """
+    This endpoint checks a list of dogs into a specific class in one
+    transaction. Dogs are admitted in the order given until the class is
+    full. For each dog, it returns:
+    - `dog_id`: the id of the dog
+    - `status`: one of `added`, `duplicate` (already checked in or listed
+    twice), `class full` or `dog not found`
+    - `attendance_id`: the id of the new attendance record, or null
+    """
+    try:
+        async with db.async_engine.begin() as conn:
+            counts = await class_capacity(conn, id)
+            if counts is None:
+                raise HTTPException(status_code=404, detail="class not found.")
+            capacity, num_attending = counts
+
+            stm = sqlalchemy.text("""
+                SELECT ids.dog_id,
+                    dogs.dog_id IS NOT NULL AS dog_exists,
+                    attendance.attendance_id IS NOT NULL AS checked_in
+                FROM unnest(CAST(:dog_ids AS INTEGER[])) AS ids(dog_id)
+                LEFT JOIN dogs ON dogs.dog_id = ids.dog_id
+                LEFT JOIN attendance ON attendance.dog_id = ids.dog_id
+                    AND attendance.class_id = :class_id
+            """)
+            known = {row.dog_id: row for row in (await conn.execute(stm, [
                 {
-                    "dog_id": dog_id,
+                    "dog_ids": batch.dog_ids,
                     "class_id": id,
                 }
-            ]).scalar_one()
-
-            return f"attendance_id added: {attendance_id}" 
+            ])).fetchall()}
+
+            outcomes = []
+            admitted = []
+            for dog_id in batch.dog_ids:
+                row = known[dog_id]
+                if not row.dog_exists:
+                    status = "dog not found"
+                elif row.checked_in or dog_id in admitted:
+                    status = "duplicate"
+                elif num_attending + len(admitted) >= capacity:
+                    status = "class full"
+                else:
+                    status = "added"
+                    admitted.append(dog_id)
+                outcomes.append({"dog_id": dog_id, "status": status})
+
+            attendance_ids = {}
+            if admitted:
+                stm = sqlalchemy.text("""
+                    INSERT INTO attendance
+                    (dog_id, class_id)
+                    SELECT unnest(CAST(:dog_ids AS INTEGER[])), :class_id
+                    RETURNING dog_id, attendance_id
+                """)
+                attendance_ids = dict((await conn.execute(stm, [
+                    {
+                        "dog_ids": admitted,
+                        "class_id": id,
+                    }
+                ])).fetchall())
 
     except Exception as error:
         if error.args != ():
@@ -382,33 +699,36 @@ def add_attendance(id: int, dog_id: int):
             raise HTTPException(status_code=404, detail=details)
         else:
             raise
-        
+
+    for outcome in outcomes:
+        outcome["attendance_id"] = (attendance_ids.get(outcome["dog_id"])
+                                    if outcome["status"] == "added" else None)
+    return outcomes
+
 
 @router.delete("/classes/{id}", tags=["classes"])
-def delete_class(id: int):
+async def delete_class(id: int):
     """
     This endpoint deletes a class based on its class ID.
     """
-    try:
-        with db.engine.connect().execution_options(
-            isolation_level="SERIALIZABLE"
-        ) as conn:
-            with conn.begin():
-                result = conn.execute(sqlalchemy.text("""SELECT class_id
-                                                FROM classes 
-                                                where class_id = :id
-                                            """), 
-                                            [{"id": id}]).one_or_none()
-                if result is None:
-                    raise HTTPException(status_code=404, 
-                            detail=("class_id does not exist in classes table."))
-
-                conn.execute(sqlalchemy.text("""DELETE 
-                                            FROM classes 
-                                            where class_id = :id"""), 
-                                            [{"id": id}])
+    async def delete(conn):
+        result = (await conn.execute(sqlalchemy.text("""SELECT class_id
+                                        FROM classes 
+                                        where class_id = :id
+                                    """), 
+                                    [{"id": id}])).one_or_none()
+        if result is None:
+            raise HTTPException(status_code=404, 
+                    detail=("class_id does not exist in classes table."))
+
+        await conn.execute(sqlalchemy.text("""DELETE 
+                                    FROM classes 
+                                    where class_id = :id"""), 
+                                    [{"id": id}])
 
-                return f"class_id deleted: {id}"
+    try:
+        await transactions.run(delete, isolation_level="SERIALIZABLE")
+        return f"class_id deleted: {id}"
     
     except Exception as error:
         if error.args != ():
@@ -0,0 +1,81 @@
+from fastapi import APIRouter, Response
+from src import database as db
+import sqlalchemy
+import datetime
+from fastapi.params import Query
+from pydantic import BaseModel
+from typing import List
+from src.api import pagination, results
+
+router = APIRouter()
+
+
+class CommentOut(BaseModel):
+    comment_id: int
+    dog_id: int
+    dog_name: str
+    trainer: str
+    time_added: datetime.datetime
+    text: str
+
+
+@router.get("/comments/search", tags=["comments"],
+            response_model=List[CommentOut])
+async def search_comments(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(50, ge=1, le=250),
+    offset: int = Query(0, ge=0),
+    cursor: str = None
+):
+    """
+    This endpoint finds trainer comments matching a search, newest first. 
+    `q` takes words, "quoted phrases", `or` and `-excluded` words, and 
+    matches other forms of the same words, so "advance" finds 
+    "Ready to move into a more advanced class".
+    For every comment, it returns:
+    - `comment_id`: the id of the comment
+    - `dog_id`: the id of the dog the comment is about
+    - `dog_name`: the name of the dog
+    - `trainer`: the name of the trainer who wrote the comment
+    - `time_added`: the day and time the comment was made
+    - `text`: the comment text
+
+    You can page with `limit` and either `offset` or `cursor`. When a page
+    is full, the `X-Next-Cursor` response header holds the `cursor` 
+    for the next page.
+    """
+    pagination.check_paging(cursor, offset)
+    params = {"q": q, "limit": limit}
+    if cursor is None:
+        keyset, skip = "", "OFFSET :offset"
+        params["offset"] = offset
+    else:
+        keyset = """AND (comments.time_added, comments.comment_id) 
+            < (:after_time, :after_id)"""
+        skip = ""
+        params["after_time"], params["after_id"] = pagination.decode_cursor(
+            cursor, datetime.datetime.fromisoformat, int)
+
+    # the to_tsvector expression matches comments_text_search_idx
+    stmt = sqlalchemy.text(f"""
+        SELECT comments.comment_id, comments.dog_id, dogs.dog_name,
+            trainers.first_name || ' ' || trainers.last_name AS trainer,
+            comments.time_added, comments.comment_text AS text
+        FROM comments
+        JOIN dogs ON dogs.dog_id = comments.dog_id
+        JOIN trainers ON trainers.trainer_id = comments.trainer_id
+        WHERE to_tsvector('english', comments.comment_text) 
+            @@ websearch_to_tsquery('english', :q)
+        {keyset}
+        ORDER BY comments.time_added DESC, comments.comment_id DESC
+        {skip}
+        LIMIT :limit
+    """)
+
+    async with db.async_engine.connect() as conn:
+        rows = (await conn.execute(stmt, [params])).fetchall()
+
+    pagination.set_next_cursor(response, rows, limit, 
+                               "time_added", "comment_id")
+    return results.respond(results.mappings(rows), response)
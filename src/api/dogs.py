@@ -1,14 +1,60 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response, Header
 from src import database as db
 import sqlalchemy
+import datetime
 from pydantic import BaseModel
 from fastapi.params import Query
+from typing import List
+from src.api import pagination, results, versions
 
 router = APIRouter()
 
 
-@router.get("/dogs/{id}", tags=["dogs"])
-def get_dog(id: int):
+COMMENTS_CURSOR_HEADER = "X-Next-Comments-Cursor"
+CLASSES_CURSOR_HEADER = "X-Next-Classes-Cursor"
+
+# every table GET /dogs/{id} reads from
+DOG_TABLES = ("dogs", "comments", "trainers", "attendance")
+
+
+class DogCommentOut(BaseModel):
+    comment_id: int
+    trainer: str
+    time_added: datetime.datetime
+    text: str
+
+
+class DogClassOut(BaseModel):
+    class_id: int
+    check_in: datetime.datetime
+
+
+class DogOut(BaseModel):
+    dog_id: int
+    name: str
+    client_email: str
+    birthday: datetime.date
+    breed: str
+    trainer_comments: List[DogCommentOut]
+    classes_attended: List[DogClassOut]
+
+
+class DogSummaryOut(BaseModel):
+    dog_id: int
+    name: str
+    birthday: datetime.date
+    breed: str
+    client_email: str
+
+
+@router.get("/dogs/{id}", tags=["dogs"], response_model=DogOut)
+async def get_dog(id: int, 
+                  response: Response,
+                  comments_limit: int = Query(50, ge=1, le=250),
+                  comments_cursor: str = None,
+                  classes_limit: int = Query(50, ge=1, le=250),
+                  classes_cursor: str = None,
+                  if_none_match: str = Header(None)):
     """
     This endpoint returns information about a dog in the database. 
     For every dog, it returns:
@@ -18,7 +64,9 @@ def get_dog(id: int):
     - `birthday`: the dog's date of birth (nullable)
     - `breed`: the dog's breed (nullable)
     - `trainer_comments`: a list of comments from the 
-            trainer about the dog's progress 
+            trainer about the dog's progress, newest first
+    - `classes_attended`: the classes the dog checked into, 
+            in check-in order
 
     Each comment returns:
     - `comment_id`: the id of the comment
@@ -26,60 +74,96 @@ def get_dog(id: int):
     - `time_added`: the day and time the comment was made
     - `text`: the comment text
 
+    Each class returns:
+    - `class_id`: the id of the class
+    - `check_in`: the day and time the dog checked in
+
+    Each list holds up to `comments_limit` or `classes_limit` entries. When
+    a list is full, the `X-Next-Comments-Cursor` or `X-Next-Classes-Cursor`
+    response header holds the `comments_cursor` or `classes_cursor` for 
+    the next page of it.
+
+    The response carries a weak `ETag` that changes whenever the dog, its
+    comments or its check-ins may have. Send it back in `If-None-Match` to
+    get a `304 Not Modified` while nothing has changed.
     """
-    stmt = sqlalchemy.text("""                            
-        SELECT dogs.dog_id, dogs.dog_name, dogs.client_email, 
-            dogs.birthday, dogs.breed, comments.comment_id,
-            comments.time_added, comments.comment_text,
-            trainers.first_name, trainers.last_name
+    params = {"id": id, 
+              "comments_limit": comments_limit, 
+              "classes_limit": classes_limit}
+    comments_keyset = classes_keyset = ""
+    if comments_cursor is not None:
+        comments_keyset = """AND (comments.time_added, comments.comment_id) 
+            < (:comments_after_time, :comments_after_id)"""
+        params["comments_after_time"], params["comments_after_id"] = \
+            pagination.decode_cursor(comments_cursor, 
+                                     datetime.datetime.fromisoformat, int)
+    if classes_cursor is not None:
+        classes_keyset = """AND (attendance.check_in, attendance.attendance_id)
+            > (:classes_after_time, :classes_after_id)"""
+        params["classes_after_time"], params["classes_after_id"] = \
+            pagination.decode_cursor(classes_cursor, 
+                                     datetime.datetime.fromisoformat, int)
+
+    # one round trip: each list is built by Postgres from a range scan of
+    # comments_dog_time_idx or attendance_dog_check_in_idx
+    stmt = sqlalchemy.text(f"""
+        SELECT dogs.dog_id, dogs.dog_name AS name, dogs.client_email, 
+            dogs.birthday, dogs.breed,
+            (SELECT COALESCE(json_agg(page), '[]') FROM (
+                SELECT comments.comment_id, 
+                    trainers.first_name || ' ' || trainers.last_name 
+                        AS trainer,
+                    comments.time_added, 
+                    comments.comment_text AS text
+                FROM comments
+                JOIN trainers ON trainers.trainer_id = comments.trainer_id
+                WHERE comments.dog_id = dogs.dog_id
+                {comments_keyset}
+                ORDER BY comments.time_added DESC, comments.comment_id DESC
+                LIMIT :comments_limit
+            ) AS page) AS trainer_comments,
+            (SELECT COALESCE(json_agg(page), '[]') FROM (
+                SELECT attendance.class_id, attendance.check_in,
+                    attendance.attendance_id
+                FROM attendance
+                WHERE attendance.dog_id = dogs.dog_id
+                {classes_keyset}
+                ORDER BY attendance.check_in, attendance.attendance_id
+                LIMIT :classes_limit
+            ) AS page) AS classes_attended
         FROM dogs
-        LEFT JOIN comments on comments.dog_id = dogs.dog_id
-        LEFT JOIN trainers on comments.trainer_id = trainers.trainer_id
         WHERE dogs.dog_id = :id
-        ORDER BY comments.time_added desc
-    """)
-    attendance_stmt = sqlalchemy.text("""                            
-        SELECT class_id, check_in
-        FROM attendance
-        WHERE dog_id = :id
-        ORDER BY class_id
     """)
 
-    with db.engine.connect() as conn:
-        result = conn.execute(stmt, [{"id": id}])
-        dog_comments_info = result.fetchall()
-        if dog_comments_info == []:
-            raise HTTPException(status_code=404, detail="dog not found.")
-        dog_info = dog_comments_info[0]
-        json = {
-            "dog_id": dog_info.dog_id,
-            "name": dog_info.dog_name,
-            "client_email": dog_info.client_email, 
-            "birthday": dog_info.birthday,
-            "breed": dog_info.breed,
-            "trainer_comments": [],
-            "classes_attended": []
-        }
-        if dog_info.comment_id is not None:
-            for row in dog_comments_info:
-                json["trainer_comments"].append(
-                    {
-                        "comment_id": row.comment_id,
-                        "trainer": row.first_name + " " + row.last_name,
-                        "time_added": row.time_added,
-                        "text": row.comment_text
-                    }
-                )
-        dog_attendance = conn.execute(attendance_stmt, [{"id": id}]).fetchall()
-        for row in dog_attendance:
-            json["classes_attended"].append(
-                {
-                    "class_id": row.class_id,
-                    "check_in": row.check_in
-                }
-            )
+    async with db.async_engine.connect() as conn:
+        not_modified = await versions.check(conn, DOG_TABLES, 
+                                            if_none_match, response, id,
+                                            exists=False)
+        if not_modified is not None:
+            return not_modified
+        dog_info = (await conn.execute(stmt, [params])).one_or_none()
+    if dog_info is None:
+        raise HTTPException(status_code=404, detail="dog not found.")
+    if "*" in versions.etag_values(if_none_match):
+        return versions.not_modified(response)
+
+    comments = dog_info.trainer_comments
+    for comment in comments:
+        comment["time_added"] = results.pg_timestamp(comment["time_added"])
+    classes = dog_info.classes_attended
+    for attended in classes:
+        attended["check_in"] = results.pg_timestamp(attended["check_in"])
+
+    if len(comments) == comments_limit:
+        response.headers[COMMENTS_CURSOR_HEADER] = pagination.encode_cursor(
+            comments[-1]["time_added"], comments[-1]["comment_id"])
+    if len(classes) == classes_limit:
+        response.headers[CLASSES_CURSOR_HEADER] = pagination.encode_cursor(
+            classes[-1]["check_in"], classes[-1]["attendance_id"])
     
-    return json
+    for attended in classes:
+        del attended["attendance_id"]
+    return results.respond(results.mapping(dog_info), response)
 
 
 class CommentJson(BaseModel):
@@ -88,7 +172,7 @@ class CommentJson(BaseModel):
 
 
 @router.post("/dogs/{id}/comments", tags=["dogs"])
-def add_comments(id: int, new_comment: CommentJson):
+async def add_comments(id: int, new_comment: CommentJson):
     """
     This endpoint updates trainer comments for a dog. 
     - `id`: the id of the dog the comment is about
@@ -100,7 +184,7 @@ def add_comments(id: int, new_comment: CommentJson):
 
     try:
 
-        with db.engine.begin() as conn:
+        async with db.async_engine.begin() as conn:
 
             stmt = sqlalchemy.text("""
                 INSERT INTO comments
@@ -109,11 +193,11 @@ def add_comments(id: int, new_comment: CommentJson):
                 RETURNING comment_id
             """)
 
-            comment_id = conn.execute(stmt, [{
+            comment_id = (await conn.execute(stmt, [{
                 "dog_id": id,
                 "trainer_id": new_comment.trainer_id, 
                 "text": new_comment.comment_text
-            }]).scalar_one()
+            }])).scalar_one()
 
         return f"comment_id added: {comment_id}"  
     
@@ -126,72 +210,85 @@ def add_comments(id: int, new_comment: CommentJson):
         else:
             raise
 
-@router.get("/dogs/", tags=["dogs"])
-def get_dogs(
+@router.get("/dogs/", tags=["dogs"], response_model=List[DogSummaryOut])
+async def get_dogs(
+    response: Response,
     name: str = "", 
     breed: str = "",
     client_email: str = "",
     limit: int = Query(50, ge=1, le=250),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: str = None
 ):
     """
-    This endpoint returns all the dogs in the database. 
+    This endpoint returns all the dogs in the database, sorted by dog_id. 
     For every dog, it returns:
     - `dog_id`: the id associated with the dog
     - `dog_name`: the name of the dog
     - `birthday`: the birthday of the dog
     - `breed`: the dog's breed
     - `client_email`: the email of the owner of the dog
+
+    You can page with `limit` and either `offset` or `cursor`. When a page
+    is full, the `X-Next-Cursor` response header holds the `cursor` 
+    for the next page.
      """
+    pagination.check_paging(cursor, offset)
+    params = {"limit": limit}
+    # only filters that were given are applied; the prefix matches are 
+    # served by the dogs_*_trgm_idx trigram indexes
+    where = []
+    if name:
+        where.append("dog_name ILIKE :name")
+        params["name"] = f"{name}%"
+    if breed:
+        where.append("breed ILIKE :breed")
+        params["breed"] = f"{breed}%"
+    if client_email:
+        where.append("client_email ILIKE :client_email")
+        params["client_email"] = f"{client_email}%"
+    if cursor is None:
+        skip = "OFFSET :offset"
+        params["offset"] = offset
+    else:
+        where.append("dog_id > :after_id")
+        skip = ""
+        (params["after_id"],) = pagination.decode_cursor(cursor, int)
+    where = "WHERE " + " AND ".join(where) if where else ""
 
-    stmt = sqlalchemy.text("""                            
-        SELECT dog_id, dog_name, birthday, breed, client_email
+    stmt = sqlalchemy.text(f"""                            
+        SELECT dog_id, dog_name AS name, birthday, breed, client_email
         FROM dogs 
-        WHERE dog_name ILIKE :name 
-        AND breed ILIKE :breed
-        AND client_email ILIKE :client_email
-        OFFSET :offset         
+        {where}
+        ORDER BY dog_id
+        {skip}
         LIMIT :limit            
     """)
 
-    with db.engine.connect() as conn:
-        result = conn.execute(stmt, [{"name": f"{name}%",
-                                      "breed": f"{breed}%",
-                                      "client_email": f"{client_email}%",
-                                      "offset": offset,
-                                      "limit": limit}])
-        json = []
-        for row in result:
-            json.append(
-                {
-                    "dog_id": row.dog_id,
-                    "name": row.dog_name,
-                    "birthday": row.birthday,
-                    "breed": row.breed,
-                    "client_email": row.client_email
-                }
-            )
-
-    return json
+    async with db.async_engine.connect() as conn:
+        rows = (await conn.execute(stmt, [params])).fetchall()
+
+    pagination.set_next_cursor(response, rows, limit, "dog_id")
+    return results.respond(results.mappings(rows), response)
 
 
 @router.delete("/dogs/comments/{id}", tags=["dogs"])
-def delete_comments(id: int):
+async def delete_comments(id: int):
     """
     This endpoint deletes a comment for a dog based on its comment ID.
     """
     try:
-        with db.engine.begin() as conn:
-            result = conn.execute(sqlalchemy.text("""SELECT comment_id
+        async with db.async_engine.begin() as conn:
+            result = (await conn.execute(sqlalchemy.text("""SELECT comment_id
                                             FROM comments 
                                             where comment_id = :id
                                         """), 
-                                        [{"id": id}]).one_or_none()
+                                        [{"id": id}])).one_or_none()
             if result is None:
                 raise HTTPException(status_code=404, 
                         detail=("comment_id does not exist in comments table."))
 
-            conn.execute(sqlalchemy.text("""DELETE 
+            await conn.execute(sqlalchemy.text("""DELETE 
                                         FROM comments 
                                         where comment_id = :id"""), 
                                         [{"id": id}])
@@ -0,0 +1,146 @@
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from src import database as db
+import sqlalchemy
+import datetime
+import orjson
+import csv
+import io
+from enum import Enum
+
+router = APIRouter()
+
+# rows fetched from the server-side cursor per round trip
+EXPORT_BATCH_SIZE = 1000
+
+
+class ExportTable(str, Enum):
+    dogs = "dogs"
+    comments = "comments"
+    attendance = "attendance"
+    classes = "classes"
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+# for each table: its columns, the timestamp the since/until window
+# applies to (None if it has none) and the key rows are exported in
+EXPORTS = {
+    ExportTable.dogs: (
+        ["dog_id", "client_email", "birthday", "breed", "dog_name"],
+        None, "dog_id"),
+    ExportTable.comments: (
+        ["comment_id", "dog_id", "trainer_id", "comment_text", "time_added"],
+        "time_added", "comment_id"),
+    ExportTable.attendance: (
+        ["attendance_id", "dog_id", "class_id", "check_in"],
+        "check_in", "attendance_id"),
+    ExportTable.classes: (
+        ["class_id", "trainer_id", "date", "start_time", "end_time",
+         "class_type_id", "room_id"],
+        "(date + start_time)", "class_id"),
+}
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+
+def ndjson_lines(columns, rows):
+    return b"".join(orjson.dumps(dict(zip(columns, row)),
+                                 option=orjson.OPT_APPEND_NEWLINE)
+                    for row in rows)
+
+
+def csv_lines(rows):
+    out = io.StringIO()
+    csv.writer(out).writerows(
+        [value.isoformat() if isinstance(value, (datetime.date,
+                                                  datetime.time))
+         else value for value in row] for row in rows)
+    return out.getvalue()
+
+
+async def stream_rows(conn, result, columns, format):
+    """
+    Yields the export a batch at a time from a result already streaming on
+    conn, and closes conn at the end. Rows come from a server-side cursor,
+    so only EXPORT_BATCH_SIZE of them are in memory at once.
+    """
+    try:
+        if format == ExportFormat.csv:
+            yield csv_lines([columns])
+        async for rows in result.partitions():
+            if format == ExportFormat.csv:
+                yield csv_lines(rows)
+            else:
+                yield ndjson_lines(columns, rows)
+    finally:
+        await conn.close()
+
+
+def naive_utc(value):
+    """
+    Returns value as the naive UTC timestamp the tables store; offset-aware
+    values such as 2024-01-01T00:00:00Z are converted.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+@router.get("/export/{table}", tags=["export"])
+async def export_table(table: ExportTable,
+                       format: ExportFormat = ExportFormat.ndjson,
+                       since: datetime.datetime = None,
+                       until: datetime.datetime = None):
+    """
+    This endpoint streams every row of a table, ordered by its id, as
+    newline-delimited JSON (one object per line) or as CSV with a header
+    row.
+
+    `since` and `until` limit the export to rows on or after and before
+    the given ISO timestamps: comments by `time_added`, attendance by
+    `check_in` and classes by when they start. They are ignored for dogs.
+    Timestamps with an offset (e.g. a trailing `Z`) are taken as UTC.
+    """
+    columns, time_column, key = EXPORTS[table]
+    since, until = naive_utc(since), naive_utc(until)
+
+    where = []
+    params = {}
+    if time_column is not None:
+        if since is not None:
+            where.append(f"{time_column} >= :since")
+            params["since"] = since
+        if until is not None:
+            where.append(f"{time_column} < :until")
+            params["until"] = until
+    where = "WHERE " + " AND ".join(where) if where else ""
+
+    stmt = sqlalchemy.text(f"""
+        SELECT {", ".join(columns)}
+        FROM {table.value}
+        {where}
+        ORDER BY {key}
+    """)
+
+    # the query starts before the response does, so an error in it is
+    # reported with its own status instead of cutting a 200 short
+    conn = await db.async_engine.connect()
+    try:
+        result = await conn.stream(
+            stmt.execution_options(yield_per=EXPORT_BATCH_SIZE), params)
+    except BaseException:
+        await conn.close()
+        raise
+
+    return StreamingResponse(
+        stream_rows(conn, result, columns, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition":
+                 f"attachment; filename={table.value}.{format.value}"})
@@ -0,0 +1,59 @@
+import base64
+import datetime
+import json
+
+from fastapi import HTTPException
+
+# Keyset pagination helpers. A cursor is an opaque token holding the sort key
+# of the last row on a page; the next page starts strictly after it, so page N
+# costs an index seek instead of scanning and discarding N * limit rows.
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _to_json(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(*key):
+    """Returns an opaque token for the sort key of the last row on a page."""
+    raw = json.dumps([_to_json(value) for value in key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, *parsers):
+    """
+    Decodes a token from encode_cursor, converting each part of the key
+    with the matching parser (e.g. int or datetime.date.fromisoformat).
+    Raises a 400 if the token was not produced for this key shape.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(parsers):
+            raise ValueError
+        return tuple(parse(value) for parse, value in zip(parsers, values))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="invalid cursor.") from None
+
+
+def check_paging(cursor, offset):
+    if cursor is not None and offset:
+        raise HTTPException(status_code=400,
+                            detail="use either cursor or offset, not both.")
+
+
+def set_next_cursor(response, rows, limit, *key_columns):
+    """
+    Sets the next page's cursor on the response when the page came back
+    full. The header is left off on the last page. rows may be result rows
+    or dicts keyed by column name.
+    """
+    if len(rows) == limit:
+        last = rows[-1]
+        if not isinstance(last, dict):
+            last = last._mapping
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            *(last[column] for column in key_columns))
@@ -0,0 +1,238 @@
+import collections
+import hashlib
+import os
+import time
+
+import orjson
+
+from src.api import versions
+
+# Results of expensive read queries, shared between every worker pointed at
+# the same backend. An entry is keyed by the endpoint, its normalized query
+# parameters and the table_versions of the tables the query reads, which
+# are also its tags. A write bumps its table's version as its
+# transaction commits, so from that moment readers look up a new key and
+# can never be handed a result from before it. Entries are tagged with the
+# version of each table they read, and the first reader to see a table's
+# new version evicts the entries stored under its older versions, leaving
+# those other workers already stored under the new one; the LRU bound or
+# the TTL drops whatever it misses.
+#
+# QUERY_CACHE_URL picks the backend: "memory://" (the default) for a
+# process-local LRU, or a redis:// or rediss:// URL for any server speaking
+# the Redis protocol. The cache is only ever an optimization: when the
+# backend fails or times out, the query runs as if it had missed.
+
+DEFAULT_URL = os.environ.get("QUERY_CACHE_URL", "memory://")
+DEFAULT_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "1024"))
+DEFAULT_TTL = int(os.environ.get("QUERY_CACHE_TTL", "300"))
+# seconds to wait on a remote backend before giving up on it
+DEFAULT_TIMEOUT = float(os.environ.get("QUERY_CACHE_TIMEOUT", "0.5"))
+
+
+class MemoryBackend:
+    """Process-local LRU of up to size entries."""
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        # key -> (expires, value, tags), least recently used first
+        self._entries = collections.OrderedDict()
+        # tag -> version -> keys stored under that version of the tag
+        self._tagged = collections.defaultdict(dict)
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key, value, tags, ttl):
+        self._drop(key)
+        self._entries[key] = (time.monotonic() + ttl, value, tags)
+        for tag, version in tags.items():
+            self._tagged[tag].setdefault(version, set()).add(key)
+        while len(self._entries) > self.size:
+            self._drop(next(iter(self._entries)))
+
+    async def evict(self, tag, version):
+        """Drops the entries stored under versions of tag older than version."""
+        keys = set()
+        for stored in [v for v in self._tagged.get(tag, {}) if v < version]:
+            keys |= self._tagged[tag][stored]
+        for key in keys:
+            self._drop(key)
+        return len(keys)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag, version in entry[2].items():
+            tagged = self._tagged.get(tag, {}).get(version)
+            if tagged is not None:
+                tagged.discard(key)
+                if not tagged:
+                    del self._tagged[tag][version]
+                    if not self._tagged[tag]:
+                        del self._tagged[tag]
+
+
+class RedisBackend:
+    """
+    Entries on a Redis-protocol server, where they expire after their TTL.
+    Each version of a tag is a set of the keys stored under it, and each
+    tag a sorted set of the versions it has sets for.
+    """
+
+    def __init__(self, url=None, client=None, prefix="query_cache:",
+                 timeout=DEFAULT_TIMEOUT):
+        if client is None:
+            # only this backend needs the redis package
+            import redis.asyncio
+            client = redis.asyncio.from_url(url, socket_timeout=timeout,
+                                            socket_connect_timeout=timeout)
+        self.client = client
+        self.prefix = prefix
+
+    def _tag_key(self, tag, version):
+        return f"{self.prefix}tag:{tag}:{version}"
+
+    def _versions_key(self, tag):
+        return f"{self.prefix}versions:{tag}"
+
+    async def get(self, key):
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key, value, tags, ttl):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(self.prefix + key, value, ex=ttl)
+            for tag, version in tags.items():
+                pipe.sadd(self._tag_key(tag, version), key)
+                pipe.expire(self._tag_key(tag, version), ttl)
+                pipe.zadd(self._versions_key(tag), {str(version): version})
+                pipe.expire(self._versions_key(tag), ttl)
+            await pipe.execute()
+
+    async def evict(self, tag, version):
+        """Drops the entries stored under versions of tag older than version."""
+        stale = await self.client.zrangebyscore(
+            self._versions_key(tag), "-inf", f"({version}")
+        if not stale:
+            return 0
+        stale = [int(v) for v in stale]
+        async with self.client.pipeline(transaction=False) as pipe:
+            for stored in stale:
+                pipe.smembers(self._tag_key(tag, stored))
+            members = await pipe.execute()
+        keys = {key.decode() if isinstance(key, bytes) else key
+                for tagged in members for key in tagged}
+        # no reader looks a stale version up any more, so nothing is added
+        # to its set once the version has moved on, save by a reader that
+        # started before the write; the TTL drops those
+        async with self.client.pipeline(transaction=True) as pipe:
+            if keys:
+                pipe.delete(*[self.prefix + key for key in keys])
+            pipe.delete(*[self._tag_key(tag, stored) for stored in stale])
+            pipe.zrem(self._versions_key(tag), *[str(v) for v in stale])
+            await pipe.execute()
+        return len(keys)
+
+
+def backend_from_url(url):
+    if url in ("", "memory://"):
+        return MemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"unknown QUERY_CACHE_URL {url!r}")
+
+
+def cache_key(endpoint, params, table_versions):
+    """
+    Returns the key for endpoint called with params while the tables it
+    reads are at table_versions. The same parameters give the same key
+    however they were ordered or spelled in the query string.
+    """
+    raw = orjson.dumps([endpoint, params, table_versions], default=str,
+                       option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return f"{endpoint}:{hashlib.sha256(raw).hexdigest()}"
+
+
+class QueryCache:
+    """
+    Cache of query results in a backend. It counts hits and misses and the
+    seconds hits saved, by comparing each hit's lookup time with how long
+    its entry took to compute, and the backend calls that failed.
+    """
+
+    def __init__(self, backend, ttl=DEFAULT_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+        self.seconds_saved = 0.0
+        # tag -> newest version this process has seen
+        self._seen = {}
+
+    async def fetch(self, conn, endpoint, params, tags, run):
+        """
+        Returns the result of awaiting run() for endpoint and params, from
+        the cache when the tables in tags haven't changed since it was
+        stored. run() must return something orjson can encode; a cached
+        result comes back decoded, with dates and times as ISO strings.
+        """
+        table_versions = await versions.current(conn, tags)
+        try:
+            await self._evict_stale(table_versions)
+        except Exception:
+            self.errors += 1
+        key = cache_key(endpoint, params, table_versions)
+
+        start = time.perf_counter()
+        try:
+            cached = await self.backend.get(key)
+        except Exception:
+            self.errors += 1
+            cached = None
+        if cached is not None:
+            entry = orjson.loads(cached)
+            self.hits += 1
+            self.seconds_saved += max(
+                entry["seconds"] - (time.perf_counter() - start), 0.0)
+            return entry["value"]
+
+        self.misses += 1
+        start = time.perf_counter()
+        value = await run()
+        entry = {"seconds": time.perf_counter() - start, "value": value}
+        try:
+            await self.backend.set(key, orjson.dumps(entry), table_versions,
+                                   self.ttl)
+        except Exception:
+            self.errors += 1
+        return value
+
+    async def _evict_stale(self, table_versions):
+        for tag, version in table_versions.items():
+            seen = self._seen.get(tag)
+            if seen is not None and version > seen:
+                self.evictions += await self.backend.evict(tag, version)
+            if seen is None or version > seen:
+                self._seen[tag] = version
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"backend": type(self.backend).__name__,
+                "hits": self.hits, "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "errors": self.errors,
+                "seconds_saved": self.seconds_saved}
+
+
+cache = QueryCache(backend_from_url(DEFAULT_URL))
@@ -0,0 +1,41 @@
+import datetime
+
+from fastapi.responses import ORJSONResponse
+
+# Read endpoints select their output columns under their output names, turn
+# the rows into dicts with Row._mapping and return them through respond().
+# Returning a response directly skips FastAPI's jsonable_encoder, which
+# would otherwise walk every value in Python; orjson writes date, time and
+# datetime values natively, in the same ISO format. The response_model on
+# each route documents the shape but isn't validated at runtime.
+
+
+def mapping(row):
+    """Returns a result row as a dict keyed by column name."""
+    return dict(row._mapping)
+
+
+def mappings(rows):
+    """Returns result rows as a list of dicts keyed by column name."""
+    return [dict(row._mapping) for row in rows]
+
+
+def respond(content, response=None, status_code=200):
+    """
+    Returns content as an orjson response. Headers already set on the
+    endpoint's injected Response (e.g. X-Next-Cursor) are carried over.
+    """
+    json_response = ORJSONResponse(content, status_code=status_code)
+    if response is not None:
+        json_response.raw_headers.extend(response.raw_headers)
+    return json_response
+
+
+def pg_timestamp(value):
+    """
+    Parses a timestamp as Postgres writes it in JSON, where trailing zeros
+    of the fraction (or the whole fraction) are left off.
+    """
+    if "." in value:
+        return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f")
+    return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S")
@@ -1,13 +1,20 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.params import Query
 from src import database as db
+from src import reference_data
+from src.api import results, query_cache
 import sqlalchemy
 import datetime
 
 router = APIRouter()
 
+ROOM_UNAVAILABLE = "the provided room is unavailable at this day/time."
+# SQLSTATE raised when an insert breaks classes_room_booking_excl
+EXCLUSION_VIOLATION = "23P01"
+
 
 @router.get("/rooms/", tags=["rooms"])
-def get_room(
+async def get_room(
         class_type_id: int,
         date: str = "yyyy-mm-dd",
         start_time: str = "hh:mm AM",
@@ -43,80 +50,59 @@ def get_room(
         attend a class of the given class type
     """
     try:
-        with db.engine.connect() \
-        .execution_options(isolation_level="SERIALIZABLE") as conn:
-            with conn.begin():
+        date = datetime.datetime.strptime(date, "%Y-%m-%d").date()
+        start_time = datetime.datetime.strptime(start_time, "%I:%M %p").time()
+        end_time = datetime.datetime.strptime(end_time, "%I:%M %p").time()
+        
+        if end_time <= start_time:                                
+            raise HTTPException(status_code=404, 
+                                detail="end_time should be after start_time")
+
+        async with db.async_engine.connect() as conn:
+            class_type = (await reference_data.cache.class_types(conn)) \
+                .get(class_type_id)
+            if class_type is None:
+                raise HTTPException(status_code=404, detail="class type not found.")
             
-                date = datetime.datetime.strptime(date, "%Y-%m-%d").date()
-                start_time = datetime.datetime.strptime(start_time, "%I:%M %p").time()
-                end_time = datetime.datetime.strptime(end_time, "%I:%M %p").time()
-                
-                if end_time < start_time:                                
-                    raise HTTPException(status_code=404, 
-                                        detail="end_time should be after start_time")
-                 
-                result = conn.execute(sqlalchemy.text("""
-                    SELECT max_num_dogs
-                    FROM class_types
-                    WHERE class_type_id = :type_id
-                """), [{"type_id": class_type_id}]).one_or_none()
-                if result is None:
-                    raise HTTPException(status_code=404, detail="class type not found.")
-                
-                class_max = result.max_num_dogs
-
-                available_rooms = conn.execute(sqlalchemy.text("""
-                    SELECT room_id, max_dog_capacity, room_name
-                    FROM rooms
-                    WHERE room_id NOT IN (
-                        SELECT classes.room_id
-                        FROM classes
-                        JOIN rooms ON classes.room_id = rooms.room_id
-                        WHERE classes.date = :date AND 
-                            ((CAST(:start_time AS TIME) < classes.start_time 
-                                AND CAST(:end_time AS TIME) > classes.start_time)
-                            OR (CAST(:start_time AS TIME) < classes.end_time 
-                                AND CAST(:end_time AS TIME) > classes.end_time))
-                    )
-                    ORDER BY max_dog_capacity ASC
-                """), [{
-                        "date": date,
-                        "start_time": start_time,
-                        "end_time": end_time
-                        }]).fetchall()
-                
-                if available_rooms != []:
-                    #get available rooms with max dog capacity > class max 
-                    holds_class_max = list(filter(lambda x: x[1] >= class_max, 
-                                                available_rooms))
-                    # avail rooms already sorted
-
-                    if len(holds_class_max):
-                        # select room_id with smallest capacity 
-                        # that fits class max if one exists
-                        room = {
-                            "room_id": holds_class_max[0][0],
-                            "room_name": holds_class_max[0][2],
-                            "max_dog_capacity": holds_class_max[0][1],
-                            "max_class_size": class_max
-                        }
-                        return room
-                    else: 
-                        # if no room that holds class max size, select largest room
-                        room = {
-                            "room_id": available_rooms[-1][0],
-                            "room_name": available_rooms[-1][2],
-                            "max_dog_capacity": available_rooms[-1][1],
-                            "max_class_size": class_max
-                        }
-
-                        raise HTTPException(status_code=404, 
-                                detail=f"""the only rooms available have a max room \
+            class_max = class_type.max_num_dogs
+
+            booked = await booked_rooms(conn, date, start_time, end_time)
+            # cached rooms are sorted by max_dog_capacity
+            available_rooms = [room for room in 
+                               (await reference_data.cache.rooms(conn)).values()
+                               if room.room_id not in booked]
+        
+        if available_rooms != []:
+            #get available rooms with max dog capacity > class max 
+            holds_class_max = list(filter(
+                lambda x: x.max_dog_capacity >= class_max, available_rooms))
+
+            if len(holds_class_max):
+                # select room_id with smallest capacity 
+                # that fits class max if one exists
+                room = {
+                    "room_id": holds_class_max[0].room_id,
+                    "room_name": holds_class_max[0].room_name,
+                    "max_dog_capacity": holds_class_max[0].max_dog_capacity,
+                    "max_class_size": class_max
+                }
+                return room
+            else: 
+                # if no room that holds class max size, select largest room
+                room = {
+                    "room_id": available_rooms[-1].room_id,
+                    "room_name": available_rooms[-1].room_name,
+                    "max_dog_capacity": available_rooms[-1].max_dog_capacity,
+                    "max_class_size": class_max
+                }
+
+                raise HTTPException(status_code=404, 
+                        detail=f"""the only rooms available have a max room \
 capacity < given class max size. The largest room available is {room}""")
-                    
-                else:
-                    raise HTTPException(status_code=404, 
-                                        detail="no rooms available for this date/time.")
+            
+        else:
+            raise HTTPException(status_code=404, 
+                                detail="no rooms available for this date/time.")
             
     except Exception as error:
 
@@ -133,32 +119,189 @@ capacity < given class max size. The largest room available is {room}""")
 
 
 
-def find_room(class_date, start_time, end_time, conn, room_id):
-    # has complex transaction
-    available_rooms = conn.execute(sqlalchemy.text("""
-        SELECT room_id
-        FROM rooms
-        WHERE room_id NOT IN (
-            SELECT classes.room_id
+# longest range GET /rooms/availability covers in one request
+MAX_AVAILABILITY_DAYS = 14
+# every table the GET /rooms/availability query reads from
+AVAILABILITY_TABLES = ("classes", "rooms")
+
+
+@router.get("/rooms/availability", tags=["rooms"])
+async def get_room_availability(
+        date: str = "yyyy-mm-dd",
+        days: int = Query(1, ge=1, le=MAX_AVAILABILITY_DAYS),
+        from_: str = Query("08:00 AM", alias="from"),
+        to: str = "05:00 PM",
+        slot_minutes: int = Query(30, ge=5, le=240)
+    ):
+    """
+    This endpoint returns when each room in the facility is free, from 
+    `from` to `to` on each of `days` days starting at `date`.
+
+    Given:
+    - `date`: the first day, as "yyyy-mm-dd"
+    - `days`: how many days to cover, from 1 to 14 (default 1)
+    - `from`, `to`: the window to check each day, as "hh:mm AM/PM" 
+    (default 08:00 AM to 05:00 PM)
+    - `slot_minutes`: the window is split into slots of this many minutes
+    starting at `from`; a slot is free if no class in the room overlaps it
+    (default 30)
+
+    For every room, it returns:
+    - `room_id`, `room_name`, `max_dog_capacity`: the room
+    - `free`: the free intervals, each made of consecutive free slots, 
+    as `start` and `end` date-times
+    """
+    try:
+        first_day = datetime.datetime.strptime(date, "%Y-%m-%d").date()
+        window_start = datetime.datetime.strptime(from_, "%I:%M %p").time()
+        window_end = datetime.datetime.strptime(to, "%I:%M %p").time()
+
+        if window_end <= window_start:
+            raise HTTPException(status_code=404,
+                                detail="to should be after from")
+        last_day = first_day + datetime.timedelta(days=days - 1)
+        slot = datetime.timedelta(minutes=slot_minutes)
+        slots = (datetime.datetime.combine(first_day, window_end)
+                 - datetime.datetime.combine(first_day, window_start)) // slot
+        if slots == 0:
+            raise HTTPException(status_code=404,
+                                detail="the window is shorter than one slot.")
+
+        # one pass over the bookings in the whole range: every room and 
+        # slot pair without an overlapping booking is free, and runs of 
+        # consecutive free slots (same slot number minus row number) are 
+        # merged into intervals
+        stm = sqlalchemy.text("""
+            WITH slot AS (
+                SELECT day.date, i,
+                    day.date + CAST(:from AS TIME) 
+                        + i * CAST(:slot AS INTERVAL) AS slot_start,
+                    day.date + CAST(:from AS TIME) 
+                        + (i + 1) * CAST(:slot AS INTERVAL) AS slot_end
+                FROM (
+                    SELECT CAST(day AS DATE) AS date
+                    FROM generate_series(CAST(:first AS DATE), 
+                        CAST(:last AS DATE), interval '1 day') AS day
+                ) AS day
+                CROSS JOIN generate_series(0, CAST(:slots AS INTEGER) - 1) AS i
+            ),
+            booked AS (
+                SELECT room_id, booking
+                FROM classes
+                WHERE booking && tsrange(
+                    CAST(:first AS DATE) + CAST(:from AS TIME),
+                    CAST(:last AS DATE) + CAST(:to AS TIME), '[)')
+            ),
+            free AS (
+                SELECT rooms.room_id, slot.date, slot.slot_start, 
+                    slot.slot_end,
+                    slot.i - ROW_NUMBER() OVER (
+                        PARTITION BY rooms.room_id, slot.date 
+                        ORDER BY slot.i) AS island
+                FROM rooms
+                CROSS JOIN slot
+                WHERE NOT EXISTS (
+                    SELECT 1
+                    FROM booked
+                    WHERE booked.room_id = rooms.room_id
+                        AND booked.booking && tsrange(slot.slot_start, 
+                                                      slot.slot_end, '[)')
+                )
+            )
+            SELECT room_id, MIN(slot_start) AS start, MAX(slot_end) AS end
+            FROM free
+            GROUP BY room_id, date, island
+            ORDER BY room_id, start
+        """)
+
+        params = {
+            "first": first_day,
+            "last": last_day,
+            "from": window_start,
+            "to": window_end,
+            "slot": slot,
+            "slots": slots
+        }
+        async with db.async_engine.connect() as conn:
+            async def run():
+                return results.mappings(
+                    (await conn.execute(stm, [params])).fetchall())
+
+            rows = await query_cache.cache.fetch(
+                conn, "GET /rooms/availability", params, 
+                AVAILABILITY_TABLES, run)
+            rooms = await reference_data.cache.rooms(conn)
+
+        free = {}
+        for row in rows:
+            free.setdefault(row["room_id"], []).append(
+                {"start": row["start"], "end": row["end"]})
+        return [
+            {
+                "room_id": room.room_id,
+                "room_name": room.room_name,
+                "max_dog_capacity": room.max_dog_capacity,
+                "free": free.get(room.room_id, [])
+            }
+            for room in sorted(rooms.values(), key=lambda x: x.room_id)
+        ]
+
+    except Exception as error:
+        if error.args != ():
+            details = (error.args)[0]
+            if "DETAIL:  " in details:
+                details = details.split("DETAIL:  ")[1].replace("\n", "")
+            raise HTTPException(status_code=404, detail=details)
+        else:
+            raise
+
+
+def booking(class_date, start_time, end_time):
+    """
+    Returns the bounds of the classes.booking range for a class, as bind 
+    parameters for tsrange(:start, :end, '[)').
+    """
+    start = datetime.datetime.combine(class_date, start_time)
+    end = datetime.datetime.combine(class_date, end_time)
+    if end_time < start_time:
+        end += datetime.timedelta(days=1)
+    return {"start": start, "end": end}
+
+
+async def booked_rooms(conn, class_date, start_time, end_time):
+    """Returns the ids of rooms with a class overlapping the given time."""
+    result = await conn.execute(sqlalchemy.text("""
+        SELECT DISTINCT room_id
+        FROM classes
+        WHERE booking && tsrange(:start, :end, '[)')
+    """).bindparams(
+        sqlalchemy.bindparam("start", type_=sqlalchemy.DateTime),
+        sqlalchemy.bindparam("end", type_=sqlalchemy.DateTime)
+    ), [booking(class_date, start_time, end_time)])
+    return set(result.scalars())
+
+
+async def find_room(class_date, start_time, end_time, conn, room_id):
+    # the classes_room_booking_excl constraint is what actually prevents 
+    # double booking; this check just gives a clearer error first
+    rooms = await reference_data.cache.rooms(conn)
+    if room_id not in rooms:
+        raise HTTPException(status_code=404, 
+                            detail=ROOM_UNAVAILABLE)
+
+    is_booked = (await conn.execute(sqlalchemy.text("""
+        SELECT EXISTS (
+            SELECT 1
             FROM classes
-            JOIN rooms ON classes.room_id = rooms.room_id
-            WHERE classes.date = :date AND 
-                ((CAST(:start_time AS TIME) <= classes.start_time 
-                    AND CAST(:end_time AS TIME) > classes.start_time)
-                OR (CAST(:start_time AS TIME) < classes.end_time 
-                    AND CAST(:end_time AS TIME) >= classes.end_time)
-                OR (CAST(:start_time AS TIME) = classes.start_time 
-                    AND CAST(:end_time AS TIME) = classes.end_time))
+            WHERE room_id = :room_id 
+                AND booking && tsrange(:start, :end, '[)')
         )
-        ORDER BY max_dog_capacity ASC
-    """), [{
-            "date": class_date,
-            "start_time": start_time,
-            "end_time": end_time
-            }]).fetchall()
-    
-    room_avail = list(filter(lambda x: x[0] == room_id, available_rooms))
+    """).bindparams(
+        sqlalchemy.bindparam("start", type_=sqlalchemy.DateTime),
+        sqlalchemy.bindparam("end", type_=sqlalchemy.DateTime)
+    ), [{"room_id": room_id, 
+         **booking(class_date, start_time, end_time)}])).scalar_one()
 
-    if room_avail == []:
+    if is_booked:
         raise HTTPException(status_code=404, 
-                            detail="the provided room is unavailable at this day/time.")
\ No newline at end of file
+                            detail=ROOM_UNAVAILABLE)
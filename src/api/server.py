@@ -1,5 +1,9 @@
-from fastapi import FastAPI
-from src.api import trainers, classes, dogs, class_types, rooms
+import os
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
+from src import database as db
+from src import metrics
+from src.api import trainers, classes, dogs, class_types, rooms, export, comments, stats
 
 description = """
 Dog Training Company
@@ -25,6 +29,18 @@ tags_metadata = [
         "name": "rooms",
         "description": "Access and update information on the rooms in the facility.",
     },
+    {
+        "name": "comments",
+        "description": "Search trainer comments on dogs.",
+    },
+    {
+        "name": "export",
+        "description": "Download whole tables as NDJSON or CSV.",
+    },
+    {
+        "name": "stats",
+        "description": "Monthly attendance rollups by class type and trainer.",
+    },
 ]
 
 app = FastAPI(
@@ -36,12 +52,35 @@ app = FastAPI(
         "email": "cbarbe03@calpoly.edu",
     },
     openapi_tags=tags_metadata,
+    default_response_class=ORJSONResponse,
 )
 app.include_router(trainers.router)
 app.include_router(classes.router)
 app.include_router(class_types.router)
 app.include_router(dogs.router)
 app.include_router(rooms.router)
+app.include_router(comments.router)
+app.include_router(export.router)
+app.include_router(stats.router)
+app.middleware("http")(metrics.record_request)
+
+
+@app.on_event("startup")
+def verify_schema():
+    # opt-in since it costs several catalog round trips on every cold start
+    if os.environ.get("VERIFY_SCHEMA", "").lower() in ("1", "true", "yes"):
+        db.verify_schema()
+
+
+@app.on_event("shutdown")
+async def close_async_pool():
+    await db.async_engine.dispose()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
 
 
 @app.get("/")
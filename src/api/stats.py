@@ -0,0 +1,194 @@
+from fastapi import APIRouter, HTTPException, Header
+from src import database as db
+from src import reference_data
+from src import stats
+from fastapi.params import Query
+from pydantic import BaseModel
+from typing import List
+from src.api import results
+import sqlalchemy
+import datetime
+import hmac
+import os
+
+router = APIRouter()
+
+
+class ClassTypeStatsOut(BaseModel):
+    month: datetime.date
+    class_type_id: int
+    type: str = None
+    classes: int
+    dogs: int
+    dogs_per_class: float
+    fill_rate: float = None
+    type_fill_rate: float = None
+    room_fill_rate: float = None
+
+
+class TrainerStatsOut(BaseModel):
+    trainer_id: int
+    trainer_name: str = None
+    month: datetime.date
+    classes: int
+    hours: float
+    dogs: int
+    dogs_per_class: float
+    fill_rate: float = None
+
+
+class ClassTypeStatsPage(BaseModel):
+    refreshed_at: datetime.datetime = None
+    age_seconds: float = None
+    stats: List[ClassTypeStatsOut]
+
+
+class TrainerStatsPage(BaseModel):
+    refreshed_at: datetime.datetime = None
+    age_seconds: float = None
+    stats: List[TrainerStatsOut]
+
+
+def month_range(from_, to):
+    """
+    Returns the WHERE predicates and bind parameters for a range of
+    "yyyy-mm" months, either end of which may be None.
+    """
+    where, params = [], {}
+    for name, value, op in (("from", from_, ">="), ("to", to, "<=")):
+        if value is not None:
+            try:
+                params[name] = datetime.datetime.strptime(value, "%Y-%m").date()
+            except ValueError:
+                raise HTTPException(status_code=400,
+                    detail=f"{name} should be a month, as yyyy-mm.") from None
+            where.append(f"month {op} :{name}")
+    return where, params
+
+
+async def freshness(conn, view):
+    """Returns when view was last refreshed and how many seconds ago."""
+    row = (await conn.execute(sqlalchemy.text("""
+        SELECT refreshed_at,
+            CAST(EXTRACT(EPOCH FROM now() - refreshed_at) AS DOUBLE PRECISION)
+                AS age_seconds
+        FROM stats_refreshes
+        WHERE view_name = :view
+    """), [{"view": view}])).one_or_none()
+    if row is None:
+        return {"refreshed_at": None, "age_seconds": None}
+    return results.mapping(row)
+
+
+@router.get("/stats/class-types", tags=["stats"],
+            response_model=ClassTypeStatsPage)
+async def get_class_type_stats(
+    from_: str = Query(None, alias="from"),
+    to: str = None,
+    class_type_id: int = None
+):
+    """
+    This endpoint returns monthly utilization by class type, from the
+    `from` month to the `to` month (both "yyyy-mm" and optional).
+    For every class type and month, it returns:
+    - `month`: the first day of the month
+    - `class_type_id`, `type`: the class type
+    - `classes`: how many classes of the type took place
+    - `dogs`: how many dogs checked into them
+    - `dogs_per_class`: the average number of dogs in a class
+    - `fill_rate`: dogs over the classes' capacity (the smaller of the
+    room's and the class type's limit)
+    - `type_fill_rate`: dogs over the class type's `max_num_dogs`
+    - `room_fill_rate`: dogs over the rooms' `max_dog_capacity`
+
+    The numbers come from a rollup refreshed on a schedule.
+    `refreshed_at` and `age_seconds` say how fresh they are.
+    """
+    where, params = month_range(from_, to)
+    if class_type_id is not None:
+        where.append("class_type_id = :class_type_id")
+        params["class_type_id"] = class_type_id
+    where = "WHERE " + " AND ".join(where) if where else ""
+
+    stmt = sqlalchemy.text(f"""
+        SELECT month, class_type_id, classes, dogs,
+            CAST(dogs AS DOUBLE PRECISION) / classes AS dogs_per_class,
+            CAST(dogs AS DOUBLE PRECISION) / NULLIF(capacity, 0) AS fill_rate,
+            CAST(dogs AS DOUBLE PRECISION) / NULLIF(type_limit, 0)
+                AS type_fill_rate,
+            CAST(dogs AS DOUBLE PRECISION) / NULLIF(room_limit, 0)
+                AS room_fill_rate
+        FROM class_type_monthly_stats
+        {where}
+        ORDER BY month, class_type_id
+    """)
+
+    async with db.async_engine.connect() as conn:
+        rows = (await conn.execute(stmt, [params])).fetchall()
+        fresh = await freshness(conn, "class_type_monthly_stats")
+        class_types = await reference_data.cache.class_types(conn)
+
+    json = results.mappings(rows)
+    for row in json:
+        class_type = class_types.get(row["class_type_id"])
+        row["type"] = class_type.type if class_type else None
+    return results.respond({**fresh, "stats": json})
+
+
+@router.get("/stats/trainers", tags=["stats"],
+            response_model=TrainerStatsPage)
+async def get_trainer_stats(
+    from_: str = Query(None, alias="from"),
+    to: str = None,
+    trainer_id: int = None
+):
+    """
+    This endpoint returns each trainer's monthly load, from the `from`
+    month to the `to` month (both "yyyy-mm" and optional).
+    For every trainer and month, it returns:
+    - `trainer_id`, `trainer_name`: the trainer
+    - `month`: the first day of the month
+    - `classes`: how many classes the trainer taught
+    - `hours`: how many hours those classes lasted
+    - `dogs`: how many dogs checked into them
+    - `dogs_per_class`: the average number of dogs in a class
+    - `fill_rate`: dogs over the classes' capacity
+
+    The numbers come from a rollup refreshed on a schedule.
+    `refreshed_at` and `age_seconds` say how fresh they are.
+    """
+    where, params = month_range(from_, to)
+    if trainer_id is not None:
+        where.append("stats.trainer_id = :trainer_id")
+        params["trainer_id"] = trainer_id
+    where = "WHERE " + " AND ".join(where) if where else ""
+
+    stmt = sqlalchemy.text(f"""
+        SELECT stats.trainer_id,
+            trainers.first_name || ' ' || trainers.last_name AS trainer_name,
+            month, classes, hours, dogs,
+            CAST(dogs AS DOUBLE PRECISION) / classes AS dogs_per_class,
+            CAST(dogs AS DOUBLE PRECISION) / NULLIF(capacity, 0) AS fill_rate
+        FROM trainer_monthly_stats AS stats
+        LEFT JOIN trainers ON trainers.trainer_id = stats.trainer_id
+        {where}
+        ORDER BY stats.trainer_id, month
+    """)
+
+    async with db.async_engine.connect() as conn:
+        rows = (await conn.execute(stmt, [params])).fetchall()
+        fresh = await freshness(conn, "trainer_monthly_stats")
+
+    return results.respond({**fresh, "stats": results.mappings(rows)})
+
+
+@router.get("/stats/refresh", include_in_schema=False)
+def refresh_stats(authorization: str = Header(None)):
+    # called by the Vercel cron job, which sends the CRON_SECRET it was
+    # configured with; refuses everyone when no secret is set
+    secret = os.environ.get("CRON_SECRET")
+    if not secret or not hmac.compare_digest(
+            (authorization or "").encode(), f"Bearer {secret}".encode()):
+        raise HTTPException(status_code=403, detail="forbidden.")
+    with db.engine.begin() as conn:
+        return stats.refresh(conn)
@@ -1,12 +1,47 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response, Depends, Header
 from src import database as db
+from src import auth
+from src import reference_data
 import sqlalchemy
+import datetime
 from fastapi.params import Query
 from pydantic import BaseModel
 from email_validator import validate_email, EmailNotValidError
+from typing import List
+from src.api import pagination, results, versions
 
 router = APIRouter()
 
+
+class TrainerOut(BaseModel):
+    trainer_id: int
+    first: str
+    last: str
+    email: str
+
+
+class TrainerSummaryOut(BaseModel):
+    trainer_id: int
+    name: str
+    email: str
+
+
+class ScheduledClassOut(BaseModel):
+    class_id: int
+    date: datetime.date
+    start_time: datetime.time
+    end_time: datetime.time
+    class_type_id: int = None
+    room_id: int = None
+    num_dogs_attended: int
+    type: str = None
+    room_name: str = None
+
+
+# longest date range one schedule request may cover
+MAX_SCHEDULE_DAYS = 366
+
+
 class TrainerJson(BaseModel):
     first_name: str
     last_name: str
@@ -14,7 +49,7 @@ class TrainerJson(BaseModel):
     password: str
 
 @router.post("/trainers/", tags=["trainers"])
-def add_trainer(trainer: TrainerJson):
+async def add_trainer(trainer: TrainerJson):
     """
     This endpoint adds a new trainer to the database. 
     - `first_name`: first name of the trainer
@@ -29,8 +64,9 @@ def add_trainer(trainer: TrainerJson):
     try:
         emailinfo = validate_email(trainer.email, check_deliverability=False)
         email = emailinfo.normalized
+        password = await auth.hash_password(trainer.password)
 
-        with db.engine.begin() as conn:
+        async with db.async_engine.begin() as conn:
             stm = sqlalchemy.text("""
                 INSERT INTO trainers 
                 (first_name, last_name, email, password) 
@@ -38,18 +74,18 @@ def add_trainer(trainer: TrainerJson):
                     :first,
                     :last,
                     :email,
-                    crypt(:pwd, gen_salt('bf'))
+                    :pwd
                 )
                 RETURNING trainer_id
             """)
-            trainer_id = conn.execute(stm, [
+            trainer_id = (await conn.execute(stm, [
                 {
                     "first": trainer.first_name,
                     "last": trainer.last_name,
                     "email": email,
-                    "pwd": trainer.password
+                    "pwd": password
                 }
-            ]).scalar_one()
+            ])).scalar_one()
 
             return f"trainer_id added: {trainer_id}" 
         
@@ -73,33 +109,51 @@ class TrainerCheck(BaseModel):
     pwd: str
 
 @router.post("/trainers/login/", tags=["trainers"])
-def verify_password(trainer: TrainerCheck):
+async def verify_password(trainer: TrainerCheck, response: Response):
     """
     This endpoint verifies the login credentials for a trainer. Returns trainer id
     - `trainer_email`: the email associated with the trainer
     - `pwd`: trainer's password
+
+    The `X-Session-Token` response header holds a session token. Send it as
+    `Authorization: Bearer <token>` to endpoints that need a logged-in
+    trainer instead of sending the password again.
     """
 
-    check_valid = sqlalchemy.text(
-                    """SELECT trainer_id 
+    # served by trainers_email_lower_idx; the password is checked here 
+    # rather than with crypt() so the bcrypt work stays off the database
+    find_trainer = sqlalchemy.text(
+                    """SELECT trainer_id, password
                         FROM trainers
-                        WHERE email ILIKE :email 
-                        AND password = crypt(:pwd, password)""")
+                        WHERE lower(email) = lower(:email)""")
     
-    with db.engine.begin() as conn:
-        result = conn.execute(check_valid, [
-            {"email": trainer.trainer_email,
-             "pwd": trainer.pwd}
-             ]).one_or_none()
-        
-        if result is None:
-            raise HTTPException(status_code=404, detail="credentials not found")
-        else:
-            return result.trainer_id
+    async with db.async_engine.connect() as conn:
+        rows = (await conn.execute(find_trainer, [
+            {"email": trainer.trainer_email}
+             ])).fetchall()
 
+    for row in rows or [None]:
+        if await auth.check_password(trainer.pwd, 
+                                     row.password if row else None):
+            response.headers[auth.TOKEN_HEADER] = \
+                auth.issue_token(row.trainer_id)
+            return row.trainer_id
+    raise HTTPException(status_code=404, detail="credentials not found")
 
-@router.get("/trainers/{id}", tags=["trainers"])
-def get_trainer(id: int):
+
+@router.get("/trainers/me", tags=["trainers"], 
+            response_model=List[TrainerOut])
+async def get_session_trainer(trainer_id: int = Depends(auth.session_trainer)):
+    """
+    This endpoint returns the trainer logged in with the session token in 
+    the `Authorization: Bearer <token>` header.
+    """
+    return await get_trainer(trainer_id)
+
+
+@router.get("/trainers/{id}", tags=["trainers"], 
+            response_model=List[TrainerOut])
+async def get_trainer(id: int):
     """
     This endpoint can return and update a trainer by its identifiers. 
     For each trainer, it returns:
@@ -109,68 +163,140 @@ def get_trainer(id: int):
     - `email`: the company email of the trainer
     """
     stmt = sqlalchemy.text("""                            
-            SELECT trainer_id, first_name, last_name, email
+            SELECT trainer_id, first_name AS first, last_name AS last, email
             FROM trainers
             WHERE trainers.trainer_id = (:id)                        
         """)
 
-    with db.engine.connect() as conn:
-        result = conn.execute(stmt, [{"id": id}])
-        json = []
-        for row in result:
-            json.append(
-                {
-                    "trainer_id": row.trainer_id,
-                    "first": row.first_name,
-                    "last": row.last_name,
-                    "email": row.email
-                }
-            )
-    if json != []:
-        return json
+    async with db.async_engine.connect() as conn:
+        rows = (await conn.execute(stmt, [{"id": id}])).fetchall()
+    if rows != []:
+        return results.respond(results.mappings(rows))
     
     raise HTTPException(status_code=404, detail="trainer not found.")
 
 
-@router.get("/trainers/", tags=["trainers"])
-def get_trainers(
+@router.get("/trainers/{id}/schedule", tags=["trainers"],
+            response_model=List[ScheduledClassOut])
+async def get_trainer_schedule(
+    id: int,
+    from_: datetime.date = Query(None, alias="from"),
+    to: datetime.date = None
+):
+    """
+    This endpoint returns the classes a trainer teaches from `from` to `to`
+    (both "yyyy-mm-dd" and inclusive), in the order they happen. `from` 
+    defaults to today and `to` to six days after `from`, so a bare request 
+    returns the coming week. A range can span at most 366 days.
+    For every class, it returns:
+    - `class_id`: the id of the class
+    - `date`: the day the class takes place
+    - `start_time`, `end_time`: when the class starts and ends
+    - `class_type_id`, `type`: the id and name of the type of class
+    - `room_id`, `room_name`: the id and name of the room
+    - `num_dogs_attended`: how many dogs are checked in
+    """
+    from_ = from_ or datetime.date.today()
+    to = to or from_ + datetime.timedelta(days=6)
+    if to < from_:
+        raise HTTPException(status_code=400, detail="to should be after from.")
+    if (to - from_).days >= MAX_SCHEDULE_DAYS:
+        raise HTTPException(status_code=400, 
+            detail=f"a schedule can span at most {MAX_SCHEDULE_DAYS} days.")
+
+    # one range scan of classes_trainer_schedule_idx, plus a heap fetch per
+    # class for attendee_count; room and type names come from the reference
+    # data cache instead of joins
+    stmt = sqlalchemy.text("""
+        SELECT class_id, date, start_time, end_time, class_type_id, 
+            room_id, attendee_count AS num_dogs_attended
+        FROM classes
+        WHERE trainer_id = :id AND date BETWEEN :from AND :to
+        ORDER BY date, start_time, class_id
+    """)
+
+    async with db.async_engine.connect() as conn:
+        rows = (await conn.execute(stmt, [
+            {"id": id, "from": from_, "to": to}])).fetchall()
+        if rows == []:
+            exists = (await conn.execute(sqlalchemy.text(
+                "SELECT 1 FROM trainers WHERE trainer_id = :id"), 
+                [{"id": id}])).one_or_none()
+            if exists is None:
+                raise HTTPException(status_code=404, 
+                                    detail="trainer not found.")
+        class_types = await reference_data.cache.class_types(conn)
+        rooms = await reference_data.cache.rooms(conn)
+
+    json = results.mappings(rows)
+    for scheduled in json:
+        class_type = class_types.get(scheduled["class_type_id"])
+        room = rooms.get(scheduled["room_id"])
+        scheduled["type"] = class_type.type if class_type else None
+        scheduled["room_name"] = room.room_name if room else None
+    return results.respond(json)
+
+
+@router.get("/trainers/", tags=["trainers"], 
+            response_model=List[TrainerSummaryOut])
+async def get_trainers(
+    response: Response,
     email: str = "",
     name: str = "",
     limit: int = Query(50, ge=1, le=250),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: str = None,
+    if_none_match: str = Header(None)
 ):
     """
-    This endpoint returns all the trainers in the database. 
+    This endpoint returns all the trainers in the database, sorted by trainer_id. 
     For every trainer, it returns:
     - `trainer_id`: the id associated with the trainer
     - `name`: full name of the trainer
     - `email`: the trainer's email
 
-    You can set a limit and offset.
+    You can set a limit and either an offset or a cursor. When a page is full,
+    the `X-Next-Cursor` response header holds the cursor for the next page.
     You can filter by trainer email and/or name. 
+
+    The response carries a weak `ETag` that changes whenever trainers do.
+    Send it back in `If-None-Match` to get a `304 Not Modified`.
     """
+    pagination.check_paging(cursor, offset)
+    params = {"limit": limit}
+    # only filters that were given are applied; the substring matches are 
+    # served by the trainers_*_trgm_idx trigram indexes
+    where = []
+    if email:
+        where.append("email ILIKE :email")
+        params["email"] = f"%{email}%"
+    if name:
+        where.append("first_name ILIKE :name")
+        params["name"] = f"%{name}%"
+    if cursor is None:
+        skip = "OFFSET :offset"
+        params["offset"] = offset
+    else:
+        where.append("trainer_id > :after_id")
+        skip = ""
+        (params["after_id"],) = pagination.decode_cursor(cursor, int)
+    where = "WHERE " + " AND ".join(where) if where else ""
 
-    stmt = sqlalchemy.text("""                            
-        SELECT trainer_id, first_name, last_name, email
+    stmt = sqlalchemy.text(f"""                            
+        SELECT trainer_id, first_name || ' ' || last_name AS name, email
         FROM trainers  
-        WHERE email ILIKE :email AND first_name ILIKE :name 
+        {where}
+        ORDER BY trainer_id
         LIMIT :limit
-        OFFSET :offset           
+        {skip}
     """)
 
-    with db.engine.connect() as conn:
-        result = conn.execute(stmt, [{"offset": offset,
-                                      "limit": limit, 
-                                      "email": f"%{email}%", 
-                                      "name": f"%{name}%"}])
-        json = []
-        for row in result:
-            json.append(
-                {
-                    "trainer_id": row.trainer_id,
-                    "name": row.first_name + " " + row.last_name ,
-                    "email": row.email
-                }
-            )
+    async with db.async_engine.connect() as conn:
+        not_modified = await versions.check(conn, ["trainers"], 
+                                            if_none_match, response)
+        if not_modified is not None:
+            return not_modified
+        rows = (await conn.execute(stmt, [params])).fetchall()
 
-    return json
\ No newline at end of file
+    pagination.set_next_cursor(response, rows, limit, "trainer_id")
+    return results.respond(results.mappings(rows), response)
\ No newline at end of file
@@ -0,0 +1,85 @@
+import hashlib
+import os
+
+import sqlalchemy
+from fastapi import Response
+
+# Every table has a row in table_versions that a deferred trigger bumps once
+# per writing transaction, as it commits. A read endpoint's ETag is a
+# hash of the versions of the tables it reads, so a conditional request is
+# answered from one primary-key lookup, before the endpoint's main query.
+# The versions are read before the data: a write committed in between can
+# only pair newer rows with an older tag, which costs one extra refetch.
+
+# browsers revalidate every time by default, which is cheap with a 304;
+# shared caches such as the Vercel edge may reuse a response for
+# HTTP_CACHE_S_MAXAGE seconds without asking
+MAX_AGE = int(os.environ.get("HTTP_CACHE_MAX_AGE", "0"))
+SHARED_MAX_AGE = int(os.environ.get("HTTP_CACHE_S_MAXAGE", "5"))
+CACHE_CONTROL = f"public, max-age={MAX_AGE}, s-maxage={SHARED_MAX_AGE}"
+
+VERSIONS = sqlalchemy.text("""
+    SELECT table_name, version
+    FROM table_versions
+    WHERE table_name = ANY(CAST(:tables AS TEXT[]))
+""")
+
+
+async def current(conn, tables):
+    """Returns the version of each of tables, keyed by table name."""
+    rows = (await conn.execute(VERSIONS, [{"tables": list(tables)}])).fetchall()
+    return {row.table_name: row.version for row in rows}
+
+
+def etag(versions, *extra):
+    """
+    Returns a weak ETag for the given table versions, plus anything else
+    the response depends on that isn't part of its URL.
+    """
+    key = "|".join([f"{table}={versions[table]}" for table in sorted(versions)]
+                   + [str(value) for value in extra])
+    return f'W/"{hashlib.md5(key.encode()).hexdigest()}"'
+
+
+def etag_values(if_none_match):
+    """Returns the opaque tags in an If-None-Match header, weak or not."""
+    if if_none_match is None:
+        return []
+    tags = []
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        tags.append(tag.strip('"'))
+    return tags
+
+
+def not_modified(response):
+    """Returns a 304 carrying the ETag and Cache-Control set on response."""
+    return Response(status_code=304, headers={
+        "ETag": response.headers["ETag"],
+        "Cache-Control": response.headers["Cache-Control"]})
+
+
+def conditional(tag, if_none_match, response, exists=True):
+    """
+    Sets ETag and Cache-Control on the endpoint's response, and returns a
+    304 when if_none_match matches tag, or None to carry on. "*" matches
+    only when exists says a current representation does; callers that
+    haven't looked their row up yet pass False and check it afterwards.
+    """
+    response.headers["ETag"] = tag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    sent = etag_values(if_none_match)
+    if tag[2:].strip('"') in sent or (exists and "*" in sent):
+        return not_modified(response)
+    return None
+
+
+async def check(conn, tables, if_none_match, response, *extra, exists=True):
+    """
+    Looks up the versions of tables on conn and answers if_none_match
+    with conditional(). Returns the 304 response, or None to carry on.
+    """
+    return conditional(etag(await current(conn, tables), *extra),
+                       if_none_match, response, exists)
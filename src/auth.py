@@ -0,0 +1,123 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+from fastapi import Header, HTTPException
+
+# Trainer passwords are bcrypt hashes. Hashing and checking them is CPU-bound
+# by design, so it runs on a small process pool in the API tier instead of
+# in Postgres (pgcrypto's crypt()), where a burst of logins would compete
+# with queries for the database's CPU. Hashes use the $2a$ prefix that
+# pgcrypto writes, so old and new hashes stay interchangeable.
+#
+# A successful login returns a signed session token; later requests present
+# it as "Authorization: Bearer <token>" and are checked with one HMAC
+# instead of another bcrypt round.
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "10"))
+# 0 hashes on the event loop's thread pool instead (bcrypt releases the
+# GIL), for hosts without multiprocessing such as Vercel
+PASSWORD_WORKERS = int(os.environ.get(
+    "PASSWORD_WORKERS", "0" if os.environ.get("VERCEL") else
+    str(min(os.cpu_count() or 1, 4))))
+SESSION_TTL = int(os.environ.get("SESSION_TTL", "43200"))
+# without a shared secret, tokens only verify in the process that issued them
+SESSION_SECRET = (os.environ.get("SESSION_SECRET", "").encode()
+                  or secrets.token_bytes(32))
+
+TOKEN_HEADER = "X-Session-Token"
+
+_pool = None
+_dummy_hash = None
+
+
+def _executor():
+    global _pool
+    if _pool is None and PASSWORD_WORKERS > 0:
+        _pool = ProcessPoolExecutor(max_workers=PASSWORD_WORKERS)
+    return _pool
+
+
+def bcrypt_hash(password, rounds=BCRYPT_ROUNDS):
+    salt = bcrypt.gensalt(rounds=rounds, prefix=b"2a")
+    # bcrypt only reads 72 bytes; crypt() drops the rest the same way
+    return bcrypt.hashpw(password.encode()[:72], salt).decode()
+
+
+def bcrypt_check(password, hashed):
+    try:
+        return bcrypt.checkpw(password.encode()[:72], hashed.encode())
+    except ValueError:
+        # not a bcrypt hash
+        return False
+
+
+async def hash_password(password):
+    """Returns a bcrypt hash of password at BCRYPT_ROUNDS."""
+    return await asyncio.get_running_loop().run_in_executor(
+        _executor(), bcrypt_hash, password, BCRYPT_ROUNDS)
+
+
+async def check_password(password, hashed):
+    """
+    Returns whether password matches hashed. A None hash (no such account)
+    is checked against a throwaway hash so it takes as long as a real miss.
+    """
+    global _dummy_hash
+    if hashed is None:
+        if _dummy_hash is None:
+            _dummy_hash = await hash_password(secrets.token_hex(8))
+        await asyncio.get_running_loop().run_in_executor(
+            _executor(), bcrypt_check, password, _dummy_hash)
+        return False
+    return await asyncio.get_running_loop().run_in_executor(
+        _executor(), bcrypt_check, password, hashed)
+
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _sign(payload):
+    return _b64(hmac.new(SESSION_SECRET, payload.encode(),
+                         hashlib.sha256).digest())
+
+
+def issue_token(trainer_id):
+    """Returns a session token for trainer_id valid for SESSION_TTL seconds."""
+    payload = _b64(json.dumps(
+        {"sub": trainer_id, "exp": int(time.time()) + SESSION_TTL},
+        separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def token_trainer(token):
+    """Returns the trainer_id in a valid, unexpired token, or None."""
+    payload, _, signature = token.partition(".")
+    if not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        return None
+    try:
+        padded = payload + "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if claims["exp"] < time.time():
+            return None
+        return int(claims["sub"])
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+async def session_trainer(authorization: str = Header(None)):
+    """Dependency returning the trainer_id of the request's session token."""
+    scheme, _, token = (authorization or "").partition(" ")
+    trainer_id = token_trainer(token) if scheme.lower() == "bearer" else None
+    if trainer_id is None:
+        raise HTTPException(status_code=401, detail="invalid session token.",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return trainer_id
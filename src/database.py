@@ -1,6 +1,9 @@
 import os
+import time
 import dotenv
 import sqlalchemy
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import create_async_engine
 
 dotenv.load_dotenv()
 
@@ -20,13 +23,294 @@ def database_connection_url():
     DB_NAME: str = os.environ.get("POSTGRES_DB")
     return f"postgresql://{DB_USER}:{DB_PASSWD}@{DB_SERVER}:{DB_PORT}/{DB_NAME}"
 
+def async_database_connection_url():
+    return database_connection_url().replace("postgresql://",
+                                             "postgresql+asyncpg://", 1)
+
+class CheckoutTimer:
+    """
+    Pool mixin that adds up how long checkouts took to get a connection,
+    including any wait for one to be returned, for src.metrics.
+    """
+    checkouts = 0
+    checkout_seconds = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            cls = type(self)
+            cls.checkouts += 1
+            cls.checkout_seconds += time.perf_counter() - start
+
+
+class TimedQueuePool(CheckoutTimer, sqlalchemy.pool.QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(CheckoutTimer, sqlalchemy.pool.AsyncAdaptedQueuePool):
+    pass
+
+
+class TimedNullPool(CheckoutTimer, sqlalchemy.pool.NullPool):
+    pass
+
+
+class TimedAsyncNullPool(CheckoutTimer, sqlalchemy.pool.NullPool):
+    pass
+
+
+POOL_PROFILES = ("default", "serverless", "server")
+
+
+def pool_profile():
+    """
+    Returns the pool profile named by DB_POOL_PROFILE. Unset, it is 
+    serverless on Vercel and default (SQLAlchemy's own pool settings) 
+    everywhere else.
+    """
+    profile = os.environ.get("DB_POOL_PROFILE",
+                             "serverless" if os.environ.get("VERCEL") 
+                             else "default")
+    if profile not in POOL_PROFILES:
+        raise RuntimeError(f"DB_POOL_PROFILE must be one of {POOL_PROFILES}, "
+                           f"not {profile!r}")
+    return profile
+
+
+def pool_options(profile):
+    """
+    Returns the create_engine keyword arguments for the sync and the async 
+    engine under a pool profile.
+
+    - serverless: no pooling, so a frozen or recycled instance never holds
+      connections open; point POSTGRES_PORT at PgBouncer (or Supabase's 
+      pooler) in transaction mode. asyncpg's statement caches are off 
+      because named prepared statements don't survive being moved between
+      server connections.
+    - server: the connections Postgres allows (DB_MAX_CONNECTIONS, less 
+      DB_RESERVED_CONNECTIONS for migrations and admin sessions) are split
+      evenly between the WEB_CONCURRENCY worker processes. The sync engine
+      only serves scripts and startup checks, so it keeps a single 
+      connection and the async engine gets the rest.
+    """
+    if profile == "serverless":
+        return ({"poolclass": TimedNullPool},
+                {"poolclass": TimedAsyncNullPool,
+                 "connect_args": {"statement_cache_size": 0,
+                                  "prepared_statement_cache_size": 0}})
+
+    if profile == "server":
+        max_connections = int(os.environ.get("DB_MAX_CONNECTIONS", "100"))
+        reserved = int(os.environ.get("DB_RESERVED_CONNECTIONS", "10"))
+        workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+        per_worker = max(4, (max_connections - reserved) // workers)
+        async_connections = per_worker - 2
+        return ({"poolclass": TimedQueuePool, "pool_size": 1,
+                 "max_overflow": 1, "pool_pre_ping": True},
+                {"poolclass": TimedAsyncQueuePool,
+                 # keep a quarter of the budget as burst-only overflow
+                 "pool_size": async_connections - async_connections // 4,
+                 "max_overflow": async_connections // 4,
+                 "pool_timeout": 10, "pool_recycle": 1800, 
+                 "pool_pre_ping": True})
+
+    return {"poolclass": TimedQueuePool}, {"poolclass": TimedAsyncQueuePool}
+
+
+sync_pool_options, async_pool_options = pool_options(pool_profile())
+
 # Create a new DB engine based on our connection string
-engine = sqlalchemy.create_engine(database_connection_url())
+engine = sqlalchemy.create_engine(database_connection_url(),
+                                  **sync_pool_options)
+
+# Non-blocking engine shared by the API endpoints, so a request waiting on
+# Postgres doesn't hold one of Starlette's threadpool threads.
+async_engine = create_async_engine(async_database_connection_url(),
+                                   **async_pool_options)
 metadata_obj = sqlalchemy.MetaData()
 
-trainers = sqlalchemy.Table("trainers", metadata_obj, autoload_with=engine)
-dogs = sqlalchemy.Table("dogs", metadata_obj, autoload_with=engine)
-comments = sqlalchemy.Table("comments", metadata_obj, autoload_with=engine)
-classes = sqlalchemy.Table("classes", metadata_obj, autoload_with=engine)
-class_types = sqlalchemy.Table("class_types", metadata_obj, autoload_with=engine)
-attendance = sqlalchemy.Table("attendance", metadata_obj, autoload_with=engine)
+
+def trigram_index(name, column):
+    """GIN index serving ILIKE on column, including '%term%' patterns."""
+    return sqlalchemy.Index(name, column, postgresql_using="gin",
+                            postgresql_ops={column: "gin_trgm_ops"})
+
+
+# Tables are declared here instead of reflected with autoload_with=engine so
+# importing this module never opens a connection. Keep these in sync with
+# alembic/versions; verify_schema() checks them against the live database.
+trainers = sqlalchemy.Table(
+    "trainers",
+    metadata_obj,
+    sqlalchemy.Column("trainer_id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("first_name", sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column("last_name", sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column("email", sqlalchemy.Text, nullable=False, unique=True),
+    sqlalchemy.Column("password", sqlalchemy.Text, nullable=False),
+    trigram_index("trainers_email_trgm_idx", "email"),
+    trigram_index("trainers_first_name_trgm_idx", "first_name"),
+)
+# logins look trainers up by email regardless of case
+sqlalchemy.Index("trainers_email_lower_idx", sqlalchemy.func.lower(trainers.c.email))
+
+rooms = sqlalchemy.Table(
+    "rooms",
+    metadata_obj,
+    sqlalchemy.Column("room_id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("room_name", sqlalchemy.Text),
+    sqlalchemy.Column("max_dog_capacity", sqlalchemy.Integer, nullable=False),
+)
+
+class_types = sqlalchemy.Table(
+    "class_types",
+    metadata_obj,
+    sqlalchemy.Column("class_type_id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("type", sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column("description", sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column("max_num_dogs", sqlalchemy.Integer, nullable=False),
+)
+
+classes = sqlalchemy.Table(
+    "classes",
+    metadata_obj,
+    sqlalchemy.Column("class_id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("trainer_id", sqlalchemy.Integer,
+                      sqlalchemy.ForeignKey("trainers.trainer_id")),
+    sqlalchemy.Column("date", sqlalchemy.Date, nullable=False),
+    sqlalchemy.Column("start_time", sqlalchemy.Time, nullable=False),
+    sqlalchemy.Column("end_time", sqlalchemy.Time, nullable=False),
+    sqlalchemy.Column("class_type_id", sqlalchemy.Integer,
+                      sqlalchemy.ForeignKey("class_types.class_type_id")),
+    sqlalchemy.Column("room_id", sqlalchemy.Integer,
+                      sqlalchemy.ForeignKey("rooms.room_id")),
+    # [start, end) of the class, rolled into the next day if it ends 
+    # before it starts; no two classes may overlap in the same room
+    sqlalchemy.Column("booking", postgresql.TSRANGE, sqlalchemy.Computed(
+        "tsrange(date + start_time, date + end_time + CASE WHEN end_time < "
+        "start_time THEN interval '1 day' ELSE interval '0' END, '[)')",
+        persisted=True)),
+    # kept up to date by triggers: attendee_count on attendance writes,
+    # capacity (the smaller of the room's and the class type's limits) on
+    # room, class type and limit changes; a check-in past capacity fails
+    sqlalchemy.Column("attendee_count", sqlalchemy.Integer,
+                      server_default="0", nullable=False),
+    sqlalchemy.Column("capacity", sqlalchemy.Integer,
+                      server_default="0", nullable=False),
+    postgresql.ExcludeConstraint(("room_id", "="), ("booking", "&&"),
+                                 name="classes_room_booking_excl", using="gist"),
+    sqlalchemy.Index("classes_date_idx", "date", "class_id"),
+    sqlalchemy.Index("classes_trainer_date_idx", "trainer_id", "date", "class_id"),
+    sqlalchemy.Index("classes_type_date_idx", "class_type_id", "date", "class_id"),
+    # serves GET /trainers/{id}/schedule as one range scan; attendee_count
+    # is left out so check-ins stay HOT updates
+    sqlalchemy.Index("classes_trainer_schedule_idx", 
+                     "trainer_id", "date", "start_time", "class_id",
+                     postgresql_include=["end_time", "class_type_id", 
+                                         "room_id"]),
+)
+sqlalchemy.Index("classes_isodow_idx", sqlalchemy.extract("isodow", classes.c.date),
+                 classes.c.date, classes.c.class_id)
+
+dogs = sqlalchemy.Table(
+    "dogs",
+    metadata_obj,
+    sqlalchemy.Column("dog_id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("client_email", sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column("birthday", sqlalchemy.Date, nullable=False),
+    sqlalchemy.Column("breed", sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column("dog_name", sqlalchemy.Text, nullable=False),
+    trigram_index("dogs_name_trgm_idx", "dog_name"),
+    trigram_index("dogs_breed_trgm_idx", "breed"),
+    trigram_index("dogs_client_email_trgm_idx", "client_email"),
+)
+
+comments = sqlalchemy.Table(
+    "comments",
+    metadata_obj,
+    sqlalchemy.Column("comment_id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("dog_id", sqlalchemy.Integer,
+                      sqlalchemy.ForeignKey("dogs.dog_id"), nullable=False),
+    sqlalchemy.Column("trainer_id", sqlalchemy.Integer,
+                      sqlalchemy.ForeignKey("trainers.trainer_id"), nullable=False),
+    sqlalchemy.Column("comment_text", sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column("time_added", sqlalchemy.TIMESTAMP,
+                      server_default=sqlalchemy.text("NOW()"), nullable=False),
+)
+sqlalchemy.Index("comments_dog_time_idx", comments.c.dog_id,
+                 comments.c.time_added.desc(), comments.c.comment_id.desc())
+sqlalchemy.Index("comments_text_search_idx",
+                 sqlalchemy.func.to_tsvector(sqlalchemy.literal("english"),
+                                             comments.c.comment_text),
+                 postgresql_using="gin")
+
+attendance = sqlalchemy.Table(
+    "attendance",
+    metadata_obj,
+    sqlalchemy.Column("attendance_id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("dog_id", sqlalchemy.Integer,
+                      sqlalchemy.ForeignKey("dogs.dog_id"), nullable=False),
+    sqlalchemy.Column("class_id", sqlalchemy.Integer,
+                      sqlalchemy.ForeignKey("classes.class_id"), nullable=False),
+    sqlalchemy.Column("check_in", sqlalchemy.TIMESTAMP,
+                      server_default=sqlalchemy.text("NOW()"), nullable=False),
+    sqlalchemy.Index("classes_attendance_idx", "class_id"),
+    sqlalchemy.Index("attendance_dog_check_in_idx",
+                     "dog_id", "check_in", "attendance_id"),
+)
+
+# when each monthly stats materialized view was last refreshed
+stats_refreshes = sqlalchemy.Table(
+    "stats_refreshes",
+    metadata_obj,
+    sqlalchemy.Column("view_name", sqlalchemy.Text, primary_key=True),
+    sqlalchemy.Column("refreshed_at", sqlalchemy.TIMESTAMP(timezone=True),
+                      nullable=False),
+)
+
+# one row per table above, bumped by a deferred trigger once per transaction
+# that writes to it; read endpoints derive their ETags from these
+table_versions = sqlalchemy.Table(
+    "table_versions",
+    metadata_obj,
+    sqlalchemy.Column("table_name", sqlalchemy.Text, primary_key=True),
+    sqlalchemy.Column("version", sqlalchemy.BigInteger, nullable=False),
+)
+
+
+def verify_schema():
+    """
+    Compares the static table definitions above against the live catalog.
+    Raises a RuntimeError listing every missing table or column and every
+    column whose type or nullability differs.
+    """
+    inspector = sqlalchemy.inspect(engine)
+    live_tables = set(inspector.get_table_names())
+    problems = []
+
+    for table in metadata_obj.sorted_tables:
+        if table.name not in live_tables:
+            problems.append(f"table {table.name} is missing")
+            continue
+
+        live_columns = {col["name"]: col for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            live = live_columns.get(column.name)
+            if live is None:
+                problems.append(f"column {table.name}.{column.name} is missing")
+                continue
+
+            expected_type = column.type.compile(dialect=engine.dialect)
+            live_type = live["type"].compile(dialect=engine.dialect)
+            if expected_type != live_type:
+                problems.append(f"column {table.name}.{column.name} is "
+                                f"{live_type}, expected {expected_type}")
+            if column.nullable != live["nullable"]:
+                problems.append(f"column {table.name}.{column.name} has "
+                                f"nullable={live['nullable']}, "
+                                f"expected {column.nullable}")
+
+    if problems:
+        raise RuntimeError("database schema does not match src/database.py: "
+                           + "; ".join(problems))
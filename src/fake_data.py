@@ -1,274 +1,444 @@
+"""
+Fills a freshly migrated database with fake data:
+
+    python -m src.fake_data --scale 0.1 --seed 7 --workers 4
+
+The large tables are generated a chunk at a time and streamed in with
+COPY FROM STDIN. Dogs and classes load in parallel, then attendance and
+comments. Secondary indexes and the room booking constraint are dropped
+for the load and rebuilt once at the end, and the tables' triggers are
+switched off while it runs and the class counters filled in afterwards.
+The monthly stats views are refreshed last.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta
 from faker import Faker
 import sqlalchemy
+from sqlalchemy.dialects import postgresql
+import argparse
 import random
-import os
-import dotenv
-from datetime import timedelta, datetime
-
-def database_connection_url():
-    dotenv.load_dotenv()
-    DB_USER: str = os.environ.get("POSTGRES_USER")
-    DB_PASSWD = os.environ.get("POSTGRES_PASSWORD")
-    DB_SERVER: str = os.environ.get("POSTGRES_SERVER")
-    DB_PORT: str = os.environ.get("POSTGRES_PORT")
-    DB_NAME: str = os.environ.get("POSTGRES_DB")
-    return f"postgresql://{DB_USER}:{DB_PASSWD}@{DB_SERVER}:{DB_PORT}/{DB_NAME}"
-
-engine = sqlalchemy.create_engine(database_connection_url())
-
-fake = Faker()
+import csv
+import io
+from src import auth
+from src import database as db
+from src import stats
+
 num_trainers = 20
 num_class_types = 5 #fixed
-num_rooms = 10 
+num_rooms = 10
 
+# row counts at --scale 1
 num_dogs = 400000
 num_attendances = 800000
 num_classes = 400000
 num_comments = 800000
 
+# rows generated and sent per COPY
+CHUNK_SIZE = 50000
+# dates are drawn relative to this day rather than today, so a seed
+# always produces the same data
+ANCHOR = date(2024, 1, 1)
+# average classes a room holds a day. A day fits about 14 non-overlapping
+# classes, and drawing free slots slows down well before that, so at
+# larger scales the class dates reach further back to keep to this
+CLASSES_PER_ROOM_DAY = 5
 
-def populate_trainers():
-    
-    with engine.begin() as conn:
-        try:
-            
-            trainers = []
-            for _ in range(num_trainers):      
-                trainers.append({
-                    "first_name": fake.first_name(),
-                    "last_name": fake.last_name(),
-                    "email": fake.unique.email(domain="dogtrainers.com"),
-                    "pwd": "password"
-                })
-
-            stm = sqlalchemy.text("""
-                INSERT INTO trainers 
-                (first_name, last_name, email, password) 
-                VALUES (
-                    :first_name,
-                    :last_name,
-                    :email,
-                    crypt(:pwd, gen_salt('bf')) 
-                )
-            """)
-            conn.execute(stm, trainers)
-            
-        except Exception as error:
-            print(error)
-
-def populate_dogs():
-    
-    breeds = ["Basset Hound", "Beagle", "Border Collie",
-              "Dobermann", "Golden Retriever", "Chihuahua",
-              "Maltese", "Rottweiler", "Pug", "Poodle"]
-    
-    with engine.begin() as conn:
-        try:
-            dogs = []
-            for _ in range(num_dogs): 
-                dogs.append({
-                    "dog_name": fake.first_name(),
-                    "client_email": fake.unique.email(),
-                    "birthday": fake.date_of_birth(None, 1, 20),
-                    "breed": random.choice(breeds) 
-                })
-
-            stm = sqlalchemy.text("""
-                INSERT INTO dogs 
-                (client_email, birthday, breed, dog_name) 
-                VALUES (
-                    :client_email,
-                    :birthday,
-                    :breed,
-                    :dog_name
-                )
-            """)
-            conn.execute(stm, dogs)
-            
-        except Exception as error:
-            print(error)
-
-
-def populate_class_types():
-    with engine.begin() as conn:
-        try:  
-            class_types = [
-                {
-                    "type": "Puppy Training",
-                    "description": "Potty training, puppy biting,\
+breeds = ["Basset Hound", "Beagle", "Border Collie",
+          "Dobermann", "Golden Retriever", "Chihuahua",
+          "Maltese", "Rottweiler", "Pug", "Poodle"]
+
+text_options = ["Much improvement",
+                "Learned many basic skills today!" ,
+                "Very well behaved dog!",
+                "Ready to move into a more advanced class",
+                "Still working on patience",
+                "Needs more training",
+                "Should attend the puppy class",
+                "Should move to the beginner class",
+                "Very energetic dog",
+                "Super calm dog",
+                "Belongs in the intermediate class",
+                "Will be ready to advance after next week",
+                "Work on the new skills learned today"]
+
+class_types = [
+    {
+        "type": "Puppy Training",
+        "description": "Potty training, puppy biting,\
  barking, and basic commands will be covered.",
-                    "max_num_dogs": 10
-                },
-                {
-                    "type": "Beginner",
-                    "description": "Dogs at the beginner level \
+        "max_num_dogs": 10
+    },
+    {
+        "type": "Beginner",
+        "description": "Dogs at the beginner level \
 will learn basic manners and obedience techniques.",
-                    "max_num_dogs": 10
-                },
-                {
-                    "type": "Intermediate",
-                    "description": "Dogs at the intermediate level \
+        "max_num_dogs": 10
+    },
+    {
+        "type": "Intermediate",
+        "description": "Dogs at the intermediate level \
 will enhance their skills from previous classes.",
-                    "max_num_dogs": 15
-                },
-                {
-                    "type": "Advanced",
-                    "description": "Dogs will learn more advanced skills \
+        "max_num_dogs": 15
+    },
+    {
+        "type": "Advanced",
+        "description": "Dogs will learn more advanced skills \
 and commands, including emotional support animal training.",
-                    "max_num_dogs": 20
-                },
-                {
-                    "type": "Dog Playdate",
-                    "description": "A large group of dogs will \
+        "max_num_dogs": 20
+    },
+    {
+        "type": "Dog Playdate",
+        "description": "A large group of dogs will \
 interact and play together.",
-                    "max_num_dogs": 50
-                }
-            ]
-
-            stm = sqlalchemy.text("""
-                INSERT INTO class_types 
-                (type, description, max_num_dogs) 
-                VALUES (
-                    :type,
-                    :description,
-                    :max_num_dogs
-                )
-            """)
-            conn.execute(stm, class_types)
-            
-        except Exception as error:
-            print(error)
-
-def populate_rooms():
+        "max_num_dogs": 50
+    }
+]
+
+
+def rng_for(seed, *job):
+    """Returns a generator seeded by the run's seed and the job it is for."""
+    return random.Random("-".join(str(part) for part in (seed, *job)))
+
+
+def random_date(rng, start, end):
+    return date.fromordinal(rng.randint(start.toordinal(), end.toordinal()))
+
+
+def random_datetime(rng, start, end):
+    return start + timedelta(seconds=rng.randint(
+        0, int((end - start).total_seconds())))
+
+
+def name_pool(seed, size=1000):
+    fake = Faker()
+    fake.seed_instance(seed)
+    return [fake.first_name() for _ in range(size)]
+
+
+def chunks(rows, size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def copy_rows(table, columns, rows):
+    """Streams rows into table with COPY, one CHUNK_SIZE batch at a time."""
+    engine = sqlalchemy.create_engine(db.database_connection_url())
+    stm = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    count = 0
     with engine.begin() as conn:
-        rooms_lst = []
-        for i in range(num_rooms):
-            rooms_lst.append({
-                "room_name": chr(65 + i),
-                "max_dog_capacity": random.randint(10, 50)
-            })
-            
-        try:  
-            stm = sqlalchemy.text("""
-                INSERT INTO rooms 
-                (room_name, max_dog_capacity) 
-                VALUES (
-                    :room_name, 
-                    :max_dog_capacity
-                )
-            """)
-            conn.execute(stm, rooms_lst)
-            
-        except Exception as error:
-            print(error)
-
-def populate_attendance():
-    with engine.begin() as conn:    
-        try:
-            attendances = []
-            for _ in range(num_attendances): 
-                attendances.append({
-                    "dog_id": random.randint(1, num_dogs),
-                    "class_id": random.randint(1, num_classes),
-                    "check_in": fake.date_time_between()
-                })
-
-            stm = sqlalchemy.text("""
-                INSERT INTO attendance
-                (dog_id, class_id, check_in) 
-                VALUES (
-                    :dog_id,
-                    :class_id,
-                    :check_in
-                )
-            """)
-            conn.execute(stm, attendances)
-        
-        except Exception as error:
-            print(error)
-
-def populate_classes():
+        cursor = conn.connection.cursor()
+        for chunk in chunks(rows):
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(chunk)
+            buffer.seek(0)
+            cursor.copy_expert(stm, buffer)
+            count += len(chunk)
+    engine.dispose()
+    return table, count
+
+
+def dog_rows(seed, part, start, count):
+    rng = rng_for(seed, "dogs", part)
+    names = name_pool(seed)
+    oldest = ANCHOR - timedelta(days=20 * 365)
+    youngest = ANCHOR - timedelta(days=365)
+    for i in range(start, start + count):
+        name = rng.choice(names)
+        # numbered rather than fake.unique so no worker tracks every email
+        yield (f"{name.lower()}{i}@example.com",
+               random_date(rng, oldest, youngest),
+               rng.choice(breeds),
+               name)
+
+
+def class_rows(seed, room_id, count, trainer_ids, class_type_ids):
+    rng = rng_for(seed, "classes", room_id)
+    last = ANCHOR + timedelta(days=3 * 365)
+    first = last - timedelta(days=max(23 * 365,
+                                      -(-count // CLASSES_PER_ROOM_DAY)))
+    # date -> booked (start, end) hours in this room, since the
+    # classes_room_booking_excl constraint rejects overlaps
+    booked = {}
+    made = 0
+    while made < count:
+        hours = rng.randint(1, 3)
+        start = rng.randint(0, 23 - hours) + rng.choice([0, 0.5])
+        end = start + hours
+        class_date = random_date(rng, first, last)
+
+        room_day = booked.setdefault(class_date, [])
+        if any(start < booked_end and booked_start < end
+               for booked_start, booked_end in room_day):
+            continue
+        room_day.append((start, end))
+        made += 1
+
+        yield (rng.choice(trainer_ids),
+               class_date,
+               time(int(start), int(start % 1 * 60)),
+               time(int(end), int(end % 1 * 60)),
+               rng.choice(class_type_ids),
+               room_id)
+
+
+def attendance_rows(seed, part, count, dog_ids, class_ids):
+    rng = rng_for(seed, "attendance", part)
+    first = datetime.combine(ANCHOR, time()) - timedelta(days=30 * 365)
+    last = datetime.combine(ANCHOR, time())
+    for _ in range(count):
+        yield (rng.randint(*dog_ids),
+               rng.randint(*class_ids),
+               random_datetime(rng, first, last))
+
+
+def comment_rows(seed, part, count, dog_ids, trainer_ids):
+    rng = rng_for(seed, "comments", part)
+    first = datetime.combine(ANCHOR, time()) - timedelta(days=30 * 365)
+    last = datetime.combine(ANCHOR, time())
+    for _ in range(count):
+        yield (rng.randint(*dog_ids),
+               rng.choice(trainer_ids),
+               rng.choice(text_options),
+               random_datetime(rng, first, last))
+
+
+COLUMNS = {
+    "dogs": ["client_email", "birthday", "breed", "dog_name"],
+    "classes": ["trainer_id", "date", "start_time", "end_time",
+                "class_type_id", "room_id"],
+    "attendance": ["dog_id", "class_id", "check_in"],
+    "comments": ["dog_id", "trainer_id", "comment_text", "time_added"],
+}
+
+GENERATORS = {
+    "dogs": dog_rows,
+    "classes": class_rows,
+    "attendance": attendance_rows,
+    "comments": comment_rows,
+}
+
+
+def load(table, *args):
+    """Worker entry point: generates and copies one part of a table."""
+    return copy_rows(table, COLUMNS[table], GENERATORS[table](*args))
+
+
+def parts(total, workers):
+    """Splits total rows into about one part per worker."""
+    size = max(CHUNK_SIZE, -(-total // workers))
+    return [(start, min(size, total - start))
+            for start in range(0, total, size)]
+
+
+def populate_trainers(conn, seed):
+    fake = Faker()
+    fake.seed_instance(seed)
+    # every fake trainer shares one password, so it is hashed once
+    password = auth.bcrypt_hash("password")
+    trainers = []
+    for _ in range(num_trainers):
+        trainers.append({
+            "first_name": fake.first_name(),
+            "last_name": fake.last_name(),
+            "email": fake.unique.email(domain="dogtrainers.com"),
+            "pwd": password
+        })
+
+    stm = sqlalchemy.text("""
+        INSERT INTO trainers
+        (first_name, last_name, email, password)
+        VALUES (
+            :first_name,
+            :last_name,
+            :email,
+            :pwd
+        )
+    """)
+    conn.execute(stm, trainers)
+
+
+def populate_class_types(conn):
+    stm = sqlalchemy.text("""
+        INSERT INTO class_types
+        (type, description, max_num_dogs)
+        VALUES (
+            :type,
+            :description,
+            :max_num_dogs
+        )
+    """)
+    conn.execute(stm, class_types)
+
+
+def populate_rooms(conn, seed):
+    rng = rng_for(seed, "rooms")
+    rooms_lst = []
+    for i in range(num_rooms):
+        rooms_lst.append({
+            "room_name": chr(65 + i),
+            "max_dog_capacity": rng.randint(10, 50)
+        })
+
+    stm = sqlalchemy.text("""
+        INSERT INTO rooms
+        (room_name, max_dog_capacity)
+        VALUES (
+            :room_name,
+            :max_dog_capacity
+        )
+    """)
+    conn.execute(stm, rooms_lst)
+
+
+def deferred_objects(conn):
+    """
+    Returns the secondary indexes and exclusion constraints declared in
+    src/database.py that exist in the database, which are cheaper to
+    build once after the load than to maintain row by row.
+    """
+    objects = []
+    for table in db.metadata_obj.sorted_tables:
+        for obj in [*table.indexes, *table.constraints]:
+            if not isinstance(obj, (sqlalchemy.Index,
+                                    postgresql.ExcludeConstraint)):
+                continue
+            exists = conn.execute(sqlalchemy.text(
+                "SELECT to_regclass(:name) IS NOT NULL"),
+                {"name": obj.name}).scalar_one()
+            if exists:
+                objects.append(obj)
+    return objects
+
+
+def drop_deferred(conn, objects):
+    for obj in objects:
+        if isinstance(obj, sqlalchemy.Index):
+            conn.execute(sqlalchemy.schema.DropIndex(obj))
+        else:
+            conn.execute(sqlalchemy.schema.DropConstraint(obj))
+
+
+def create_deferred(conn, objects):
+    for obj in objects:
+        if isinstance(obj, sqlalchemy.Index):
+            conn.execute(sqlalchemy.schema.CreateIndex(obj))
+        else:
+            conn.execute(sqlalchemy.schema.AddConstraint(obj))
+
+
+# tables loaded in bulk, with their triggers off: the counter triggers
+# would lock and update a class for every attendance row, and the version
+# triggers would queue an event per row until each COPY commits
+BULK_TABLES = ("dogs", "classes", "attendance", "comments")
+FILL_CLASS_COUNTS = sqlalchemy.text("""
+    UPDATE classes SET
+        capacity = class_capacity(room_id, class_type_id),
+        attendee_count = (SELECT COUNT(*) FROM attendance
+                          WHERE attendance.class_id = classes.class_id)
+""")
+
+
+def id_range(conn, table, column):
+    return tuple(conn.execute(sqlalchemy.text(
+        f"SELECT MIN({column}), MAX({column}) FROM {table}")).one())
+
+
+def run_parallel(pool, jobs):
+    for future in [pool.submit(load, *job) for job in jobs]:
+        table, count = future.result()
+        print(f"  {table}: {count} rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiplier for the dog, class, attendance and "
+                             "comment row counts (default 1)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for every random choice (default 0)")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="worker processes loading tables (default 4)")
+    args = parser.parse_args()
+    # the class dates of the fullest room have to start after year 1
+    max_scale = ((ANCHOR.toordinal() - date.min.toordinal())
+                 * CLASSES_PER_ROOM_DAY * num_rooms / num_classes)
+    if not 0 < args.scale < max_scale:
+        parser.error(f"--scale should be above 0 and below {max_scale:.0f}")
+
+    dogs_total = int(num_dogs * args.scale)
+    classes_total = int(num_classes * args.scale)
+    attendance_total = int(num_attendances * args.scale)
+    comments_total = int(num_comments * args.scale)
+
+    engine = sqlalchemy.create_engine(db.database_connection_url())
     with engine.begin() as conn:
-        try:
-            
-            classes = []
-            for _ in range(num_classes):  
-                # start_time = fake.time_object()
-                s_time = datetime(2022, 1, 1, 
-                                  random.randint(0, 23), random.choice([0, 30]), 0)
-                time_change = timedelta(hours=random.randint(1, 3))
-                end_time = s_time + time_change
-
-                classes.append({
-                    "trainer_id": random.randint(1, num_trainers),
-                    "date": fake.date_time_between(start_date='-20y', end_date='+3y'),
-                    "start_time": s_time,#start_time,
-                    "end_time": end_time,#start_time.timedelta(hours=1),
-                    "class_type_id": random.randint(1, num_class_types),
-                    "room_id": random.randint(1, num_rooms)
-                })
-
-            stm = sqlalchemy.text("""
-                INSERT INTO classes
-                (trainer_id, date, start_time, end_time, class_type_id, room_id) 
-                VALUES (
-                    :trainer_id, 
-                    :date, 
-                    :start_time, 
-                    :end_time, 
-                    :class_type_id, 
-                    :room_id
-                )
-            """)
-            conn.execute(stm, classes)
-            
-        except Exception as error:
-            print(error)
-
-def populate_comments():
-    with engine.begin() as conn:    
-        try:
-            comments = []
-            text_options = ["Much improvement",
-                            "Learned many basic skills today!" ,
-                            "Very well behaved dog!",
-                            "Ready to move into a more advanced class",
-                            "Still working on patience",
-                            "Needs more training",
-                            "Should attend the puppy class",
-                            "Should move to the beginner class",
-                            "Very energetic dog",
-                            "Super calm dog",
-                            "Belongs in the intermediate class",
-                            "Will be ready to advance after next week",
-                            "Work on the new skills learned today"]
-            for _ in range(num_comments): 
-                comments.append({
-                    "dog_id": random.randint(1, num_dogs),
-                    "trainer_id": random.randint(1, num_trainers),
-                    "comment_text": random.choice(text_options),
-                    "time_added": fake.date_time_between()
-                })
-
-            stm = sqlalchemy.text("""
-                INSERT INTO comments
-                (dog_id, trainer_id, comment_text, time_added) 
-                VALUES (
-                    :dog_id,
-                    :trainer_id,
-                    :comment_text,
-                    :time_added
-                )
-            """)
-            conn.execute(stm, comments)
-        
-        except Exception as error:
-            print(error)
-
-populate_trainers()     
-populate_dogs()
-populate_class_types()
-populate_rooms()
-populate_classes()
-populate_attendance()
-populate_comments()
+        print("Populating trainers, class_types and rooms...")
+        populate_trainers(conn, args.seed)
+        populate_class_types(conn)
+        populate_rooms(conn, args.seed)
+        trainer_ids = list(conn.execute(sqlalchemy.text(
+            "SELECT trainer_id FROM trainers ORDER BY trainer_id")).scalars())
+        class_type_ids = list(conn.execute(sqlalchemy.text(
+            "SELECT class_type_id FROM class_types ORDER BY class_type_id"))
+            .scalars())
+        room_ids = list(conn.execute(sqlalchemy.text(
+            "SELECT room_id FROM rooms ORDER BY room_id")).scalars())
+
+        deferred = deferred_objects(conn)
+        drop_deferred(conn, deferred)
+        for table in BULK_TABLES:
+            conn.execute(sqlalchemy.text(
+                f"ALTER TABLE {table} DISABLE TRIGGER USER"))
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        print("Loading dogs and classes...")
+        # classes only overlap within a room, so each room is its own part
+        run_parallel(pool,
+            [("dogs", args.seed, i, start, count) for i, (start, count)
+             in enumerate(parts(dogs_total, args.workers))] +
+            [("classes", args.seed, room_id,
+              classes_total // len(room_ids)
+              + (i < classes_total % len(room_ids)),
+              trainer_ids, class_type_ids)
+             for i, room_id in enumerate(room_ids)])
+
+        with engine.connect() as conn:
+            dog_ids = id_range(conn, "dogs", "dog_id")
+            class_ids = id_range(conn, "classes", "class_id")
+
+        print("Loading attendance and comments...")
+        run_parallel(pool,
+            [("attendance", args.seed, i, count, dog_ids, class_ids)
+             for i, (_, count) in enumerate(parts(attendance_total,
+                                                  args.workers))] +
+            [("comments", args.seed, i, count, dog_ids, trainer_ids)
+             for i, (_, count) in enumerate(parts(comments_total,
+                                                  args.workers))])
+
+    with engine.begin() as conn:
+        print(f"Building {len(deferred)} deferred indexes and constraints...")
+        create_deferred(conn, deferred)
+        # before the triggers are back on, or the version trigger would
+        # queue an event for every class
+        print("Filling in class capacities and attendee counts...")
+        conn.execute(FILL_CLASS_COUNTS)
+        for table in BULK_TABLES:
+            conn.execute(sqlalchemy.text(
+                f"ALTER TABLE {table} ENABLE TRIGGER USER"))
+        # the version triggers were off for the load
+        conn.execute(sqlalchemy.text(
+            "UPDATE table_versions SET version = version + 1"))
+        print("Refreshing the monthly stats views...")
+        stats.refresh(conn, concurrently=False)
+        conn.execute(sqlalchemy.text("ANALYZE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import contextvars
+import time
+
+import sqlalchemy
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry,
+                               Counter, Histogram, generate_latest)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.routing import Match
+
+from src import database as db
+from src import reference_data
+from src.api import query_cache
+
+# Request latency is recorded per route template (/dogs/{id}, not /dogs/7)
+# by the middleware below, which also puts the template in current_route so
+# the cursor hooks on both engines can charge each query to the request
+# that ran it. Everything is served from GET /metrics.
+
+UNMATCHED = "<unmatched>"
+# route of the request being handled, or None outside a request
+current_route = contextvars.ContextVar("current_route", default=None)
+
+registry = CollectorRegistry()
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route and status.",
+    ["method", "route", "status"], registry=registry)
+QUERIES = Counter(
+    "db_queries_total", "SQL statements executed by route.",
+    ["route"], registry=registry)
+QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "SQL statement latency by route.",
+    ["route"], registry=registry)
+ROWS = Counter(
+    "db_rows_total", "Rows returned or affected by SQL statements, by route.",
+    ["route"], registry=registry)
+TRANSACTION_CONFLICTS = Counter(
+    "db_transaction_conflicts_total",
+    "Transactions that hit a serialization failure or deadlock, by route.",
+    ["route", "sqlstate"], registry=registry)
+TRANSACTION_RETRIES = Counter(
+    "db_transaction_retries_total",
+    "Transactions re-run after a conflict, by route.",
+    ["route"], registry=registry)
+
+
+def route_template(app, scope):
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return UNMATCHED
+
+
+async def record_request(request, call_next):
+    """HTTP middleware timing each request against its route template."""
+    route = route_template(request.app, request.scope)
+    token = current_route.set(route)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUEST_SECONDS.labels(request.method, route, str(status)) \
+            .observe(time.perf_counter() - start)
+        current_route.reset(token)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    route = current_route.get() or UNMATCHED
+    QUERIES.labels(route).inc()
+    QUERY_SECONDS.labels(route).observe(
+        time.perf_counter() - context._metrics_start)
+    # -1 when unknown, e.g. for results streamed from a server-side cursor
+    if cursor.rowcount > 0:
+        ROWS.labels(route).inc(cursor.rowcount)
+
+
+for engine in (db.engine, db.async_engine.sync_engine):
+    sqlalchemy.event.listen(engine, "before_cursor_execute", _before_execute)
+    sqlalchemy.event.listen(engine, "after_cursor_execute", _after_execute)
+
+
+class PoolCollector:
+    """Reads pool, reference cache and query cache state at scrape time."""
+
+    def collect(self):
+        size = GaugeMetricFamily(
+            "db_pool_size", "Connections the pool keeps open.", labels=["engine"])
+        checked_out = GaugeMetricFamily(
+            "db_pool_checked_out", "Connections in use.", labels=["engine"])
+        overflow = GaugeMetricFamily(
+            "db_pool_overflow", "Connections open beyond the pool size.",
+            labels=["engine"])
+        checkouts = CounterMetricFamily(
+            "db_pool_checkouts", "Connections handed out by the pool.",
+            labels=["engine"])
+        wait = CounterMetricFamily(
+            "db_pool_checkout_wait_seconds",
+            "Time spent getting a connection from the pool.", labels=["engine"])
+
+        for name, engine in (("sync", db.engine),
+                             ("async", db.async_engine.sync_engine)):
+            pool = engine.pool
+            if isinstance(pool, sqlalchemy.pool.QueuePool):
+                size.add_metric([name], pool.size())
+                checked_out.add_metric([name], pool.checkedout())
+                overflow.add_metric([name], max(pool.overflow(), 0))
+            if isinstance(pool, db.CheckoutTimer):
+                checkouts.add_metric([name], type(pool).checkouts)
+                wait.add_metric([name], type(pool).checkout_seconds)
+        yield from (size, checked_out, overflow, checkouts, wait)
+
+        stats = reference_data.cache.stats()
+        hits = CounterMetricFamily(
+            "reference_cache_hits", "Reference data cache hits.")
+        hits.add_metric([], stats["hits"])
+        misses = CounterMetricFamily(
+            "reference_cache_misses", "Reference data cache misses.")
+        misses.add_metric([], stats["misses"])
+        yield from (hits, misses)
+
+        stats = query_cache.cache.stats()
+        labels = [stats["backend"]]
+        hits = CounterMetricFamily(
+            "query_cache_hits", "Query result cache hits.", labels=["backend"])
+        hits.add_metric(labels, stats["hits"])
+        misses = CounterMetricFamily(
+            "query_cache_misses", "Query result cache misses.",
+            labels=["backend"])
+        misses.add_metric(labels, stats["misses"])
+        ratio = GaugeMetricFamily(
+            "query_cache_hit_ratio", "Share of query cache lookups that hit.",
+            labels=["backend"])
+        ratio.add_metric(labels, stats["hit_ratio"])
+        evictions = CounterMetricFamily(
+            "query_cache_evictions", "Entries evicted by newer table versions.",
+            labels=["backend"])
+        evictions.add_metric(labels, stats["evictions"])
+        errors = CounterMetricFamily(
+            "query_cache_errors",
+            "Query cache backend calls that failed; the query ran instead.",
+            labels=["backend"])
+        errors.add_metric(labels, stats["errors"])
+        saved = CounterMetricFamily(
+            "query_cache_saved_seconds",
+            "Query time saved by hits, net of the cache lookups.",
+            labels=["backend"])
+        saved.add_metric(labels, stats["seconds_saved"])
+        yield from (hits, misses, ratio, evictions, errors, saved)
+
+
+registry.register(PoolCollector())
+
+
+def render():
+    """Returns the metrics in Prometheus text format and their content type."""
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,122 @@
+import os
+import re
+import time
+
+import sqlalchemy
+
+from src import database as db
+
+# class_types and rooms are a handful of rows that almost never change, so
+# they are loaded into memory once per TTL instead of being re-queried or
+# joined on every request. Any write to either table made through db.engine
+# or db.async_engine clears the cached copy when it commits; the TTL covers
+# writes made from outside this process.
+
+DEFAULT_TTL = float(os.environ.get("REFERENCE_CACHE_TTL", "300"))
+
+QUERIES = {
+    "class_types": sqlalchemy.text("""
+        SELECT class_type_id, type, description, max_num_dogs
+        FROM class_types
+        ORDER BY class_type_id
+    """),
+    "rooms": sqlalchemy.text("""
+        SELECT room_id, room_name, max_dog_capacity
+        FROM rooms
+        ORDER BY max_dog_capacity, room_id
+    """),
+}
+
+VERSION = sqlalchemy.text("""
+    SELECT version FROM table_versions WHERE table_name = :table
+""")
+
+# the table may follow ONLY, be schema-qualified and be quoted, as in
+# UPDATE ONLY "public"."rooms"
+WRITE = re.compile(r"\b(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?)"
+                   r"(?:\s+ONLY)?\s+(?:(?:\w+|\"[^\"]+\")\s*\.\s*)?"
+                   r"\"?(class_types|rooms)\b\"?", re.IGNORECASE)
+
+
+class ReferenceCache:
+    """
+    Process-local cache of the class_types and rooms tables. Each table is 
+    held as a dict from id to row, in the order of its query above.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+
+    async def get(self, table, conn=None):
+        entry = self._entries.get(table)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        if conn is None:
+            async with db.async_engine.connect() as conn:
+                version, rows = await self._load(table, conn)
+        else:
+            version, rows = await self._load(table, conn)
+        by_id = {row[0]: row for row in rows}
+        self._entries[table] = (time.monotonic() + self.ttl, by_id, version)
+        return by_id
+
+    async def _load(self, table, conn):
+        # the version is read first, so it is never newer than the rows
+        version = (await conn.execute(VERSION, [{"table": table}])).scalar()
+        rows = (await conn.execute(QUERIES[table])).fetchall()
+        return version, rows
+
+    def version(self, table):
+        """
+        Returns the table_versions version the cached copy of table was 
+        loaded at, or None when it isn't cached.
+        """
+        entry = self._entries.get(table)
+        return entry[2] if entry is not None else None
+
+    async def class_types(self, conn=None):
+        return await self.get("class_types", conn)
+
+    async def rooms(self, conn=None):
+        return await self.get("rooms", conn)
+
+    def invalidate(self, table=None):
+        if table is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(table, None)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "cached_tables": sorted(self._entries)}
+
+
+cache = ReferenceCache()
+
+
+def _note_write(conn, cursor, statement, parameters, context, executemany):
+    tables = set(WRITE.findall(statement))
+    if tables:
+        conn.info.setdefault("reference_writes", set()).update(
+            table.lower() for table in tables)
+
+
+def _commit(conn):
+    for table in conn.info.pop("reference_writes", ()):
+        cache.invalidate(table)
+
+
+def _rollback(conn):
+    conn.info.pop("reference_writes", None)
+
+
+for engine in (db.engine, db.async_engine.sync_engine):
+    sqlalchemy.event.listen(engine, "after_cursor_execute", _note_write)
+    sqlalchemy.event.listen(engine, "commit", _commit)
+    sqlalchemy.event.listen(engine, "rollback", _rollback)
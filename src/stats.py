@@ -0,0 +1,48 @@
+"""
+Refreshes the monthly stats materialized views behind GET /stats/...:
+
+    python -m src.stats
+
+Run it on a schedule (cron, or the Vercel cron job that calls
+GET /stats/refresh). Each view is refreshed CONCURRENTLY, so the stats
+endpoints keep answering from the previous data while it runs.
+"""
+import time
+
+import sqlalchemy
+
+from src import database as db
+
+# materialized views created by alembic, in refresh order
+VIEWS = ("class_type_monthly_stats", "trainer_monthly_stats")
+
+# kept out of the views themselves, so a refresh that changes no numbers
+# rewrites no rows
+RECORD_REFRESH = sqlalchemy.text("""
+    INSERT INTO stats_refreshes (view_name, refreshed_at)
+    VALUES (:view, now())
+    ON CONFLICT (view_name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at
+""")
+
+
+def refresh(conn, concurrently=True):
+    """
+    Refreshes every stats view on conn and returns how many seconds each
+    took. A refresh that isn't CONCURRENTLY locks out readers of the view
+    while it runs, which is only worth it on an idle database.
+    """
+    mode = "CONCURRENTLY " if concurrently else ""
+    timings = {}
+    for view in VIEWS:
+        start = time.perf_counter()
+        conn.execute(sqlalchemy.text(
+            f"REFRESH MATERIALIZED VIEW {mode}{view}"))
+        conn.execute(RECORD_REFRESH, {"view": view})
+        timings[view] = round(time.perf_counter() - start, 3)
+    return timings
+
+
+if __name__ == "__main__":
+    with db.engine.begin() as conn:
+        for view, seconds in refresh(conn).items():
+            print(f"{view}: refreshed in {seconds}s")
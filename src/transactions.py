@@ -0,0 +1,66 @@
+import asyncio
+import os
+import random
+
+import sqlalchemy
+from fastapi import HTTPException
+
+from src import database as db
+from src import metrics
+
+# Postgres may abort a transaction that raced another one: SERIALIZABLE
+# transactions with a serialization failure, and any transaction caught in
+# a deadlock. Both are safe to run again from the start, so write paths go
+# through run() instead of surfacing them as errors.
+
+# SQLSTATEs worth retrying
+SERIALIZATION_FAILURE = "40001"
+DEADLOCK_DETECTED = "40P01"
+RETRYABLE = (SERIALIZATION_FAILURE, DEADLOCK_DETECTED)
+
+MAX_ATTEMPTS = int(os.environ.get("TRANSACTION_MAX_ATTEMPTS", "5"))
+# backoff before attempt n is uniform in [0, min(MAX_DELAY, BASE_DELAY * 2**n))
+BASE_DELAY = 0.01
+MAX_DELAY = 0.5
+
+BUSY = "the database is busy, please try again."
+
+
+def retryable(error):
+    """Returns the SQLSTATE of a retryable DBAPI error, or None."""
+    if isinstance(error, sqlalchemy.exc.DBAPIError):
+        code = getattr(error.orig, "pgcode", None)
+        if code in RETRYABLE:
+            return code
+    return None
+
+
+async def run(body, isolation_level=None, attempts=MAX_ATTEMPTS, engine=None):
+    """
+    Runs `await body(conn)` in a transaction on engine (db.async_engine by
+    default) and returns its result. If the transaction fails with a
+    serialization failure or deadlock, it is rolled back and body runs
+    again on a fresh connection after a jittered exponential backoff, so
+    body must not have side effects outside the transaction. After
+    `attempts` tries it gives up with a 503.
+    """
+    engine = engine or db.async_engine
+    route = metrics.current_route.get() or metrics.UNMATCHED
+    for attempt in range(attempts):
+        try:
+            async with engine.connect() as conn:
+                if isolation_level is not None:
+                    await conn.execution_options(isolation_level=isolation_level)
+                async with conn.begin():
+                    return await body(conn)
+        except sqlalchemy.exc.DBAPIError as error:
+            code = retryable(error)
+            if code is None:
+                raise
+            metrics.TRANSACTION_CONFLICTS.labels(route, code).inc()
+            if attempt + 1 == attempts:
+                raise HTTPException(status_code=503, detail=BUSY,
+                                    headers={"Retry-After": "1"}) from error
+        metrics.TRANSACTION_RETRIES.labels(route).inc()
+        await asyncio.sleep(random.uniform(
+            0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt)))
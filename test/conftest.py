@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope="module")
+def client_lifespan(request):
+    # Run each module's requests on one event loop. Outside a `with` block
+    # TestClient starts a new loop per request, and the pooled asyncpg
+    # connections in db.async_engine can't be reused across loops.
+    with request.module.client:
+        yield
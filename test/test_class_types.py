@@ -21,3 +21,12 @@ def test_get_class_types_filter():
     with open("test/class_types/type=puppy&limit=2&offset=0.json", 
               encoding="utf-8") as f:
         assert response.json() == json.load(f)
+
+def test_get_class_types_not_modified():
+    response = client.get("/class-types/")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = client.get("/class-types/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
@@ -1,8 +1,13 @@
 from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
 
+from src import database as db
 from src.api.server import app
 
+import asyncio
 import json
+import sqlalchemy
+import time
 
 client = TestClient(app)
 
@@ -134,3 +139,352 @@ time_range=midday&day1=Sunday&day2=Monday&day3=Thursday&limit=50")
               encoding="utf-8") as f:
         assert response.json() == json.load(f)
 
+
+def test_get_classes_days():
+    response = client.get("/classes/?days=Monday&days=Thursday&limit=50")
+    assert response.status_code == 200
+
+    legacy = client.get("/classes/?day1=Monday&day2=Thursday&limit=50")
+    assert response.json() == legacy.json()
+
+
+def test_add_attendance_batch():
+    response = client.post("/classes/1/attendance/batch",
+                           json={"dog_ids": [1, 1, -1]})
+    assert response.status_code == 200
+
+    statuses = [outcome["status"] for outcome in response.json()]
+    assert statuses == ["duplicate", "duplicate", "dog not found"]
+
+
+def batch_fixture(spots):
+    """
+    Returns a class with at least spots free places and an attendee count,
+    and spots + 2 dogs not checked into it.
+    """
+    with db.engine.connect() as conn:
+        class_id, attendee_count, free = conn.execute(sqlalchemy.text("""
+            SELECT class_id, attendee_count, capacity - attendee_count
+            FROM classes
+            WHERE capacity - attendee_count BETWEEN :spots AND :spots + 3
+            ORDER BY class_id
+            LIMIT 1
+        """), {"spots": spots}).one()
+        dog_ids = list(conn.execute(sqlalchemy.text("""
+            SELECT dog_id FROM dogs
+            WHERE NOT EXISTS (
+                SELECT 1 FROM attendance
+                WHERE attendance.dog_id = dogs.dog_id
+                    AND attendance.class_id = :class_id)
+            ORDER BY dog_id
+            LIMIT :count
+        """), {"class_id": class_id, "count": free + 2}).scalars())
+    return class_id, attendee_count, free, dog_ids
+
+
+def attendee_count(class_id):
+    with db.engine.connect() as conn:
+        return conn.execute(sqlalchemy.text(
+            "SELECT attendee_count FROM classes WHERE class_id = :class_id"),
+            {"class_id": class_id}).scalar_one()
+
+
+def remove_attendance(class_id, dog_ids):
+    with db.engine.begin() as conn:
+        conn.execute(sqlalchemy.text("""
+            DELETE FROM attendance
+            WHERE class_id = :class_id AND dog_id = ANY(:dog_ids)
+        """), {"class_id": class_id, "dog_ids": dog_ids})
+
+
+def test_add_attendance_batch_added():
+    class_id, count, _, dog_ids = batch_fixture(2)
+    dog_ids = dog_ids[:2]
+    try:
+        response = client.post(f"/classes/{class_id}/attendance/batch",
+                               json={"dog_ids": dog_ids})
+        assert response.status_code == 200
+        outcomes = response.json()
+        assert [outcome["dog_id"] for outcome in outcomes] == dog_ids
+        assert [outcome["status"] for outcome in outcomes] == \
+            ["added", "added"]
+        with db.engine.connect() as conn:
+            stored = dict(conn.execute(sqlalchemy.text("""
+                SELECT dog_id, attendance_id FROM attendance
+                WHERE class_id = :class_id AND dog_id = ANY(:dog_ids)
+            """), {"class_id": class_id, "dog_ids": dog_ids}).fetchall())
+        assert {outcome["dog_id"]: outcome["attendance_id"]
+                for outcome in outcomes} == stored
+        assert None not in stored.values()
+        assert attendee_count(class_id) == count + 2
+    finally:
+        remove_attendance(class_id, dog_ids)
+    assert attendee_count(class_id) == count
+
+
+def test_add_attendance_batch_class_full():
+    class_id, count, free, dog_ids = batch_fixture(1)
+    try:
+        response = client.post(f"/classes/{class_id}/attendance/batch",
+                               json={"dog_ids": dog_ids})
+        assert response.status_code == 200
+        outcomes = response.json()
+        assert [outcome["status"] for outcome in outcomes] == \
+            ["added"] * free + ["class full"] * 2
+        assert [outcome["attendance_id"] for outcome in outcomes[free:]] == \
+            [None, None]
+        assert attendee_count(class_id) == count + free
+    finally:
+        remove_attendance(class_id, dog_ids)
+    assert attendee_count(class_id) == count
+
+
+def test_add_attendance_batch_404():
+    response = client.post("/classes/-1/attendance/batch",
+                           json={"dog_ids": [1]})
+    assert response.status_code == 404
+    assert response.json() == {
+        "detail": "class not found."
+    }
+
+
+def test_add_class_series_no_occurrences():
+    response = client.post("/classes/series",
+                           json={
+                               "trainer_id": 1,
+                               "days": ["Sunday"],
+                               "start_date": "2024-12-02",
+                               "end_date": "2024-12-06",
+                               "start_time": "10:00 AM",
+                               "end_time": "11:00 AM",
+                               "class_type_id": 0,
+                               "room_id": 1
+                           })
+    assert response.status_code == 404
+    assert response.json() == {
+        "detail": "the series has no occurrences."
+    }
+
+
+def series(**fields):
+    return {
+        "trainer_id": 1,
+        "days": ["Monday", "Wednesday"],
+        "start_date": "2033-03-07",
+        "end_date": "2033-03-16",
+        "start_time": "10:00 AM",
+        "end_time": "11:00 AM",
+        "class_type_id": 1,
+        "room_id": 1,
+        **fields
+    }
+
+
+def test_add_class_series():
+    # Mondays and Wednesdays from 2033-03-07, with the room already booked
+    # on the second Wednesday
+    with db.engine.begin() as conn:
+        booked_id = conn.execute(sqlalchemy.text("""
+            INSERT INTO classes
+            (trainer_id, date, start_time, end_time, class_type_id, room_id)
+            VALUES (1, '2033-03-16', '10:30', '11:30', 1, 1)
+            RETURNING class_id
+        """)).scalar_one()
+    try:
+        response = client.post("/classes/series", json=series())
+        assert response.status_code == 200
+        result = response.json()
+        assert [added["date"] for added in result["added"]] == \
+            ["2033-03-07", "2033-03-09", "2033-03-14"]
+        assert result["conflicts"] == [
+            {"date": "2033-03-16", "class_id": booked_id}
+        ]
+
+        # every occurrence is now booked
+        response = client.post("/classes/series", json=series())
+        assert response.status_code == 200
+        again = response.json()
+        assert again["added"] == []
+        assert again["conflicts"] == sorted(
+            result["added"] + result["conflicts"], key=lambda x: x["date"])
+    finally:
+        with db.engine.begin() as conn:
+            conn.execute(sqlalchemy.text("""
+                DELETE FROM classes
+                WHERE room_id = 1 AND date BETWEEN '2033-03-07' AND '2033-03-16'
+            """))
+
+
+def test_add_class_series_end_before_start():
+    response = client.post("/classes/series",
+                           json=series(start_date="2033-03-16",
+                                       end_date="2033-03-07"))
+    assert response.status_code == 404
+    assert response.json() == {
+        "detail": "end_date should be after start_date"
+    }
+
+
+def test_add_class_series_too_long():
+    response = client.post("/classes/series",
+                           json=series(days=["Monday", "Tuesday", "Wednesday",
+                                             "Thursday", "Friday", "Saturday",
+                                             "Sunday"],
+                                       start_date="2033-01-01",
+                                       end_date="2034-01-02"))
+    assert response.status_code == 404
+    assert response.json() == {
+        "detail": "a series can have at most 366 occurrences."
+    }
+
+
+def test_get_class_not_modified():
+    response = client.get("/classes/1")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    response = client.get("/classes/1", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+
+def test_get_class_etag_ignores_other_classes():
+    with db.engine.connect() as conn:
+        watched, other = conn.execute(sqlalchemy.text("""
+            SELECT class_id FROM classes
+            WHERE attendee_count < capacity
+            ORDER BY class_id
+            LIMIT 2
+        """)).scalars()
+        dog_id = conn.execute(sqlalchemy.text("""
+            SELECT dog_id FROM dogs
+            WHERE NOT EXISTS (
+                SELECT 1 FROM attendance
+                WHERE attendance.dog_id = dogs.dog_id
+                    AND attendance.class_id IN (:watched, :other))
+            ORDER BY dog_id
+            LIMIT 1
+        """), {"watched": watched, "other": other}).scalar_one()
+    etag = client.get(f"/classes/{watched}").headers["ETag"]
+
+    try:
+        response = client.post(f"/classes/{other}/attendance/batch",
+                               json={"dog_ids": [dog_id]})
+        assert response.status_code == 200
+        response = client.get(f"/classes/{watched}",
+                              headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
+        response = client.post(f"/classes/{watched}/attendance/batch",
+                               json={"dog_ids": [dog_id]})
+        assert response.status_code == 200
+        response = client.get(f"/classes/{watched}",
+                              headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+    finally:
+        with db.engine.begin() as conn:
+            conn.execute(sqlalchemy.text("""
+                DELETE FROM attendance
+                WHERE dog_id = :dog_id AND class_id IN (:watched, :other)
+            """), {"dog_id": dog_id, "watched": watched, "other": other})
+
+
+def test_get_classes_attendee_count():
+    response = client.get("/classes/?limit=5")
+    assert response.status_code == 200
+
+    for listed in response.json():
+        detail = client.get(f"/classes/{listed['class_id']}").json()
+        assert listed["num_dogs_attended"] == len(detail["dogs_attended"])
+
+
+def test_add_classes_zero_length():
+    response = client.post("/classes/", json={
+        "trainer_id": 1,
+        "date": "2024-12-02",
+        "start_time": "10:00 AM",
+        "end_time": "10:00 AM",
+        "class_type_id": 1,
+        "room_id": 1
+    })
+    assert response.status_code == 404
+    assert response.json() == {"detail": "end_time should be after start_time"}
+
+    response = client.post("/classes/series", json={
+        "trainer_id": 1,
+        "days": ["Monday"],
+        "start_date": "2024-12-02",
+        "end_date": "2024-12-06",
+        "start_time": "10:00 AM",
+        "end_time": "10:00 AM",
+        "class_type_id": 1,
+        "room_id": 1
+    })
+    assert response.status_code == 404
+    assert response.json() == {"detail": "end_time should be after start_time"}
+
+
+def test_get_class_if_none_match_star():
+    response = client.get("/classes/999999", headers={"If-None-Match": "*"})
+    assert response.status_code == 404
+
+    response = client.get("/classes/1", headers={"If-None-Match": "*"})
+    assert response.status_code == 304
+
+
+def test_concurrent_check_ins_run_in_parallel():
+    # check-ins to different classes, each keeping its transaction open for
+    # a while; if any lock they share were held until commit they would
+    # take turns, and the batch would take len(class_ids) * hold
+    hold = 0.3
+    with db.engine.connect() as conn:
+        class_ids = list(conn.execute(sqlalchemy.text("""
+            SELECT class_id FROM classes
+            WHERE attendee_count < capacity
+            ORDER BY class_id
+            LIMIT 8
+        """)).scalars())
+        dog_id = conn.execute(sqlalchemy.text("""
+            SELECT dog_id FROM dogs
+            WHERE NOT EXISTS (
+                SELECT 1 FROM attendance
+                WHERE attendance.dog_id = dogs.dog_id
+                    AND attendance.class_id = ANY(:ids))
+            ORDER BY dog_id
+            LIMIT 1
+        """), {"ids": class_ids}).scalar_one()
+
+    async def check_in(engine, class_id):
+        async with engine.begin() as conn:
+            await conn.execute(sqlalchemy.text("""
+                INSERT INTO attendance (dog_id, class_id)
+                VALUES (:dog_id, :class_id)
+            """), {"dog_id": dog_id, "class_id": class_id})
+            await asyncio.sleep(hold)
+
+    async def check_in_all():
+        # a separate engine, so no pooled connection outlives this loop
+        engine = create_async_engine(db.async_database_connection_url(),
+                                     poolclass=sqlalchemy.pool.NullPool)
+        try:
+            start = time.perf_counter()
+            await asyncio.gather(*(check_in(engine, class_id)
+                                   for class_id in class_ids))
+            return time.perf_counter() - start
+        finally:
+            await engine.dispose()
+
+    try:
+        elapsed = asyncio.run(check_in_all())
+    finally:
+        with db.engine.begin() as conn:
+            conn.execute(sqlalchemy.text("""
+                DELETE FROM attendance
+                WHERE dog_id = :dog_id AND class_id = ANY(:ids)
+            """), {"dog_id": dog_id, "ids": class_ids})
+
+    assert len(class_ids) == 8
+    assert elapsed < hold * len(class_ids) / 2
@@ -0,0 +1,18 @@
+from fastapi.testclient import TestClient
+
+from src.api.server import app
+
+client = TestClient(app)
+
+
+def test_search_comments():
+    response = client.get("/comments/search?q=advance&limit=10")
+    assert response.status_code == 200
+
+    for comment in response.json():
+        assert "advance" in comment["text"].lower()
+
+
+def test_search_comments_requires_query():
+    response = client.get("/comments/search")
+    assert response.status_code == 422
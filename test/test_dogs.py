@@ -77,4 +77,71 @@ def test_delete_comment_2():
         "/dogs/dogs/comments/500"
     ) 
     
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+def test_get_dogs_cursor():
+    first_page = client.get("/dogs/?limit=2")
+    assert first_page.status_code == 200
+    cursor = first_page.headers["X-Next-Cursor"]
+
+    response = client.get(f"/dogs/?limit=2&cursor={cursor}")
+    assert response.status_code == 200
+    assert response.json() == client.get("/dogs/?limit=2&offset=2").json()
+
+
+def test_get_dogs_bad_cursor():
+    response = client.get("/dogs/?cursor=not-a-cursor")
+    assert response.status_code == 400
+    assert response.json() == {"detail": "invalid cursor."}
+
+
+def test_get_dog_nested_limits():
+    response = client.get("/dogs/1?comments_limit=1&classes_limit=1")
+    assert response.status_code == 200
+    assert len(response.json()["trainer_comments"]) <= 1
+    assert len(response.json()["classes_attended"]) <= 1
+
+
+def test_get_dog_bad_comments_cursor():
+    response = client.get("/dogs/1?comments_cursor=not-a-cursor")
+    assert response.status_code == 400
+    assert response.json() == {"detail": "invalid cursor."}
+
+
+def test_get_dogs_page_shape():
+    response = client.get("/dogs/?limit=2")
+    assert response.status_code == 200
+    assert "X-Next-Cursor" in response.headers
+
+    dogs = response.json()
+    assert len(dogs) == 2
+    assert list(dogs[0]) == ["dog_id", "name", "birthday", "breed",
+                             "client_email"]
+
+def test_get_dog_etag_follows_writes():
+    response = client.get("/dogs/1")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert "max-age" in response.headers["Cache-Control"]
+
+    response = client.get("/dogs/1", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.post("/dogs/1/comments", json={
+        "trainer_id": 1, "comment_text": "Sits on command"})
+    assert response.status_code == 200
+    comment_id = response.json().split(": ")[1]
+
+    response = client.get("/dogs/1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    client.delete(f"/dogs/comments/{comment_id}")
+
+def test_get_dog_if_none_match_star():
+    response = client.get("/dogs/999999", headers={"If-None-Match": "*"})
+    assert response.status_code == 404
+
+    response = client.get("/dogs/1", headers={"If-None-Match": "*"})
+    assert response.status_code == 304
@@ -0,0 +1,56 @@
+from fastapi.testclient import TestClient
+
+from src import database as db
+from src.api.server import app
+
+import datetime
+import json
+import sqlalchemy
+
+client = TestClient(app)
+
+
+def test_export_dogs_ndjson():
+    response = client.get("/export/dogs")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    lines = response.text.splitlines()
+    assert len(lines) > 0
+    ids = [json.loads(line)["dog_id"] for line in lines]
+    assert ids == sorted(ids)
+
+
+def test_export_classes_csv_window():
+    response = client.get("/export/classes?format=csv\
+&since=2023-01-01T00:00:00&until=2023-01-02T00:00:00")
+    assert response.status_code == 200
+
+    lines = response.text.splitlines()
+    assert lines[0] == \
+        "class_id,trainer_id,date,start_time,end_time,class_type_id,room_id"
+    assert all(line.split(",")[2] == "2023-01-01" for line in lines[1:])
+
+
+def test_export_unknown_table():
+    response = client.get("/export/trainers")
+    assert response.status_code == 422
+
+
+def test_export_comments_utc_window():
+    # the fortnight up to the newest comment, whenever the data is from
+    with db.engine.connect() as conn:
+        newest = conn.execute(sqlalchemy.text(
+            "SELECT MAX(time_added) FROM comments")).scalar_one()
+    end = newest.replace(microsecond=0) + datetime.timedelta(seconds=1)
+    start = end - datetime.timedelta(days=15)
+    naive = client.get("/export/comments", params={
+        "since": start.isoformat(), "until": end.isoformat()})
+    aware = client.get("/export/comments", params={
+        "since": start.isoformat() + "Z",
+        "until": (end + datetime.timedelta(hours=1)).isoformat() + "+01:00"})
+    assert aware.status_code == 200
+    assert aware.text == naive.text
+    times = [json.loads(line)["time_added"] for line in aware.text.splitlines()]
+    assert times and all(start.isoformat() <= time < end.isoformat()
+                         for time in times)
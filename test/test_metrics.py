@@ -0,0 +1,17 @@
+from fastapi.testclient import TestClient
+
+from src.api.server import app
+
+client = TestClient(app)
+
+
+def test_metrics_by_route_template():
+    client.get("/class-types/")
+    client.get("/dogs/-1")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'route="/dogs/{id}",status="404"' in response.text
+    assert 'db_queries_total{route="/dogs/{id}"}' in response.text
+    assert 'db_pool_checked_out{engine="async"}' in response.text
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+import sqlalchemy
+from fastapi.testclient import TestClient
+
+from src import database as db
+from src.api import query_cache
+from src.api.server import app
+
+client = TestClient(app)
+
+
+def test_memory_backend_lru_and_tags():
+    async def scenario():
+        backend = query_cache.MemoryBackend(size=2)
+        await backend.set("a", b"1", {"classes": 1}, 60)
+        await backend.set("b", b"2", {"classes": 1, "trainers": 1}, 60)
+        assert await backend.get("a") == b"1"
+        await backend.set("c", b"3", {"trainers": 1}, 60)
+        # b was the least recently used
+        assert await backend.get("b") is None
+        assert await backend.evict("classes", 2) == 1
+        return await backend.get("a"), await backend.get("c")
+
+    assert asyncio.run(scenario()) == (None, b"3")
+
+
+def test_cache_key_normalizes_params():
+    first = query_cache.cache_key("GET /classes/", {"days": [1, 4], "limit": 5},
+                                  {"classes": 1})
+    second = query_cache.cache_key("GET /classes/", {"limit": 5, "days": [1, 4]},
+                                   {"classes": 1})
+    bumped = query_cache.cache_key("GET /classes/", {"limit": 5, "days": [1, 4]},
+                                   {"classes": 2})
+    assert first == second != bumped
+
+
+def test_get_classes_cached_until_write():
+    cache = query_cache.cache
+    hits = cache.hits
+    first = client.get("/classes/?days=Monday&days=Thursday&limit=5")
+    second = client.get("/classes/?days=Thursday&days=Monday&limit=5")
+    assert second.status_code == 200
+    assert second.content == first.content
+    assert second.headers.get("X-Next-Cursor") == \
+        first.headers.get("X-Next-Cursor")
+    assert cache.hits == hits + 1
+
+    with db.engine.begin() as conn:
+        conn.execute(sqlalchemy.text("""
+            UPDATE table_versions SET version = version + 1
+            WHERE table_name = 'attendance'
+        """))
+    misses = cache.misses
+    third = client.get("/classes/?days=Monday&days=Thursday&limit=5")
+    assert third.content == first.content
+    assert cache.misses == misses + 1
+
+
+def test_redis_backend():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def scenario():
+        backend = query_cache.RedisBackend(
+            client=fakeredis.aioredis.FakeRedis())
+        await backend.set("a", b"1", {"classes": 1}, 60)
+        await backend.set("b", b"2", {"trainers": 1}, 60)
+        assert await backend.get("a") == b"1"
+        assert await backend.evict("classes", 2) == 1
+        return await backend.get("a"), await backend.get("b")
+
+    assert asyncio.run(scenario()) == (None, b"2")
+
+
+@pytest.mark.parametrize("backend", ["memory", "redis"])
+def test_evict_keeps_fresh_entries(backend):
+    if backend == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        backend = query_cache.RedisBackend(
+            client=fakeredis.aioredis.FakeRedis())
+    else:
+        backend = query_cache.MemoryBackend()
+
+    async def scenario():
+        await backend.set("old", b"1", {"classes": 1}, 60)
+        await backend.set("older", b"0", {"classes": 0}, 60)
+        # stored by another worker that saw the write first
+        await backend.set("new", b"2", {"classes": 2}, 60)
+        assert await backend.evict("classes", 2) == 2
+        return [await backend.get(key) for key in ("older", "old", "new")]
+
+    assert asyncio.run(scenario()) == [None, None, b"2"]
+
+
+def test_write_evicts_only_stale_entries(monkeypatch):
+    table_versions = {"classes": 1}
+
+    async def current(conn, tables):
+        return dict(table_versions)
+
+    monkeypatch.setattr(query_cache.versions, "current", current)
+    backend = query_cache.MemoryBackend()
+    # two workers sharing a backend
+    first = query_cache.QueryCache(backend)
+    second = query_cache.QueryCache(backend)
+
+    async def run():
+        return table_versions["classes"]
+
+    async def scenario():
+        await first.fetch(None, "GET /classes/", {"page": 1}, ["classes"], run)
+        table_versions["classes"] = 2
+        # the second worker sees the write first and stores a fresh entry
+        await second.fetch(None, "GET /classes/", {"page": 2}, ["classes"],
+                           run)
+        await first.fetch(None, "GET /classes/", {"page": 1}, ["classes"], run)
+        hits = first.hits
+        assert await first.fetch(None, "GET /classes/", {"page": 2},
+                                 ["classes"], run) == 2
+        return first.evictions, first.hits - hits
+
+    assert asyncio.run(scenario()) == (1, 1)
+
+
+class BrokenBackend:
+    """A backend whose server can't be reached."""
+
+    async def get(self, key):
+        raise ConnectionError("cache unreachable")
+
+    async def set(self, key, value, tags, ttl):
+        raise ConnectionError("cache unreachable")
+
+    async def evict(self, tag, version):
+        raise ConnectionError("cache unreachable")
+
+
+def test_backend_errors_run_the_query(monkeypatch):
+    cache = query_cache.cache
+    monkeypatch.setattr(cache, "backend", BrokenBackend())
+    # a table this process has seen an older version of, so the lookup
+    # also tries to evict
+    monkeypatch.setattr(cache, "_seen", {"classes": -1})
+    errors = cache.errors
+
+    response = client.get("/classes/?limit=5")
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+
+    response = client.get("/rooms/availability", params={
+        "date": "2023-12-01", "from": "08:00 AM", "to": "05:00 PM"})
+    assert response.status_code == 200
+    # evict, get and set for each; a failed eviction is retried until it
+    # goes through
+    assert cache.errors == errors + 6
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import reference_data
+from src.api.server import app
+
+client = TestClient(app)
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalar(self):
+        return self.rows[0][0]
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConn:
+    """Answers the cache's queries from memory, counting round trips."""
+
+    def __init__(self):
+        self.queries = 0
+        self.info = {}
+
+    async def execute(self, stmt, params=None):
+        self.queries += 1
+        if stmt is reference_data.VERSION:
+            return FakeResult([(7,)])
+        if stmt is reference_data.QUERIES["rooms"]:
+            return FakeResult([(1, "Room A", 10)])
+        return FakeResult([(1, "Puppy Training", "", 10)])
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def load(cache, conn, *tables):
+    async def scenario():
+        return [await cache.get(table, conn) for table in tables]
+    return asyncio.run(scenario())
+
+
+def test_cache_ttl_expiry(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(reference_data.time, "monotonic", clock)
+    cache = reference_data.ReferenceCache(ttl=60)
+    conn = FakeConn()
+
+    (rooms,) = load(cache, conn, "rooms")
+    assert rooms[1][1] == "Room A"
+    assert cache.version("rooms") == 7
+    clock.now += 59
+    load(cache, conn, "rooms")
+    assert conn.queries == 2
+    clock.now += 2
+    load(cache, conn, "rooms")
+    assert conn.queries == 4
+
+
+def test_cache_hit_and_miss_counters():
+    cache = reference_data.ReferenceCache(ttl=60)
+    load(cache, FakeConn(), "rooms", "rooms", "class_types", "rooms")
+    assert cache.stats() == {"hits": 2, "misses": 2,
+                             "cached_tables": ["class_types", "rooms"]}
+
+
+def test_commit_invalidates_written_table(monkeypatch):
+    cache = reference_data.ReferenceCache(ttl=60)
+    monkeypatch.setattr(reference_data, "cache", cache)
+    conn = FakeConn()
+    load(cache, conn, "rooms", "class_types")
+
+    reference_data._note_write(
+        conn, None, "UPDATE rooms SET max_dog_capacity = 12", {}, None, False)
+    reference_data._note_write(
+        conn, None, "INSERT INTO classes (room_id) VALUES (1)", {}, None, False)
+    assert cache.stats()["cached_tables"] == ["class_types", "rooms"]
+    reference_data._commit(conn)
+    assert cache.stats()["cached_tables"] == ["class_types"]
+    assert "reference_writes" not in conn.info
+
+
+@pytest.mark.parametrize("statement, written", [
+    ("UPDATE rooms SET max_dog_capacity = 12", {"rooms"}),
+    ("UPDATE ONLY rooms SET max_dog_capacity = 12", {"rooms"}),
+    ("update public.rooms set max_dog_capacity = 12", {"rooms"}),
+    ('DELETE FROM ONLY "public"."class_types"', {"class_types"}),
+    ('INSERT INTO "rooms" (room_name) VALUES (\'B\')', {"rooms"}),
+    ("TRUNCATE TABLE ONLY public.class_types", {"class_types"}),
+    ("UPDATE rooms_archive SET room_name = 'B'", set()),
+    ('UPDATE "rooms_archive" SET room_name = \'B\'', set()),
+    ("INSERT INTO classes (room_id) SELECT room_id FROM rooms", set()),
+])
+def test_note_write_table_spellings(statement, written):
+    conn = FakeConn()
+    reference_data._note_write(conn, None, statement, {}, None, False)
+    assert conn.info.get("reference_writes", set()) == written
+
+
+def test_rollback_discards_pending_invalidations(monkeypatch):
+    cache = reference_data.ReferenceCache(ttl=60)
+    monkeypatch.setattr(reference_data, "cache", cache)
+    conn = FakeConn()
+    load(cache, conn, "rooms", "class_types")
+
+    reference_data._note_write(
+        conn, None, "DELETE FROM class_types WHERE class_type_id = 1",
+        {}, None, False)
+    reference_data._rollback(conn)
+    reference_data._commit(conn)
+    assert cache.stats()["cached_tables"] == ["class_types", "rooms"]
@@ -32,4 +32,30 @@ start_hour=10&start_minutes=0&end_hour=11&end_minutes=0&class_type_id=2")
     assert response.status_code == 404
 
     with open("test/rooms/month=0.json", encoding="utf-8") as f:
-        assert response.json() == json.load(f)
\ No newline at end of file
+        assert response.json() == json.load(f)
+
+def test_get_room_availability():
+    response = client.get("/rooms/availability", params={
+        "date": "2023-12-01", "days": 2, "from": "08:00 AM",
+        "to": "05:00 PM", "slot_minutes": 60})
+    assert response.status_code == 200
+
+    for room in response.json():
+        for interval in room["free"]:
+            assert interval["start"] < interval["end"]
+            assert "08:00:00" <= interval["start"][11:] < "17:00:00"
+
+
+def test_get_room_availability_bad_window():
+    response = client.get("/rooms/availability", params={
+        "date": "2023-12-01", "from": "05:00 PM", "to": "08:00 AM"})
+    assert response.status_code == 404
+    assert response.json() == {"detail": "to should be after from"}
+
+
+def test_get_room_zero_length():
+    response = client.get("/rooms/", params={
+        "date": "2023-12-01", "start_time": "10:00 AM",
+        "end_time": "10:00 AM", "class_type_id": 1})
+    assert response.status_code == 404
+    assert response.json() == {"detail": "end_time should be after start_time"}
@@ -0,0 +1,48 @@
+import sqlalchemy
+from fastapi.testclient import TestClient
+
+from src import database as db
+from src import stats
+from src.api.server import app
+
+client = TestClient(app)
+
+def test_get_class_type_stats():
+    with db.engine.begin() as conn:
+        stats.refresh(conn)
+        live = {(str(row.month), row.class_type_id): row.dogs
+                for row in conn.execute(sqlalchemy.text("""
+                    SELECT CAST(date_trunc('month', date) AS DATE) AS month,
+                        class_type_id, SUM(attendee_count) AS dogs
+                    FROM classes
+                    WHERE date >= '2023-01-01' AND date < '2024-01-01'
+                    GROUP BY 1, 2
+                """))}
+
+    response = client.get("/stats/class-types?from=2023-01&to=2023-12")
+    assert response.status_code == 200
+
+    body = response.json()
+    assert set(body) == {"refreshed_at", "age_seconds", "stats"}
+    assert body["refreshed_at"] is not None
+    assert {(row["month"], row["class_type_id"]): row["dogs"]
+            for row in body["stats"]} == live
+
+def test_refresh_keeps_unchanged_rows():
+    versions = sqlalchemy.text(
+        "SELECT month, class_type_id, xmin FROM class_type_monthly_stats")
+    with db.engine.begin() as conn:
+        stats.refresh(conn)
+        before = set(conn.execute(versions))
+    with db.engine.begin() as conn:
+        stats.refresh(conn)
+        assert set(conn.execute(versions)) == before
+
+def test_get_trainer_stats_bad_month():
+    response = client.get("/stats/trainers?from=2023-13")
+    assert response.status_code == 400
+
+def test_refresh_stats_needs_secret():
+    response = client.get("/stats/refresh",
+                          headers={"Authorization": "Bearer guess"})
+    assert response.status_code == 403
@@ -1,6 +1,7 @@
 from fastapi.testclient import TestClient
 
 from src.api.server import app
+from src import auth
 
 import json
 
@@ -72,4 +73,41 @@ def test_verify_password_1():
 
 def test_verify_password_2():
     response = client.get("/trainers/JohnD%40gmail.com/password")
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+def test_login_unknown_email():
+    response = client.post("/trainers/login/", json={
+        "trainer_email": "nobody@dogtrainers.com", "pwd": "password"})
+    assert response.status_code == 404
+    assert "X-Session-Token" not in response.headers
+
+
+def test_session_token():
+    token = auth.issue_token(1)
+    response = client.get("/trainers/me",
+                          headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json()[0]["trainer_id"] == 1
+
+    response = client.get("/trainers/me",
+                          headers={"Authorization": f"Bearer {token}x"})
+    assert response.status_code == 401
+
+
+def test_get_trainer_schedule():
+    response = client.get("/trainers/1/schedule",
+                          params={"from": "2000-01-01", "to": "2000-12-31"})
+    assert response.status_code == 200
+
+    schedule = [(c["date"], c["start_time"], c["class_id"])
+                for c in response.json()]
+    assert schedule == sorted(schedule)
+
+
+def test_get_trainer_schedule_bad_range():
+    response = client.get("/trainers/1/schedule",
+                          params={"from": "2000-01-08", "to": "2000-01-01"})
+    assert response.status_code == 400
+
+    response = client.get("/trainers/-1/schedule")
+    assert response.status_code == 404
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+import sqlalchemy
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src import database as db
+from src import metrics, transactions
+from src.api.server import app
+
+client = TestClient(app)
+
+
+class Conflict(Exception):
+    pgcode = transactions.SERIALIZATION_FAILURE
+
+
+def conflict():
+    return sqlalchemy.exc.DBAPIError("SELECT 1", None, Conflict())
+
+
+def retries():
+    return metrics.registry.get_sample_value(
+        "db_transaction_retries_total", {"route": metrics.UNMATCHED}) or 0
+
+
+async def run_on_own_engine(*bodies, **options):
+    # a separate engine, so no pooled connection outlives this event loop
+    engine = create_async_engine(db.async_database_connection_url(),
+                                 poolclass=sqlalchemy.pool.NullPool)
+    try:
+        return await asyncio.gather(*(
+            transactions.run(body, engine=engine, **options)
+            for body in bodies))
+    finally:
+        await engine.dispose()
+
+
+def test_run_retries_conflicts():
+    calls = []
+
+    async def body(conn):
+        calls.append(1)
+        if len(calls) < 3:
+            raise conflict()
+        return (await conn.execute(sqlalchemy.text("SELECT 1"))).scalar_one()
+
+    before = retries()
+    assert asyncio.run(run_on_own_engine(body)) == [1]
+    assert len(calls) == 3
+    assert retries() == before + 2
+
+
+def test_run_gives_up():
+    async def body(conn):
+        raise conflict()
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run_on_own_engine(body, attempts=2))
+    assert error.value.status_code == 503
+
+
+def test_run_under_contention():
+    # every transaction reads and then writes the same row, so concurrent
+    # SERIALIZABLE runs conflict until they are retried one after another
+    async def body(conn):
+        class_id = (await conn.execute(sqlalchemy.text(
+            "SELECT MIN(class_id) FROM classes"))).scalar_one()
+        await asyncio.sleep(0.05)
+        await conn.execute(sqlalchemy.text(
+            "UPDATE classes SET end_time = end_time WHERE class_id = :id"),
+            {"id": class_id})
+        return class_id
+
+    before = retries()
+    results = asyncio.run(run_on_own_engine(
+        *[body] * 6, isolation_level="SERIALIZABLE", attempts=20))
+    assert len(set(results)) == 1
+    assert retries() > before